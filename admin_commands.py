@@ -8,7 +8,7 @@ Menyediakan utilitas untuk admin/pemilik perusahaan
 import json
 import os
 import datetime
-from modules.analytics import get_daily_stats
+from modules.analytics import get_daily_stats_range
 
 def show_active_accounts():
     """
@@ -68,12 +68,15 @@ def generate_report(username=None, days=7):
         total_outgoing = 0
         all_intents = {}
         
-        # Ambil data untuk setiap hari
+        # Ambil data untuk seluruh periode sekaligus
+        start_date = (today - datetime.timedelta(days=days-1)).strftime("%Y-%m-%d")
+        daily_range = get_daily_stats_range(username, start_date, today.strftime("%Y-%m-%d"))
+        
         for i in range(days):
             date = (today - datetime.timedelta(days=i)).strftime("%Y-%m-%d")
-            stats = get_daily_stats(username, date)
+            stats = daily_range.get(date)
             
-            if isinstance(stats, dict) and "message" not in stats:
+            if stats:
                 # Cetak statistik harian
                 print(f"{date}: {stats['total_interactions']} interaksi ({stats['incoming_messages']} in, {stats['outgoing_messages']} out)")
                 
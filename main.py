@@ -15,14 +15,18 @@ from telethon import TelegramClient, events
 from telethon.tl.functions.messages import SetTypingRequest
 from telethon.tl.types import SendMessageTypingAction
 from keyconfig import get_openai_key
-from modules.ai_engine import generate_response
-from modules.conversation import save_conversation, get_conversation_history
-from modules.persona import get_persona
-from modules.prompt_manager import generate_prompt
+from modules.ai_engine import generate_response_async
+from modules.llm_client import close_all_clients
+from modules.conversation import save_conversation, get_conversation_history_async
+from modules.persona import get_persona, get_persona_registry, get_persona_stats
+from modules.prompt_manager import generate_prompt_async, get_retrieval_stats
+from modules.prompt_trace import get_prompt_tracer
 from modules.intent_detector import detect_intent
-from modules.analytics import log_interaction, get_daily_stats
-from modules.rag_engine import RAGEngine  # Import RAG Engine
+from modules.analytics import log_interaction, get_daily_stats_range
+from modules.rag_engine import get_rag_engine  # Import RAG Engine
 from modules.kb_factory import create_default_kb  # Import KB Factory
+from modules.scheduler import MessageScheduler
+from modules.write_behind import close_all as close_write_buffers
 
 # Pastikan direktori modules ada
 if not os.path.exists("modules"):
@@ -35,8 +39,8 @@ ADMIN_ID = 6249036163  # ID admin/pemilik
 # Inisialisasi class
 regenerator = ResponseRegenerator()
 
-# Inisialisasi RAG Engine di awal
-rag_engine = None
+# Scheduler pesan masuk (dibuat di main)
+scheduler = None
 
 # Muat akun dari JSON
 def load_accounts():
@@ -46,9 +50,10 @@ def load_accounts():
     return []
 
 # Fungsi untuk mendapatkan statistik semua akun
-async def get_all_stats(client, chat_id, days=7):
+def _build_stats_report(days):
     accounts = load_accounts()
     today = datetime.datetime.now()
+    start_date = (today - datetime.timedelta(days=days-1)).strftime("%Y-%m-%d")
 
     report = f"📊 **Laporan Statistik JTRADE**\n"
     report += f"Periode: {(today - datetime.timedelta(days=days)).strftime('%Y-%m-%d')} hingga {today.strftime('%Y-%m-%d')}\n\n"
@@ -58,15 +63,19 @@ async def get_all_stats(client, chat_id, days=7):
         total_interactions = 0
         total_incoming = 0
 
-        for i in range(days):
-            date = (today - datetime.timedelta(days=i)).strftime("%Y-%m-%d")
-            stats = get_daily_stats(username, date)
-            if isinstance(stats, dict) and "message" not in stats:
-                total_interactions += stats['total_interactions']
-                total_incoming += stats['incoming_messages']
+        # Satu query untuk seluruh periode
+        for stats in get_daily_stats_range(username, start_date, today.strftime("%Y-%m-%d")).values():
+            total_interactions += stats['total_interactions']
+            total_incoming += stats['incoming_messages']
 
         report += f"**{username}**: {total_interactions} interaksi ({total_incoming} pesan masuk)\n"
 
+    return report
+
+async def get_all_stats(client, chat_id, days=7):
+    # Flush dan baca file analitik di thread lain agar event loop tidak tertahan
+    loop = asyncio.get_running_loop()
+    report = await loop.run_in_executor(None, _build_stats_report, days)
     await client.send_message(chat_id, report)
 
 # Fungsi untuk menangani pesan masuk
@@ -81,19 +90,19 @@ async def handle_incoming_message(event, client, username):
     save_conversation(username, chat_id, sender.id, "incoming", message)
 
     # Ambil riwayat dan persona
-    conversation_history = get_conversation_history(username, chat_id, sender.id)
+    conversation_history = await get_conversation_history_async(username, chat_id, sender.id)
     persona = get_persona(username)
     
     # Generate prompt dengan RAG
-    prompt = generate_prompt(persona, conversation_history, message, debug=True)
+    prompt = await generate_prompt_async(persona, conversation_history, message, account=username)
     api_key = get_openai_key(username)
 
     # Simulasi typing...
     await client(SetTypingRequest(peer=chat_id, action=SendMessageTypingAction()))
     await asyncio.sleep(persona.get("response_delay", 2.0))
 
-    # Generate dan simpan respons
-    response = generate_response(prompt, api_key)
+    # Generate dan simpan respons (async agar chat lain tetap berjalan)
+    response = await generate_response_async(prompt, api_key)
     log_interaction(username, "outgoing", response)
     save_conversation(username, chat_id, sender.id, "outgoing", response)
     
@@ -114,9 +123,6 @@ async def handle_admin_command(event, client):
         return False
 
     message = event.message.text
-    
-    # Inisialisasi global rag_engine
-    global rag_engine
 
     if message.startswith("/stats"):
         parts = message.split()
@@ -149,11 +155,9 @@ async def handle_admin_command(event, client):
         # Perintah untuk mengindeks knowledge base
         await client.send_message(event.chat_id, "🔍 Mengindeks knowledge base...")
         
-        # Inisialisasi dan indeks RAG Engine
-        if not rag_engine:
-            rag_engine = RAGEngine()
-        
-        rag_engine.index_knowledge_base()
+        # Muat ulang file KB lalu indeks ulang potongan yang berubah
+        rag_engine = get_rag_engine()
+        rag_engine.load_knowledge_base()
         await client.send_message(event.chat_id, "✅ Knowledge base berhasil diindeks!")
         return True
 
@@ -164,12 +168,8 @@ async def handle_admin_command(event, client):
             await client.send_message(event.chat_id, "❌ Query pencarian tidak boleh kosong!")
             return True
             
-        # Inisialisasi RAG Engine jika belum
-        if not rag_engine:
-            rag_engine = RAGEngine()
-            
-        # Lakukan pencarian
-        results = rag_engine.retrieve(query, top_k=5)
+        # Lakukan pencarian dengan RAG Engine bersama
+        results = get_rag_engine().retrieve(query, top_k=5)
         
         if not results:
             await client.send_message(event.chat_id, "❓ Tidak ada hasil yang ditemukan. Coba indeks ulang knowledge base dengan /index_kb")
@@ -184,6 +184,65 @@ async def handle_admin_command(event, client):
         await client.send_message(event.chat_id, response)
         return True
 
+    elif message == "/queue":
+        # Perintah untuk melihat status antrean pesan
+        if not scheduler:
+            await client.send_message(event.chat_id, "❌ Scheduler belum berjalan")
+            return True
+        
+        metrics = scheduler.get_metrics()
+        response = "📥 **Status Antrean Pesan**\n\n"
+        response += f"Diproses: {metrics['in_flight']}/{metrics['global_limit']} (maks {metrics['account_limit']} per akun)\n"
+        response += f"Antre: {metrics['queued']} pesan di {metrics['active_chats']} chat aktif\n"
+        response += f"Selesai: {metrics['completed']} | Gagal: {metrics['failed']}\n"
+        response += f"Antrean terdalam: {metrics['max_queue_depth']} | Rata-rata tunggu: {metrics['avg_wait_time']:.2f} detik\n"
+        for account, count in metrics['queued_per_account'].items():
+            response += f"- {account}: {count} antre\n"
+        await client.send_message(event.chat_id, response)
+        return True
+
+    elif message == "/rag_stats":
+        # Perintah untuk melihat performa retrieval RAG per pesan
+        stats = get_retrieval_stats()
+        response = "📚 **Statistik RAG**\n\n"
+        response += f"Retrieval: {stats['calls']} kali ({stats['errors']} error)\n"
+        response += f"Latensi: rata-rata {stats['avg_ms']:.2f} ms, maks {stats['max_ms']:.2f} ms\n"
+        response += f"Konteks disisipkan: rata-rata {stats['avg_chars']:.0f} karakter\n"
+        await client.send_message(event.chat_id, response)
+        return True
+
+    elif message == "/persona_stats":
+        # Perintah untuk memastikan persona dilayani dari cache
+        stats = get_persona_stats()
+        response = "🎭 **Statistik Persona**\n\n"
+        response += f"Persona di cache: {stats['cached']}\n"
+        response += f"Hit: {stats['hits']} | Load: {stats['loads']} | Reload: {stats['reloads']} (hit rate {stats['hit_rate']:.1%})\n"
+        response += f"Pemeriksaan mtime: {stats['mtime_checks']}\n"
+        await client.send_message(event.chat_id, response)
+        return True
+
+    elif message.startswith("/trace"):
+        # Perintah untuk mengatur tracing prompt: /trace [username|all] [on|off|rate]
+        tracer = get_prompt_tracer()
+        parts = message.split()
+        if len(parts) == 3:
+            target = None if parts[1] == "all" else parts[1]
+            value = {"on": "1", "off": "0"}.get(parts[2], parts[2])
+            try:
+                tracer.set_rate(target, float(value))
+            except ValueError:
+                await client.send_message(event.chat_id, "❌ Format: /trace [username|all] [on|off|0-1]")
+                return True
+        
+        stats = tracer.get_stats()
+        response = "🧾 **Tracing Prompt**\n\n"
+        response += f"Rate default: {stats['default_rate']:.0%}\n"
+        for username, rate in stats['account_rates'].items():
+            response += f"- {username}: {rate:.0%}\n"
+        response += f"Dicatat: {stats['traced']} | Dilewati: {stats['skipped']}\n"
+        await client.send_message(event.chat_id, response)
+        return True
+
     elif message.startswith("/restart"):
         parts = message.split()
         if len(parts) > 1:
@@ -203,6 +262,10 @@ async def handle_admin_command(event, client):
 /create_kb - Membuat knowledge base default
 /index_kb - Mengindeks ulang knowledge base untuk RAG
 /search [query] - Mencari informasi di knowledge base
+/queue - Melihat status antrean pesan
+/rag_stats - Melihat statistik retrieval RAG
+/persona_stats - Melihat statistik cache persona
+/trace [username|all] [on|off|0-1] - Mengatur tracing prompt
 /help - Menampilkan bantuan ini
         """
         await client.send_message(event.chat_id, help_text)
@@ -213,8 +276,8 @@ async def handle_admin_command(event, client):
 # Fungsi utama
 async def main():
     # Inisialisasi RAG Engine di awal
-    global rag_engine
-    rag_engine = RAGEngine()
+    global scheduler
+    rag_engine = get_rag_engine()
     print("Initializing RAG Engine...")
     
     # Pastikan knowledge base ada & terindeks
@@ -222,13 +285,19 @@ async def main():
     if not os.path.exists(kb_dir) or not os.listdir(kb_dir):
         print("Knowledge base not found. Creating default...")
         create_default_kb()
+        rag_engine.load_knowledge_base()
         
+    # Engine bersama ini juga dipakai generate_prompt untuk setiap pesan
     rag_engine.index_knowledge_base()
     print("RAG Engine initialized successfully")
     
     # Setup akun Telegram
     accounts = load_accounts()
     clients = []
+    
+    # Muat persona semua akun sekali di awal
+    get_persona_registry().load_all([account['username'] for account in accounts])
+    scheduler = MessageScheduler()
 
     for account in accounts:
         username = account['username']
@@ -250,12 +319,18 @@ async def main():
         async def message_handler(event, c=client, u=username):
             is_admin_command = await handle_admin_command(event, c)
             if not is_admin_command:
-                await handle_incoming_message(event, c, u)
+                # Antrekan agar dibatasi scheduler dan urut per chat
+                scheduler.submit(u, event.chat_id, handle_incoming_message, event, c, u)
 
         clients.append(client)
         print(f"Client {username} ({phone}) started")
 
-    await asyncio.gather(*[client.run_until_disconnected() for client in clients])
+    try:
+        await asyncio.gather(*[client.run_until_disconnected() for client in clients])
+    finally:
+        # Tutup connection pool OpenAI dan tulis sisa buffer ke disk
+        await close_all_clients()
+        close_write_buffers()
 
 if __name__ == "__main__":
     try:
@@ -8,6 +8,26 @@ berdasarkan prompt yang diberikan.
 
 import openai
 import time
+import asyncio
+from modules.llm_client import get_client
+from modules.prompt_manager import estimate_tokens
+
+# Konfigurasi request ke OpenAI
+MODEL = "gpt-4o"  # Atau model lain yang diinginkan
+MAX_TOKENS = 300
+TEMPERATURE = 0.6
+REQUEST_TIMEOUT = 30  # Batas waktu per request (detik)
+
+FALLBACK_RESPONSE = "Maaf, saya sedang mengalami masalah teknis. Silakan coba lagi nanti."
+
+def _build_messages(prompt):
+    """
+    Susun daftar messages untuk Chat Completion API
+    """
+    return [
+        {"role": "system", "content": "You are a helpful assistant."},
+        {"role": "user", "content": prompt}
+    ]
 
 def generate_response(prompt, api_key, max_retries=3):
     """
@@ -21,21 +41,17 @@ def generate_response(prompt, api_key, max_retries=3):
     Returns:
         str: Respons dari API
     """
-    openai.api_key = api_key
-    
     # Implementasi retry dengan exponential backoff
     retry = 0
     while retry < max_retries:
         try:
             # Gunakan API OpenAI untuk mendapatkan respons
             response = openai.ChatCompletion.create(
-                model="gpt-4o",  # Atau model lain yang diinginkan
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=300,
-                temperature=0.6
+                model=MODEL,
+                messages=_build_messages(prompt),
+                max_tokens=MAX_TOKENS,
+                temperature=TEMPERATURE,
+                api_key=api_key
             )
             
             # Ambil teks respons
@@ -49,4 +65,59 @@ def generate_response(prompt, api_key, max_retries=3):
             time.sleep(wait_time)
     
     # Jika semua percobaan gagal, kembalikan pesan error
-    return "Maaf, saya sedang mengalami masalah teknis. Silakan coba lagi nanti."
+    return FALLBACK_RESPONSE
+
+async def generate_response_async(prompt, api_key, max_retries=3, timeout=REQUEST_TIMEOUT):
+    """
+    Versi async dari generate_response yang tidak memblokir event loop
+    
+    Args:
+        prompt (str): Prompt yang akan dikirim ke API
+        api_key (str): OpenAI API key
+        max_retries (int): Jumlah percobaan ulang jika terjadi error
+        timeout (float): Batas waktu untuk setiap request (detik)
+        
+    Returns:
+        str: Respons dari API
+    """
+    # Client per API key dengan connection pool yang dipakai ulang
+    client = get_client(api_key)
+    
+    # Estimasi biaya token: prompt + batas token respons
+    estimated_tokens = estimate_tokens(prompt) + MAX_TOKENS
+    
+    retry = 0
+    while retry < max_retries:
+        try:
+            # Tunggu kuota RPM/TPM secukupnya daripada terkena 429
+            charged_tokens = await client.rate_limiter.acquire(estimated_tokens)
+            
+            response = await asyncio.wait_for(
+                client.chat_completion(
+                    model=MODEL,
+                    messages=_build_messages(prompt),
+                    max_tokens=MAX_TOKENS,
+                    temperature=TEMPERATURE,
+                    request_timeout=timeout
+                ),
+                timeout=timeout
+            )
+            
+            usage = response.get("usage")
+            if usage:
+                client.rate_limiter.record_usage(charged_tokens, usage["total_tokens"])
+            
+            return response.choices[0].message.content
+            
+        except Exception as e:
+            retry += 1
+            if retry >= max_retries:
+                print(f"Error calling OpenAI API: {e}. Giving up after {retry} attempts")
+                break
+            
+            # Exponential backoff tanpa memblokir chat lain
+            wait_time = 2 ** retry
+            print(f"Error calling OpenAI API: {e}. Retrying in {wait_time} seconds...")
+            await asyncio.sleep(wait_time)
+    
+    return FALLBACK_RESPONSE
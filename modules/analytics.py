@@ -4,16 +4,42 @@
 """
 Modul untuk tracking dan analisis percakapan
 Membantu memahami pola interaksi dan efektivitas persona
+
+Interaksi dicatat sebagai event JSON ringkas per baris di
+data/analytics/{username}_{tanggal}.jsonl (append-only, ditulis lewat buffer).
+File harian .json format lama tetap dibaca.
+
+Untuk setiap akun per hari disimpan juga ringkasan kecil (*.summary.json)
+berisi penghitung yang diperbarui bersamaan dengan penulisan log, sehingga
+get_daily_stats tidak perlu mem-parse ulang log mentah.
+
+Hari yang sudah lewat dipadatkan ke penyimpanan kolumnar (analytics_store.py);
+get_daily_stats_range memakai data kolumnar itu untuk laporan multi-hari.
 """
 
 import os
 import json
 import datetime
+import threading
 from modules.intent_detector import detect_intent
+from modules.write_behind import WriteBehindBuffer
+from modules.analytics_store import query_interactions, group_stats
+
+ANALYTICS_DIR = "data/analytics"
+SUMMARY_SUFFIX = ".summary.json"
 
 # Pastikan direktori analytics ada
-if not os.path.exists("data/analytics"):
-    os.makedirs("data/analytics")
+if not os.path.exists(ANALYTICS_DIR):
+    os.makedirs(ANALYTICS_DIR)
+
+def _log_file(username, date):
+    return f"{ANALYTICS_DIR}/{username}_{date}.jsonl"
+
+def _legacy_file(username, date):
+    return f"{ANALYTICS_DIR}/{username}_{date}.json"
+
+def _summary_file(username, date):
+    return f"{ANALYTICS_DIR}/{username}_{date}{SUMMARY_SUFFIX}"
 
 def log_interaction(username, message_type, message, intent=None):
     """
@@ -26,7 +52,6 @@ def log_interaction(username, message_type, message, intent=None):
         intent (dict, optional): Intent yang terdeteksi (hanya untuk pesan masuk)
     """
     today = datetime.datetime.now().strftime("%Y-%m-%d")
-    filename = f"data/analytics/{username}_{today}.json"
     
     # Jika intent tidak diberikan dan ini pesan masuk, deteksi intent
     if intent is None and message_type == "incoming":
@@ -40,27 +65,196 @@ def log_interaction(username, message_type, message, intent=None):
         "intent": intent if message_type == "incoming" else None
     }
     
-    # Baca file yang ada atau buat baru
-    if os.path.exists(filename):
-        with open(filename, 'r') as f:
+    # Ditulis ke log harian oleh buffer write-behind (digabung per akun per hari);
+    # ringkasan harian diperbarui pada saat yang sama
+    _buffer.add((username, today), interaction)
+
+def _empty_summary():
+    return {
+        "total_interactions": 0,
+        "incoming_messages": 0,
+        "outgoing_messages": 0,
+        "incoming_length": 0,
+        "outgoing_length": 0,
+        "intent_distribution": {},
+        "log_offset": 0
+    }
+
+def _fold_interaction(summary, interaction):
+    """
+    Tambahkan satu interaksi ke ringkasan harian
+    """
+    summary["total_interactions"] += 1
+    if interaction["type"] == "incoming":
+        summary["incoming_messages"] += 1
+        summary["incoming_length"] += interaction["content_length"]
+        if interaction.get("intent"):
+            intent_counts = summary["intent_distribution"]
+            for intent_type in interaction["intent"].keys():
+                intent_counts[intent_type] = intent_counts.get(intent_type, 0) + 1
+    elif interaction["type"] == "outgoing":
+        summary["outgoing_messages"] += 1
+        summary["outgoing_length"] += interaction["content_length"]
+
+def _load_summary(username, date):
+    """
+    Ambil ringkasan harian dari cache atau file ringkasan, lalu susulkan
+    event di log yang belum terhitung (misalnya setelah crash)
+
+    Harus dipanggil dengan _summary_lock dipegang.
+
+    Returns:
+        dict: Ringkasan harian, atau None jika tidak ada data
+    """
+    key = (username, date)
+    log_file = _log_file(username, date)
+    log_size = os.path.getsize(log_file) if os.path.exists(log_file) else None
+    
+    summary = _summaries.get(key)
+    if summary is None:
+        summary_file = _summary_file(username, date)
+        if os.path.exists(summary_file):
             try:
-                data = json.load(f)
+                with open(summary_file, 'r') as f:
+                    summary = json.load(f)
+            except (json.JSONDecodeError, OSError):
+                summary = None
+    
+    # Log lebih pendek dari yang sudah dihitung: file diganti, hitung ulang
+    if summary is not None and log_size is not None and log_size < summary["log_offset"]:
+        summary = None
+    
+    changed = False
+    if summary is None:
+        legacy_file = _legacy_file(username, date)
+        if log_size is None and not os.path.exists(legacy_file):
+            return None
+        
+        summary = _empty_summary()
+        changed = True
+        # File harian format lama tidak lagi ditulis, cukup dihitung sekali
+        if os.path.exists(legacy_file):
+            with open(legacy_file, 'r') as f:
+                try:
+                    for interaction in json.load(f).get("interactions", []):
+                        _fold_interaction(summary, interaction)
+                except json.JSONDecodeError:
+                    pass
+    
+    # Hitung hanya bagian log setelah offset terakhir
+    if log_size is not None and log_size > summary["log_offset"]:
+        with open(log_file, 'rb') as f:
+            f.seek(summary["log_offset"])
+            tail = f.read(log_size - summary["log_offset"])
+        # Abaikan baris terakhir yang belum lengkap; dihitung pada pembacaan berikutnya
+        complete = tail[:tail.rfind(b"\n") + 1]
+        for line in complete.split(b"\n"):
+            line = line.strip()
+            if line:
+                try:
+                    _fold_interaction(summary, json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+        summary["log_offset"] += len(complete)
+        changed = changed or bool(complete)
+    
+    if changed:
+        _save_summary(username, date, summary)
+    _summaries[key] = summary
+    return summary
+
+def _save_summary(username, date, summary):
+    """
+    Simpan ringkasan harian secara atomik
+    """
+    summary_file = _summary_file(username, date)
+    tmp_file = f"{summary_file}.tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump(summary, f, separators=(",", ":"))
+    os.replace(tmp_file, summary_file)
+
+def _write_interactions(key, interactions):
+    """
+    Tambahkan satu batch interaksi ke log harian (satu write append per batch)
+    dan perbarui ringkasan hariannya
+    """
+    username, date = key
+    lines = "".join(json.dumps(i, separators=(",", ":")) + "\n" for i in interactions)
+    
+    with _summary_lock:
+        # Pastikan ringkasan sudah mencakup seluruh isi log sebelum menambah event baru
+        summary = _load_summary(username, date) or _empty_summary()
+        
+        with open(_log_file(username, date), 'a') as f:
+            f.write(lines)
+            log_offset = f.tell()
+        
+        for interaction in interactions:
+            _fold_interaction(summary, interaction)
+        summary["log_offset"] = log_offset
+        _save_summary(username, date, summary)
+        _summaries[(username, date)] = summary
+
+# Ringkasan harian per (username, tanggal) yang sudah dimuat
+_summaries = {}
+_summary_lock = threading.Lock()
+
+_buffer = WriteBehindBuffer(_write_interactions, name="analytics_writer")
+
+def flush_analytics():
+    """
+    Tulis semua interaksi yang masih di buffer ke disk
+    """
+    _buffer.flush()
+
+def load_interactions(username, date):
+    """
+    Baca semua interaksi mentah satu akun pada satu tanggal
+
+    Args:
+        username (str): Username akun JTRADE
+        date (str): Tanggal dalam format YYYY-MM-DD
+
+    Returns:
+        list: Daftar interaksi, atau None jika tidak ada data untuk tanggal tersebut
+    """
+    legacy_file = _legacy_file(username, date)
+    log_file = _log_file(username, date)
+    
+    if not os.path.exists(legacy_file) and not os.path.exists(log_file):
+        return None
+    
+    interactions = []
+    
+    # Format lama: satu dokumen JSON per hari
+    if os.path.exists(legacy_file):
+        with open(legacy_file, 'r') as f:
+            try:
+                interactions.extend(json.load(f).get("interactions", []))
             except json.JSONDecodeError:
-                data = {"interactions": []}
-    else:
-        data = {"interactions": []}
+                pass
     
-    # Tambahkan interaksi baru
-    data["interactions"].append(interaction)
+    # Format baru: satu event per baris
+    if os.path.exists(log_file):
+        with open(log_file, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        interactions.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        # Baris terakhir bisa terpotong jika proses berhenti mendadak
+                        continue
     
-    # Simpan kembali ke file
-    with open(filename, 'w') as f:
-        json.dump(data, f, indent=4)
+    return interactions
 
 def get_daily_stats(username, date=None):
     """
     Mendapatkan statistik harian untuk sebuah akun
     
+    Statistik diambil dari ringkasan harian yang diperbarui setiap kali
+    interaksi ditulis, tanpa membaca ulang seluruh log hari tersebut.
+    
     Args:
         username (str): Username akun JTRADE
         date (str, optional): Tanggal dalam format YYYY-MM-DD
@@ -71,39 +265,62 @@ def get_daily_stats(username, date=None):
     if date is None:
         date = datetime.datetime.now().strftime("%Y-%m-%d")
     
-    filename = f"data/analytics/{username}_{date}.json"
+    # Pastikan interaksi yang masih di buffer ikut terhitung
+    flush_analytics()
     
-    if not os.path.exists(filename):
-        return {"message": "No data available for this date"}
+    with _summary_lock:
+        summary = _load_summary(username, date)
+        if summary is None:
+            return {"message": "No data available for this date"}
+        
+        incoming = summary["incoming_messages"]
+        outgoing = summary["outgoing_messages"]
+        stats = {
+            "date": date,
+            "total_interactions": summary["total_interactions"],
+            "incoming_messages": incoming,
+            "outgoing_messages": outgoing,
+            "avg_incoming_length": summary["incoming_length"] / incoming if incoming else 0,
+            "avg_outgoing_length": summary["outgoing_length"] / outgoing if outgoing else 0,
+            "intent_distribution": dict(summary["intent_distribution"])
+        }
     
-    with open(filename, 'r') as f:
-        data = json.load(f)
+    return stats
+
+def get_daily_stats_range(username, start_date, end_date):
+    """
+    Mendapatkan statistik harian untuk rentang tanggal sekaligus
     
-    # Hitung statistik
-    incoming = [i for i in data["interactions"] if i["type"] == "incoming"]
-    outgoing = [i for i in data["interactions"] if i["type"] == "outgoing"]
+    Hari yang sudah dipadatkan dihitung dari penyimpanan kolumnar dengan satu
+    agregasi vektor; hari lainnya (misalnya hari ini) memakai get_daily_stats.
     
-    # Intent stats
-    intent_counts = {}
-    for interaction in incoming:
-        if interaction.get("intent"):
-            for intent_type in interaction["intent"].keys():
-                if intent_type in intent_counts:
-                    intent_counts[intent_type] += 1
-                else:
-                    intent_counts[intent_type] = 1
-    
-    stats = {
-        "date": date,
-        "total_interactions": len(data["interactions"]),
-        "incoming_messages": len(incoming),
-        "outgoing_messages": len(outgoing),
-        "avg_incoming_length": sum([i["content_length"] for i in incoming]) / len(incoming) if incoming else 0,
-        "avg_outgoing_length": sum([i["content_length"] for i in outgoing]) / len(outgoing) if outgoing else 0,
-        "intent_distribution": intent_counts
-    }
+    Args:
+        username (str): Username akun JTRADE
+        start_date (str): Tanggal awal dalam format YYYY-MM-DD
+        end_date (str): Tanggal akhir dalam format YYYY-MM-DD (inklusif)
+        
+    Returns:
+        dict: Tanggal -> statistik harian (format get_daily_stats), urut tanggal,
+            hanya untuk hari yang memiliki data
+    """
+    columns = query_interactions(start_date, end_date, [username])
+    compacted = group_stats(columns, by="day")
     
-    return stats
+    results = {}
+    current = datetime.datetime.strptime(start_date, "%Y-%m-%d")
+    end = datetime.datetime.strptime(end_date, "%Y-%m-%d")
+    while current <= end:
+        date = current.strftime("%Y-%m-%d")
+        if f"{username}_{date}" in columns["compacted"]:
+            if date in compacted:
+                results[date] = dict(date=date, **compacted[date])
+        else:
+            daily = get_daily_stats(username, date)
+            if "message" not in daily:
+                results[date] = daily
+        current += datetime.timedelta(days=1)
+    
+    return results
 
 def get_weekly_stats(username, end_date=None, days=7):
     """
@@ -133,26 +350,23 @@ def get_weekly_stats(username, end_date=None, days=7):
         "intent_distribution": {}
     }
     
-    # Hitung untuk setiap hari
-    for i in range(days-1, -1, -1):  # Mulai dari hari paling awal
-        date = (end_date - datetime.timedelta(days=i)).strftime("%Y-%m-%d")
-        daily = get_daily_stats(username, date)
+    # Hitung untuk setiap hari yang memiliki data (mulai dari hari paling awal)
+    daily_range = get_daily_stats_range(username, weekly_stats["period_start"], weekly_stats["period_end"])
+    for date, daily in daily_range.items():
+        weekly_stats["total_interactions"] += daily["total_interactions"]
+        weekly_stats["incoming_messages"] += daily["incoming_messages"]
+        weekly_stats["outgoing_messages"] += daily["outgoing_messages"]
+        weekly_stats["daily_stats"].append({
+            "date": date,
+            "interactions": daily["total_interactions"]
+        })
         
-        if "message" not in daily:  # Jika ada data
-            weekly_stats["total_interactions"] += daily["total_interactions"]
-            weekly_stats["incoming_messages"] += daily["incoming_messages"]
-            weekly_stats["outgoing_messages"] += daily["outgoing_messages"]
-            weekly_stats["daily_stats"].append({
-                "date": date,
-                "interactions": daily["total_interactions"]
-            })
-            
-            # Gabungkan distribusi intent
-            for intent, count in daily.get("intent_distribution", {}).items():
-                if intent in weekly_stats["intent_distribution"]:
-                    weekly_stats["intent_distribution"][intent] += count
-                else:
-                    weekly_stats["intent_distribution"][intent] = count
+        # Gabungkan distribusi intent
+        for intent, count in daily.get("intent_distribution", {}).items():
+            if intent in weekly_stats["intent_distribution"]:
+                weekly_stats["intent_distribution"][intent] += count
+            else:
+                weekly_stats["intent_distribution"][intent] = count
     
     # Hitung rata-rata jika ada data
     if weekly_stats["daily_stats"]:
@@ -195,34 +409,28 @@ def generate_dashboard_data(username, period_days=30):
         }
     }
     
-    # Hitung untuk setiap hari
-    current_date = start_date
-    while current_date <= end_date:
-        date_str = current_date.strftime("%Y-%m-%d")
-        daily = get_daily_stats(username, date_str)
+    # Hitung untuk setiap hari yang memiliki data
+    daily_range = get_daily_stats_range(username, dashboard["period"]["start"], dashboard["period"]["end"])
+    for date_str, daily in daily_range.items():
+        # Update summary
+        dashboard["summary"]["total_interactions"] += daily["total_interactions"]
+        dashboard["summary"]["incoming_messages"] += daily["incoming_messages"]
+        dashboard["summary"]["outgoing_messages"] += daily["outgoing_messages"]
         
-        if "message" not in daily:
-            # Update summary
-            dashboard["summary"]["total_interactions"] += daily["total_interactions"]
-            dashboard["summary"]["incoming_messages"] += daily["incoming_messages"]
-            dashboard["summary"]["outgoing_messages"] += daily["outgoing_messages"]
-            
-            # Add daily trend
-            dashboard["trends"]["daily"].append({
-                "date": date_str,
-                "interactions": daily["total_interactions"],
-                "incoming": daily["incoming_messages"],
-                "outgoing": daily["outgoing_messages"]
-            })
-            
-            # Update intent distribution
-            for intent, count in daily.get("intent_distribution", {}).items():
-                if intent in dashboard["trends"]["intent_distribution"]:
-                    dashboard["trends"]["intent_distribution"][intent] += count
-                else:
-                    dashboard["trends"]["intent_distribution"][intent] = count
+        # Add daily trend
+        dashboard["trends"]["daily"].append({
+            "date": date_str,
+            "interactions": daily["total_interactions"],
+            "incoming": daily["incoming_messages"],
+            "outgoing": daily["outgoing_messages"]
+        })
         
-        current_date += datetime.timedelta(days=1)
+        # Update intent distribution
+        for intent, count in daily.get("intent_distribution", {}).items():
+            if intent in dashboard["trends"]["intent_distribution"]:
+                dashboard["trends"]["intent_distribution"][intent] += count
+            else:
+                dashboard["trends"]["intent_distribution"][intent] = count
     
     # Sort intent distribution
     dashboard["trends"]["top_intents"] = sorted(
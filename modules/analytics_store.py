@@ -0,0 +1,485 @@
+# modules/analytics_store.py
+
+"""
+Penyimpanan kolumnar untuk data analitik historis
+Hari yang sudah lewat dipadatkan (compaction) dari log harian ke file NumPy
+.npz per bulan dengan kolom: timestamp, day, account, type, length, intent.
+Intent disimpan sebagai bitmask (satu bit per nama intent), sehingga query
+group-by akun/hari/intent untuk satu bulan cukup beberapa operasi vektor.
+
+Log harian tetap menjadi sumber data asli; file kolumnar bisa dibuat ulang
+kapan saja dengan menghapus direktori COLUMNAR_DIR. Ukuran dan mtime log
+setiap hari yang dipadatkan ikut disimpan, sehingga hari yang lognya berubah
+setelah dipadatkan (misalnya flush write-behind lewat tengah malam) tidak
+dipercaya dan dipadatkan ulang.
+"""
+
+import os
+import re
+import time
+import datetime
+import argparse
+import threading
+import numpy as np
+
+COLUMNAR_DIR = "data/analytics/columnar"
+# Maksimum jumlah nama intent yang bisa disimpan di bitmask uint64
+MAX_INTENTS = 64
+
+TYPE_CODES = {"incoming": 0, "outgoing": 1}
+TYPE_OTHER = 2
+
+COLUMNS = ("timestamp", "day", "account", "type", "length", "intent")
+COLUMN_DTYPES = {
+    "timestamp": np.float64,  # detik sejak epoch (NaN jika tidak ada)
+    "day": np.int32,          # hari sejak 1970-01-01 (tanggal file harian)
+    "account": np.int32,      # indeks ke daftar akun
+    "type": np.uint8,         # TYPE_CODES
+    "length": np.int32,       # panjang konten
+    "intent": np.uint64       # bitmask indeks ke daftar intent
+}
+
+_DAY_FILE_PATTERN = re.compile(r"^(.+)_(\d{4}-\d{2}-\d{2})\.jsonl?$")
+_EPOCH = datetime.date(1970, 1, 1)
+
+# Cache partisi yang sudah dimuat: path -> (mtime, data)
+_partitions = {}
+_lock = threading.Lock()
+_last_compaction_date = None
+
+if not os.path.exists(COLUMNAR_DIR):
+    os.makedirs(COLUMNAR_DIR)
+
+def date_to_day(date):
+    """
+    Konversi tanggal (str YYYY-MM-DD atau date/datetime) ke nomor hari sejak epoch
+    """
+    if isinstance(date, str):
+        date = datetime.datetime.strptime(date, "%Y-%m-%d").date()
+    elif isinstance(date, datetime.datetime):
+        date = date.date()
+    return (date - _EPOCH).days
+
+def day_to_date(day):
+    """
+    Konversi nomor hari sejak epoch ke string YYYY-MM-DD
+    """
+    return (_EPOCH + datetime.timedelta(days=int(day))).strftime("%Y-%m-%d")
+
+def _partition_path(month):
+    return os.path.join(COLUMNAR_DIR, f"{month}.npz")
+
+def _empty_partition():
+    data = {name: np.zeros(0, dtype=dtype) for name, dtype in COLUMN_DTYPES.items()}
+    data["accounts"] = []
+    data["intents"] = []
+    data["compacted"] = set()
+    data["sources"] = {}
+    return data
+
+def _source_signature(analytics_dir, username, date):
+    """
+    Tanda versi log harian (ukuran dan mtime file .json lama + .jsonl)
+
+    Returns:
+        str: Signature, berubah setiap kali log hari tersebut ditulis
+    """
+    size = 0
+    mtime_ns = 0
+    for suffix in (".json", ".jsonl"):
+        try:
+            stat = os.stat(os.path.join(analytics_dir, f"{username}_{date}{suffix}"))
+        except OSError:
+            continue
+        size += stat.st_size
+        mtime_ns = max(mtime_ns, stat.st_mtime_ns)
+    return f"{size}:{mtime_ns}"
+
+def _load_partition(month):
+    """
+    Muat satu partisi bulanan (di-cache selama file tidak berubah)
+    """
+    path = _partition_path(month)
+    if not os.path.exists(path):
+        return None
+
+    mtime = os.path.getmtime(path)
+    cached = _partitions.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    with np.load(path, allow_pickle=False) as npz:
+        data = {name: npz[name] for name in COLUMNS}
+        data["accounts"] = npz["accounts"].tolist()
+        data["intents"] = npz["intents"].tolist()
+        data["compacted"] = set(npz["compacted"].tolist())
+        # Partisi lama tanpa signature: setiap harinya dianggap perlu dipadatkan ulang
+        if "sources" in npz.files:
+            data["sources"] = dict(zip(npz["source_keys"].tolist(), npz["sources"].tolist()))
+        else:
+            data["sources"] = {}
+
+    _partitions[path] = (mtime, data)
+    return data
+
+def _save_partition(month, data):
+    """
+    Simpan partisi bulanan secara atomik
+    """
+    path = _partition_path(month)
+    tmp_path = f"{path}.tmp.npz"
+    np.savez(
+        tmp_path,
+        accounts=np.array(data["accounts"], dtype=str),
+        intents=np.array(data["intents"], dtype=str),
+        compacted=np.array(sorted(data["compacted"]), dtype=str),
+        source_keys=np.array(list(data["sources"]), dtype=str),
+        sources=np.array(list(data["sources"].values()), dtype=str),
+        **{name: data[name] for name in COLUMNS}
+    )
+    os.replace(tmp_path, path)
+    _partitions[path] = (os.path.getmtime(path), data)
+
+def _parse_timestamp(value):
+    try:
+        return datetime.datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return np.nan
+
+def _encode_day(data, username, date, interactions):
+    """
+    Ubah interaksi satu akun satu hari menjadi kolom (memperluas kosakata akun/intent)
+    """
+    if username not in data["accounts"]:
+        data["accounts"].append(username)
+    account = data["accounts"].index(username)
+
+    intents = data["intents"]
+    n = len(interactions)
+    timestamps = np.empty(n, dtype=np.float64)
+    types = np.empty(n, dtype=np.uint8)
+    lengths = np.empty(n, dtype=np.int32)
+    masks = np.zeros(n, dtype=np.uint64)
+
+    for row, interaction in enumerate(interactions):
+        timestamps[row] = _parse_timestamp(interaction.get("timestamp"))
+        types[row] = TYPE_CODES.get(interaction.get("type"), TYPE_OTHER)
+        lengths[row] = interaction.get("content_length", 0)
+
+        mask = 0
+        for intent_type in (interaction.get("intent") or {}).keys():
+            if intent_type not in intents:
+                if len(intents) >= MAX_INTENTS:
+                    raise ValueError(f"Lebih dari {MAX_INTENTS} jenis intent, bitmask tidak cukup")
+                intents.append(intent_type)
+            mask |= 1 << intents.index(intent_type)
+        masks[row] = mask
+
+    return {
+        "timestamp": timestamps,
+        "day": np.full(n, date_to_day(date), dtype=np.int32),
+        "account": np.full(n, account, dtype=np.int32),
+        "type": types,
+        "length": lengths,
+        "intent": masks
+    }
+
+def compact_closed_days(analytics_dir=None, today=None):
+    """
+    Padatkan log harian yang sudah lewat (tanggal < hari ini) ke partisi kolumnar
+
+    Hari yang sudah dipadatkan tetapi lognya berubah sejak itu dipadatkan ulang
+    (baris lamanya diganti).
+
+    Args:
+        analytics_dir (str, optional): Direktori log analitik harian
+        today (str, optional): Tanggal hari ini (YYYY-MM-DD), hari ini dan setelahnya dilewati
+
+    Returns:
+        int: Jumlah hari-akun yang baru (atau ulang) dipadatkan
+    """
+    from modules.analytics import ANALYTICS_DIR, flush_analytics, load_interactions
+
+    analytics_dir = analytics_dir or ANALYTICS_DIR
+    today = today or datetime.datetime.now().strftime("%Y-%m-%d")
+
+    # Interaksi kemarin yang masih di buffer harus ikut dipadatkan
+    flush_analytics()
+
+    # Kumpulkan (username, tanggal) per bulan
+    candidates = {}
+    for filename in os.listdir(analytics_dir):
+        match = _DAY_FILE_PATTERN.match(filename)
+        if not match:
+            continue
+        username, date = match.groups()
+        if date >= today:
+            continue
+        candidates.setdefault(date[:7], set()).add((username, date))
+
+    compacted = 0
+    with _lock:
+        for month, days in sorted(candidates.items()):
+            data = _load_partition(month) or _empty_partition()
+            # Signature diambil sebelum log dibaca: tulisan yang masuk saat
+            # membaca membuat hari itu terdeteksi berubah pada pemeriksaan berikutnya
+            signatures = {(username, date): _source_signature(analytics_dir, username, date)
+                          for username, date in days}
+            pending = sorted(d for d in days if data["sources"].get(f"{d[0]}_{d[1]}") != signatures[d])
+            if not pending:
+                continue
+
+            # Salin daftar agar cache lama tidak ikut berubah jika terjadi error
+            data = dict(data, accounts=list(data["accounts"]), intents=list(data["intents"]),
+                        compacted=set(data["compacted"]), sources=dict(data["sources"]))
+
+            # Buang baris lama dari hari yang dipadatkan ulang
+            keep = np.ones(len(data["day"]), dtype=bool)
+            for username, date in pending:
+                if f"{username}_{date}" in data["compacted"] and username in data["accounts"]:
+                    keep &= ~((data["account"] == data["accounts"].index(username))
+                              & (data["day"] == date_to_day(date)))
+            parts = [{name: data[name][keep] for name in COLUMNS}]
+
+            for username, date in pending:
+                interactions = load_interactions(username, date) or []
+                parts.append(_encode_day(data, username, date, interactions))
+                data["compacted"].add(f"{username}_{date}")
+                data["sources"][f"{username}_{date}"] = signatures[(username, date)]
+
+            for name in COLUMNS:
+                data[name] = np.concatenate([part[name] for part in parts]).astype(COLUMN_DTYPES[name])
+
+            _save_partition(month, data)
+            compacted += len(pending)
+
+    return compacted
+
+def _maybe_compact():
+    """
+    Jalankan compaction paling banyak sekali per hari per proses
+    """
+    global _last_compaction_date
+    today = datetime.datetime.now().strftime("%Y-%m-%d")
+    if _last_compaction_date != today:
+        try:
+            compact_closed_days(today=today)
+        except Exception as e:
+            print(f"Error compacting analytics: {e}")
+        _last_compaction_date = today
+
+def _months_between(start_date, end_date):
+    months = []
+    year, month = start_date.year, start_date.month
+    while (year, month) <= (end_date.year, end_date.month):
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+def query_interactions(start_date, end_date, usernames=None):
+    """
+    Ambil kolom interaksi terpadatkan untuk rentang tanggal (inklusif)
+
+    Args:
+        start_date (str): Tanggal awal (YYYY-MM-DD)
+        end_date (str): Tanggal akhir (YYYY-MM-DD)
+        usernames (list, optional): Batasi ke akun tertentu
+
+    Returns:
+        dict: Kolom (np.ndarray) dengan kode akun/intent yang diseragamkan, plus
+            "accounts" dan "intents" (kosakata) serta "compacted" (set "username_tanggal")
+    """
+    from modules.analytics import ANALYTICS_DIR
+
+    _maybe_compact()
+
+    start = datetime.datetime.strptime(start_date, "%Y-%m-%d").date()
+    end = datetime.datetime.strptime(end_date, "%Y-%m-%d").date()
+    start_day, end_day = date_to_day(start), date_to_day(end)
+    months = _months_between(start, end)
+
+    def in_range(key):
+        username, date = key.rsplit("_", 1)
+        return start_date <= date <= end_date and (usernames is None or username in usernames)
+
+    def stale_keys(partitions):
+        return {
+            key
+            for data in partitions if data is not None
+            for key in data["compacted"]
+            if in_range(key) and data["sources"].get(key) != _source_signature(ANALYTICS_DIR, *key.rsplit("_", 1))
+        }
+
+    with _lock:
+        partitions = [_load_partition(month) for month in months]
+
+    # Log hari yang sudah dipadatkan berubah (interaksi terlambat): padatkan ulang
+    stale = stale_keys(partitions)
+    if stale:
+        try:
+            compact_closed_days()
+        except Exception as e:
+            print(f"Error compacting analytics: {e}")
+        with _lock:
+            partitions = [_load_partition(month) for month in months]
+        stale = stale_keys(partitions)
+
+    accounts = []
+    intents = []
+    compacted = set()
+    parts = []
+
+    for data in partitions:
+        if data is None:
+            continue
+
+        # Petakan kode lokal partisi ke kosakata gabungan
+        account_map = np.array([_vocab_index(accounts, name) for name in data["accounts"]] or [0], dtype=np.int32)
+        intent_map = [_vocab_index(intents, name) for name in data["intents"]]
+
+        mask = (data["day"] >= start_day) & (data["day"] <= end_day)
+        if usernames is not None:
+            wanted = [i for i, name in enumerate(data["accounts"]) if name in usernames]
+            mask &= np.isin(data["account"], wanted)
+        # Hari yang masih berubah tidak dipakai; pemanggil membaca log aslinya
+        for key in stale:
+            username, date = key.rsplit("_", 1)
+            if key in data["compacted"] and username in data["accounts"]:
+                mask &= ~((data["account"] == data["accounts"].index(username))
+                          & (data["day"] == date_to_day(date)))
+
+        part = {name: data[name][mask] for name in COLUMNS}
+        part["account"] = account_map[part["account"]] if len(part["account"]) else part["account"]
+        if intent_map != list(range(len(intent_map))):
+            part["intent"] = _remap_bits(part["intent"], intent_map)
+        parts.append(part)
+
+        for key in data["compacted"]:
+            if in_range(key) and key not in stale:
+                compacted.add(key)
+
+    columns = {
+        name: np.concatenate([part[name] for part in parts]) if parts else np.zeros(0, dtype=dtype)
+        for name, dtype in COLUMN_DTYPES.items()
+    }
+    columns["accounts"] = accounts
+    columns["intents"] = intents
+    columns["compacted"] = compacted
+    return columns
+
+def _vocab_index(vocab, name):
+    if name not in vocab:
+        vocab.append(name)
+    return vocab.index(name)
+
+def _remap_bits(masks, bit_map):
+    """
+    Pindahkan bit intent dari posisi lokal partisi ke posisi kosakata gabungan
+    """
+    remapped = np.zeros_like(masks)
+    for local, merged in enumerate(bit_map):
+        bit = (masks >> np.uint64(local)) & np.uint64(1)
+        remapped |= bit << np.uint64(merged)
+    return remapped
+
+def group_stats(columns, by="day"):
+    """
+    Agregasi vektor (group-by) atas kolom hasil query_interactions
+
+    Args:
+        columns (dict): Hasil query_interactions
+        by (str): 'day', 'account' atau 'account_day'
+
+    Returns:
+        dict: Kunci grup (tanggal, username, atau (username, tanggal)) ->
+            statistik dengan format yang sama seperti get_daily_stats
+    """
+    if by == "day":
+        keys, inverse = np.unique(columns["day"], return_inverse=True)
+        labels = [day_to_date(day) for day in keys]
+    elif by == "account":
+        keys, inverse = np.unique(columns["account"], return_inverse=True)
+        labels = [columns["accounts"][account] for account in keys]
+    elif by == "account_day":
+        combined = columns["account"].astype(np.int64) << 32 | columns["day"].astype(np.int64)
+        keys, inverse = np.unique(combined, return_inverse=True)
+        labels = [(columns["accounts"][int(key >> 32)], day_to_date(key & 0xFFFFFFFF)) for key in keys]
+    else:
+        raise ValueError(f"Group-by '{by}' tidak didukung. Gunakan 'day', 'account' atau 'account_day'.")
+
+    n_groups = len(keys)
+    inverse = inverse.ravel()
+    incoming = columns["type"] == TYPE_CODES["incoming"]
+    outgoing = columns["type"] == TYPE_CODES["outgoing"]
+    lengths = columns["length"].astype(np.float64)
+
+    total = np.bincount(inverse, minlength=n_groups)
+    incoming_count = np.bincount(inverse, weights=incoming, minlength=n_groups)
+    outgoing_count = np.bincount(inverse, weights=outgoing, minlength=n_groups)
+    incoming_length = np.bincount(inverse, weights=lengths * incoming, minlength=n_groups)
+    outgoing_length = np.bincount(inverse, weights=lengths * outgoing, minlength=n_groups)
+
+    # Hitung per intent: satu bincount per bit, hanya pesan masuk
+    intent_counts = np.zeros((len(columns["intents"]), n_groups), dtype=np.int64)
+    incoming_masks = np.where(incoming, columns["intent"], np.uint64(0))
+    for bit in range(len(columns["intents"])):
+        hits = ((incoming_masks >> np.uint64(bit)) & np.uint64(1)).astype(bool)
+        intent_counts[bit] = np.bincount(inverse, weights=hits, minlength=n_groups)
+
+    results = {}
+    for group, label in enumerate(labels):
+        n_in = int(incoming_count[group])
+        n_out = int(outgoing_count[group])
+        results[label] = {
+            "total_interactions": int(total[group]),
+            "incoming_messages": n_in,
+            "outgoing_messages": n_out,
+            "avg_incoming_length": float(incoming_length[group] / n_in) if n_in else 0,
+            "avg_outgoing_length": float(outgoing_length[group] / n_out) if n_out else 0,
+            "intent_distribution": {
+                name: int(intent_counts[bit, group])
+                for bit, name in enumerate(columns["intents"])
+                if intent_counts[bit, group]
+            }
+        }
+    return results
+
+def benchmark(accounts=5, days=30, per_day=2000, seed=0):
+    """
+    Ukur waktu query dashboard satu bulan di atas data sintetis di memori
+
+    Returns:
+        dict: Jumlah baris dan waktu group-by per hari / per akun (ms)
+    """
+    rng = np.random.default_rng(seed)
+    n = accounts * days * per_day
+    columns = {
+        "timestamp": np.zeros(n),
+        "day": np.repeat(np.arange(days, dtype=np.int32), accounts * per_day),
+        "account": np.tile(np.repeat(np.arange(accounts, dtype=np.int32), per_day), days),
+        "type": rng.integers(0, 2, n).astype(np.uint8),
+        "length": rng.integers(1, 500, n).astype(np.int32),
+        "intent": rng.integers(0, 1 << 12, n).astype(np.uint64),
+        "accounts": [f"account{i}" for i in range(accounts)],
+        "intents": [f"intent{i}" for i in range(12)]
+    }
+
+    report = {"rows": n}
+    for by in ("day", "account", "account_day"):
+        start = time.perf_counter()
+        group_stats(columns, by)
+        report[f"{by}_ms"] = (time.perf_counter() - start) * 1000
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compaction dan benchmark penyimpanan analitik kolumnar")
+    parser.add_argument("command", choices=["compact", "benchmark"])
+    args = parser.parse_args()
+
+    if args.command == "compact":
+        print(f"{compact_closed_days()} hari-akun dipadatkan ke {COLUMNAR_DIR}")
+    else:
+        report = benchmark()
+        print(f"rows={report['rows']}")
+        for by in ("day", "account", "account_day"):
+            print(f"group by {by:<12}: {report[f'{by}_ms']:.2f} ms")
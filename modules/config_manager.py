@@ -11,16 +11,20 @@ import yaml
 import logging
 from pathlib import Path
 
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("data/logs/config.log", mode='a'),
-        logging.StreamHandler()
-    ]
-)
+# Pastikan direktori log ada sebelum FileHandler dibuat
+os.makedirs("data/logs", exist_ok=True)
+
+# Set up logging: hanya logger modul ini, agar modul lain yang mengimpor
+# config_manager (conversation, prompt_trace) tidak mengubah konfigurasi
+# logging root milik bot dan Telethon
 logger = logging.getLogger('config_manager')
+if not logger.handlers:
+    _formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    for _handler in (logging.FileHandler("data/logs/config.log", mode='a', delay=True), logging.StreamHandler()):
+        _handler.setFormatter(_formatter)
+        logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
 
 # Default config
 DEFAULT_CONFIG = {
@@ -48,20 +52,30 @@ DEFAULT_CONFIG = {
         "enable_tracking": True,
         "retention_days": 30
     },
+    "prompt_trace": {
+        "default_rate": 0.0,  # porsi prompt yang dicatat (0-1)
+        "accounts": {}        # rate per username
+    },
     "storage": {
         "auto_backup": True,
         "backup_interval_days": 7,
         "cleanup_old_data": True,
-        "data_retention_days": 90
+        "data_retention_days": 90,
+        "conversation_backend": "jsonl",  # 'jsonl' atau 'sqlite'
+        "conversation_db_path": "data/db/jtrade.db"
     }
 }
 
-def get_config_path():
+def get_config_path(create_default=True):
     """
     Dapatkan path file konfigurasi
     
+    Args:
+        create_default (bool): Buat config/config.json default jika belum ada
+        
     Returns:
-        str: Path ke file konfigurasi
+        str: Path ke file konfigurasi, atau None jika tidak ada dan
+            create_default=False
     """
     # Urutan pencarian konfigurasi
     config_paths = [
@@ -74,6 +88,9 @@ def get_config_path():
         if os.path.exists(path):
             return path
     
+    if not create_default:
+        return None
+    
     # Jika tidak ditemukan, buat default
     os.makedirs("config", exist_ok=True)
     default_path = "config/config.json"
@@ -84,15 +101,21 @@ def get_config_path():
     logger.info(f"Created default configuration at {default_path}")
     return default_path
 
-def load_config():
+def load_config(create_default=True):
     """
     Muat konfigurasi dari file
     
+    Args:
+        create_default (bool): Buat file konfigurasi default jika belum ada;
+            jika False dan file tidak ada, nilai default dipakai tanpa menulis file
+    
     Returns:
         dict: Konfigurasi sistem
     """
-    config_path = get_config_path()
+    config_path = get_config_path(create_default)
     config = DEFAULT_CONFIG.copy()  # Start with defaults
+    if config_path is None:
+        return config
     
     try:
         # Determine file type
@@ -199,7 +222,8 @@ def get_specific_config(key_path, default=None):
     Returns:
         object: Nilai konfigurasi atau default
     """
-    config = load_config()
+    # Hanya membaca: jangan membuat file konfigurasi sebagai efek samping
+    config = load_config(create_default=False)
     keys = key_path.split('.')
     
     # Navigate through nested dict
@@ -3,23 +3,364 @@
 """
 Modul untuk mengelola riwayat percakapan
 Menyimpan dan mengambil riwayat chat untuk referensi dalam menghasilkan respons
+
+Riwayat disimpan sebagai log append-only (satu pesan JSON per baris, .jsonl)
+sehingga biaya menulis satu pesan tetap O(1) berapa pun panjang riwayatnya.
+Penulisan ke disk dilakukan write-behind oleh thread latar belakang.
+File .json lama dikonversi otomatis saat pertama kali disentuh.
+
+Backend penyimpanan dipilih lewat konfigurasi storage.conversation_backend:
+'jsonl' (default, satu file per chat) atau 'sqlite' (lihat conversation_sqlite.py).
+Pembaca lain (data_management, label ulang intent, training model intent)
+memakai list_conversation_info / read_conversation / iter_conversations agar
+melihat data yang sama apa pun backend-nya.
 """
 
 import os
 import json
+import time
+import atexit
+import asyncio
 import datetime
+import functools
+import threading
+from collections import OrderedDict, deque
+from modules.write_behind import WriteBehindBuffer
+
+CONVERSATIONS_DIR = "data/conversations"
+
+# fsync dilakukan berkelompok: setiap batch write-behind disinkronkan setelah
+# ditulis, dan di dalam batch besar paling lambat setiap interval ini (detik)
+FSYNC_INTERVAL = 1.0
+# Jumlah maksimum file log yang dibiarkan terbuka
+MAX_OPEN_FILES = 256
+# Ring buffer pesan terakhir per chat untuk chat yang sedang aktif
+RECENT_MESSAGES = 20
+MAX_HOT_CHATS = 1024
+# Ukuran blok saat membaca file dari belakang
+TAIL_BLOCK_SIZE = 8192
 
 # Pastikan direktori data ada
 if not os.path.exists("data"):
     os.makedirs("data")
 
-if not os.path.exists("data/conversations"):
-    os.makedirs("data/conversations")
+if not os.path.exists(CONVERSATIONS_DIR):
+    os.makedirs(CONVERSATIONS_DIR)
+
+class AppendOnlyLog:
+    """
+    Penulis log append-only dengan file descriptor yang dipakai ulang
+    dan fsync berkelompok
+    """
+
+    def __init__(self, fsync_interval=FSYNC_INTERVAL, max_open_files=MAX_OPEN_FILES):
+        """
+        Args:
+            fsync_interval (float): Jeda maksimum antar fsync (detik)
+            max_open_files (int): Jumlah file descriptor yang disimpan terbuka
+        """
+        self.fsync_interval = fsync_interval
+        self.max_open_files = max_open_files
+        self._fds = OrderedDict()
+        self._dirty = set()
+        self._last_sync = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _get_fd(self, path):
+        fd = self._fds.get(path)
+        if fd is not None:
+            self._fds.move_to_end(path)
+            return fd
+
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._fds[path] = fd
+
+        # Tutup file yang paling lama tidak dipakai
+        while len(self._fds) > self.max_open_files:
+            old_path, old_fd = self._fds.popitem(last=False)
+            if old_path in self._dirty:
+                os.fsync(old_fd)
+                self._dirty.discard(old_path)
+            os.close(old_fd)
+        return fd
+
+    def append(self, path, records):
+        """
+        Tambahkan satu atau beberapa record ke akhir file
+
+        Args:
+            path (str): Path file log
+            records (list): Daftar dict yang akan ditulis, satu per baris
+        """
+        data = "".join(json.dumps(r, ensure_ascii=False, separators=(",", ":")) + "\n" for r in records)
+        with self._lock:
+            # Satu write() dengan O_APPEND agar baris tidak saling tumpang tindih
+            os.write(self._get_fd(path), data.encode("utf-8"))
+            self._dirty.add(path)
+
+            if time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync_locked()
+
+    def _sync_locked(self):
+        for path in self._dirty:
+            fd = self._fds.get(path)
+            if fd is not None:
+                os.fsync(fd)
+        self._dirty.clear()
+        self._last_sync = time.monotonic()
+
+    def sync(self):
+        """
+        Paksa fsync untuk semua file yang belum tersinkron
+        """
+        with self._lock:
+            self._sync_locked()
+
+    def close(self):
+        """
+        Sinkronkan dan tutup semua file
+        """
+        with self._lock:
+            self._sync_locked()
+            for fd in self._fds.values():
+                os.close(fd)
+            self._fds.clear()
+
+_log = AppendOnlyLog()
+
+class JsonlConversationBackend:
+    """
+    Backend default: satu log .jsonl append-only per chat
+    """
+
+    name = "jsonl"
+
+    def append_batch(self, batch):
+        """
+        Tulis pesan yang terkumpul, satu append per chat
+
+        Args:
+            batch (dict): (username, chat_id, user_id) -> daftar pesan
+        """
+        for key, messages in batch.items():
+            _log.append(get_conversation_file(*key), messages)
+
+    def tail(self, key, count):
+        """
+        Ambil `count` pesan terakhir sebuah chat dari ujung file
+        """
+        filename = get_conversation_file(*key)
+        if not os.path.exists(filename):
+            return []
+        return read_last_messages(filename, count)
+
+    def read_all(self, key):
+        """
+        Ambil seluruh pesan sebuah chat
+        """
+        filename = get_conversation_file(*key)
+        if not os.path.exists(filename):
+            return []
+        return read_messages(filename)
+
+    def conversations(self, username=None, key=None):
+        """
+        Ringkasan setiap file percakapan
+
+        Args:
+            username (str, optional): Filter akun JTRADE
+            key (tuple, optional): Hanya percakapan (username, chat_id, user_id) ini
+
+        Returns:
+            list: Dict berisi username, chat_id, user_id, path, filename, size,
+                modified, messages, first_timestamp, last_timestamp
+        """
+        if key is not None:
+            paths = [get_conversation_file(*key)]
+        else:
+            pattern = f"{username}_" if username else ""
+            paths = [
+                os.path.join(CONVERSATIONS_DIR, filename)
+                for filename in sorted(os.listdir(CONVERSATIONS_DIR))
+                if filename.startswith(pattern) and filename.lower().endswith((".json", ".jsonl"))
+            ]
+
+        results = []
+        for path in paths:
+            if not os.path.isfile(path):
+                continue
+            stat = os.stat(path)
+            info = {
+                "path": path,
+                "filename": os.path.basename(path),
+                "size": stat.st_size,
+                "modified": datetime.datetime.fromtimestamp(stat.st_mtime)
+            }
+            parts = os.path.splitext(info["filename"])[0].split("_")
+            if len(parts) >= 3:
+                info["username"], info["chat_id"], info["user_id"] = parts[0], parts[1], parts[2]
+            try:
+                messages = read_messages(path)
+                if messages:
+                    info["messages"] = len(messages)
+                    info["first_timestamp"] = messages[0].get("timestamp", "")
+                    info["last_timestamp"] = messages[-1].get("timestamp", "")
+            except Exception as e:
+                info["error"] = str(e)
+            results.append(info)
+        return results
+
+    def sync(self):
+        _log.sync()
+
+    def close(self):
+        _log.close()
+
+def _create_backend():
+    """
+    Buat backend penyimpanan sesuai konfigurasi
+    """
+    from modules.config_manager import get_specific_config
+
+    name = get_specific_config("storage.conversation_backend", "jsonl")
+    if name == "sqlite":
+        # Riwayat file lama tidak diimpor otomatis: jalankan
+        # `python -m modules.conversation_sqlite import` (bisa diulang)
+        from modules.conversation_sqlite import SQLiteConversationBackend
+        return SQLiteConversationBackend(get_specific_config("storage.conversation_db_path", "data/db/jtrade.db"))
+    if name != "jsonl":
+        print(f"Unknown conversation backend '{name}', using jsonl")
+    return JsonlConversationBackend()
+
+# Cache pesan terakhir per (username, chat_id, user_id), urutan LRU
+_recent = OrderedDict()
+_recent_lock = threading.Lock()
+
+def _remember(key, messages):
+    """
+    Simpan pesan terakhir sebuah chat ke ring buffer (menggantikan isi lama)
+    """
+    with _recent_lock:
+        _recent[key] = deque(messages, maxlen=RECENT_MESSAGES)
+        _recent.move_to_end(key)
+        while len(_recent) > MAX_HOT_CHATS:
+            _recent.popitem(last=False)
+
+def _conversation_base(username, chat_id, user_id):
+    return f"{CONVERSATIONS_DIR}/{username}_{chat_id}_{user_id}"
+
+def _migrate_legacy_file(base):
+    """
+    Konversi file riwayat .json lama ke log .jsonl (sekali saja)
+    """
+    legacy_file = f"{base}.json"
+    log_file = f"{base}.jsonl"
+    if not os.path.exists(legacy_file) or os.path.exists(log_file):
+        return
+
+    try:
+        with open(legacy_file, 'r') as f:
+            history = json.load(f)
+
+        tmp_file = f"{log_file}.tmp"
+        with open(tmp_file, 'w') as f:
+            for message in history:
+                f.write(json.dumps(message, ensure_ascii=False, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, log_file)
+        os.remove(legacy_file)
+    except Exception as e:
+        print(f"Error migrating {legacy_file}: {e}")
+
+def get_conversation_file(username, chat_id, user_id):
+    """
+    Path log percakapan (.jsonl), mengonversi file .json lama jika perlu
+
+    Args:
+        username (str): Username akun JTRADE
+        chat_id (int): ID chat Telegram
+        user_id (int): ID pengguna yang berinteraksi
+
+    Returns:
+        str: Path file log percakapan
+    """
+    base = _conversation_base(username, chat_id, user_id)
+    _migrate_legacy_file(base)
+    return f"{base}.jsonl"
+
+def read_messages(filepath):
+    """
+    Baca seluruh pesan dari file percakapan (.jsonl atau .json lama)
+
+    Args:
+        filepath (str): Path file percakapan
+
+    Returns:
+        list: Daftar pesan
+    """
+    with open(filepath, 'r') as f:
+        if str(filepath).endswith(".jsonl"):
+            messages = []
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        messages.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        # Baris terakhir bisa terpotong jika proses berhenti mendadak
+                        continue
+            return messages
+        return json.load(f)
+
+def read_last_messages(filepath, count):
+    """
+    Baca `count` pesan terakhir dari log .jsonl dengan membaca file dari belakang,
+    tanpa mem-parse seluruh riwayat
+
+    Args:
+        filepath (str): Path file .jsonl
+        count (int): Jumlah pesan yang diambil
+
+    Returns:
+        list: Daftar pesan (urutan lama ke baru)
+    """
+    if count <= 0:
+        return []
+
+    with open(filepath, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        buffer = b""
+
+        # Mundur per blok sampai cukup baris (+1 karena baris pertama bisa terpotong)
+        while position > 0 and buffer.count(b"\n") <= count:
+            step = min(TAIL_BLOCK_SIZE, position)
+            position -= step
+            f.seek(position)
+            buffer = f.read(step) + buffer
+
+    lines = buffer.split(b"\n")
+    if position > 0:
+        lines = lines[1:]
+
+    messages = []
+    for line in reversed(lines):
+        if len(messages) == count:
+            break
+        line = line.strip()
+        if line:
+            try:
+                messages.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    messages.reverse()
+    return messages
 
 def save_conversation(username, chat_id, user_id, message_type, message):
     """
     Simpan pesan ke riwayat percakapan
-    
+
     Args:
         username (str): Username akun JTRADE
         chat_id (int): ID chat Telegram
@@ -27,50 +368,146 @@ def save_conversation(username, chat_id, user_id, message_type, message):
         message_type (str): Jenis pesan ('incoming' atau 'outgoing')
         message (str): Isi pesan
     """
-    # Format nama file berdasarkan username dan ID
-    filename = f"data/conversations/{username}_{chat_id}_{user_id}.json"
-    
     # Buat struktur data untuk pesan
     new_message = {
         "timestamp": datetime.datetime.now().isoformat(),
         "type": message_type,
         "content": message
     }
-    
-    # Muat riwayat yang ada atau buat baru jika belum ada
-    if os.path.exists(filename):
-        with open(filename, 'r') as f:
-            history = json.load(f)
-    else:
-        history = []
-    
-    # Tambahkan pesan baru
-    history.append(new_message)
-    
-    # Simpan kembali ke file
-    with open(filename, 'w') as f:
-        json.dump(history, f, indent=4)
+
+    key = (username, str(chat_id), str(user_id))
+
+    # Antrekan ke buffer write-behind; ditulis ke log oleh thread latar belakang
+    _buffer.add(key, new_message)
+
+    # Perbarui ring buffer jika chat ini sedang aktif
+    with _recent_lock:
+        recent = _recent.get(key)
+        if recent is not None:
+            recent.append(new_message)
+
+def flush_conversations():
+    """
+    Tulis semua pesan di buffer dan paksa tersinkron ke disk
+    """
+    _buffer.flush()
+    _backend.sync()
 
 def get_conversation_history(username, chat_id, user_id, max_messages=10):
     """
     Ambil riwayat percakapan
-    
+
     Args:
         username (str): Username akun JTRADE
         chat_id (int): ID chat Telegram
         user_id (int): ID pengguna yang berinteraksi
         max_messages (int): Jumlah maksimum pesan yang diambil
-        
+
     Returns:
         list: Daftar pesan dalam riwayat percakapan
     """
-    filename = f"data/conversations/{username}_{chat_id}_{user_id}.json"
-    
-    if not os.path.exists(filename):
-        return []
-    
-    with open(filename, 'r') as f:
-        history = json.load(f)
-    
-    # Ambil n pesan terakhir
-    return history[-max_messages:]
\ No newline at end of file
+    key = (username, str(chat_id), str(user_id))
+
+    # Chat aktif dilayani dari memori tanpa membaca disk
+    history = _recent_history(key, max_messages)
+    if history is not None:
+        return history
+
+    count = max(max_messages, RECENT_MESSAGES)
+
+    # Ambil n pesan terakhir dari backend, digabung dengan pesan yang belum ditulis
+    stored, pending = _buffer.read_consistent(key, lambda: _backend.tail(key, count))
+    history = (stored + pending)[-count:]
+    _remember(key, history[-RECENT_MESSAGES:])
+    return history[-max_messages:] if max_messages > 0 else []
+
+async def get_conversation_history_async(username, chat_id, user_id, max_messages=10):
+    """
+    Versi async dari get_conversation_history yang tidak memblokir event loop:
+    chat aktif dilayani dari ring buffer, selebihnya dibaca di thread executor
+
+    Returns:
+        list: Daftar pesan dalam riwayat percakapan
+    """
+    history = _recent_history((username, str(chat_id), str(user_id)), max_messages)
+    if history is not None:
+        return history
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(
+        get_conversation_history, username, chat_id, user_id, max_messages
+    ))
+
+def _recent_history(key, max_messages):
+    """
+    Riwayat dari ring buffer, atau None jika chat tidak ada di cache
+    """
+    if max_messages > RECENT_MESSAGES:
+        return None
+    with _recent_lock:
+        recent = _recent.get(key)
+        if recent is None:
+            return None
+        _recent.move_to_end(key)
+        return list(recent)[-max_messages:] if max_messages > 0 else []
+
+def get_conversation_backend():
+    """
+    Backend penyimpanan percakapan yang aktif ('jsonl' atau 'sqlite')
+    """
+    return _backend
+
+def list_conversation_info(username=None, key=None):
+    """
+    Ringkasan semua percakapan tersimpan (termasuk pesan yang masih di buffer)
+
+    Args:
+        username (str, optional): Filter akun JTRADE
+        key (tuple, optional): Hanya percakapan (username, chat_id, user_id) ini
+
+    Returns:
+        list: Dict per percakapan (lihat JsonlConversationBackend.conversations)
+    """
+    _buffer.flush()
+    return _backend.conversations(username=username, key=key)
+
+def read_conversation(username, chat_id, user_id):
+    """
+    Ambil seluruh pesan sebuah percakapan dari backend aktif
+
+    Returns:
+        list: Daftar pesan (urutan lama ke baru)
+    """
+    key = (username, str(chat_id), str(user_id))
+    stored, pending = _buffer.read_consistent(key, lambda: _backend.read_all(key))
+    return stored + pending
+
+def iter_conversations(username=None):
+    """
+    Iterasi seluruh percakapan dari backend aktif
+
+    Yields:
+        tuple: ((username, chat_id, user_id), daftar pesan)
+    """
+    for info in list_conversation_info(username):
+        if "user_id" not in info:
+            continue
+        key = (info["username"], info["chat_id"], info["user_id"])
+        yield key, read_conversation(*key)
+
+_backend = _create_backend()
+def _write_batch(batch):
+    """
+    Tulis satu batch write-behind lalu sinkronkan ke disk, sehingga pesan
+    terakhir sebelum bot idle tidak menunggu append berikutnya untuk di-fsync
+    """
+    _backend.append_batch(batch)
+    _backend.sync()
+
+_buffer = WriteBehindBuffer(_write_batch, name="conversation_writer", batch=True)
+
+def _shutdown():
+    # Tulis sisa pesan di buffer sebelum backend ditutup
+    _buffer.close()
+    _backend.close()
+
+atexit.register(_shutdown)
@@ -0,0 +1,495 @@
+# modules/conversation_sqlite.py
+
+"""
+Backend SQLite untuk riwayat percakapan
+Memakai skema database JTRADE yang sama dengan data_migration (tabel users,
+messages, intents) ditambah kolom messages.username untuk akun JTRADE.
+Semua percakapan disimpan di satu database (mode WAL) sehingga jumlah file
+tidak terus bertambah, insert dilakukan per batch dalam satu transaksi, dan
+pengambilan riwayat memakai indeks (username, chat_id, user_id, timestamp).
+
+Riwayat dari file percakapan dipindahkan secara eksplisit dengan
+`python -m modules.conversation_sqlite import`. Impor bisa diulang: posisi
+byte terakhir setiap file dicatat sehingga hanya baris baru yang dibaca.
+"""
+
+import os
+import json
+import sqlite3
+import argparse
+import datetime
+import threading
+
+DEFAULT_DB_PATH = "data/db/jtrade.db"
+DEFAULT_CONVERSATIONS_DIR = "data/conversations"
+
+# Skema tabel utama (juga dipakai data_migration.create_sqlite_db)
+SCHEMA_SQL = (
+    '''
+    CREATE TABLE IF NOT EXISTS users (
+        user_id TEXT PRIMARY KEY,
+        chat_id TEXT,
+        username TEXT,
+        first_name TEXT,
+        last_name TEXT,
+        first_interaction TIMESTAMP,
+        last_interaction TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT,
+        chat_id TEXT,
+        timestamp TIMESTAMP,
+        message_type TEXT,
+        content TEXT,
+        FOREIGN KEY (user_id) REFERENCES users(user_id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS intents (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        message_id INTEGER,
+        intent_name TEXT,
+        confidence REAL,
+        FOREIGN KEY (message_id) REFERENCES messages(id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS conversation_imports (
+        path TEXT PRIMARY KEY,
+        byte_offset INTEGER,
+        inode INTEGER,
+        messages INTEGER,
+        imported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+)
+
+# Statement dipakai ulang (di-cache oleh sqlite3 sebagai prepared statement)
+INSERT_MESSAGE_SQL = (
+    "INSERT INTO messages (username, chat_id, user_id, timestamp, message_type, content) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+INSERT_INTENT_SQL = "INSERT INTO intents (message_id, intent_name, confidence) VALUES (?, ?, ?)"
+UPSERT_USER_SQL = (
+    "INSERT INTO users (user_id, chat_id, username, first_interaction, last_interaction) "
+    "VALUES (?, ?, ?, ?, ?) "
+    "ON CONFLICT(user_id) DO UPDATE SET "
+    "last_interaction = MAX(COALESCE(last_interaction, ''), excluded.last_interaction)"
+)
+SELECT_TAIL_SQL = (
+    "SELECT timestamp, message_type, content FROM messages "
+    "WHERE username = ? AND chat_id = ? AND user_id = ? "
+    "ORDER BY timestamp DESC, id DESC LIMIT ?"
+)
+SELECT_CONVERSATION_SQL = (
+    "SELECT m.id, m.timestamp, m.message_type, m.content, i.intent_name, i.confidence "
+    "FROM messages m LEFT JOIN intents i ON i.message_id = m.id "
+    "WHERE m.username = ? AND m.chat_id = ? AND m.user_id = ? "
+    "ORDER BY m.timestamp, m.id, i.id"
+)
+
+def ensure_schema(conn):
+    """
+    Buat tabel dan indeks jika belum ada, dan perbarui database lama
+
+    Args:
+        conn (sqlite3.Connection): Koneksi database
+    """
+    with conn:
+        for statement in SCHEMA_SQL:
+            conn.execute(statement)
+
+        # Kolom tambahan di atas skema data_migration
+        message_columns = {row[1] for row in conn.execute("PRAGMA table_info(messages)")}
+        if "username" not in message_columns:
+            conn.execute("ALTER TABLE messages ADD COLUMN username TEXT")
+            # Baris dari import_conversations_to_db versi lama: akun diambil dari tabel users
+            conn.execute(
+                "UPDATE messages SET username = "
+                "(SELECT username FROM users WHERE users.user_id = messages.user_id) "
+                "WHERE username IS NULL"
+            )
+        import_columns = {row[1] for row in conn.execute("PRAGMA table_info(conversation_imports)")}
+        for column in ("byte_offset", "inode"):
+            if column not in import_columns:
+                conn.execute(f"ALTER TABLE conversation_imports ADD COLUMN {column} INTEGER")
+
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_messages_conversation "
+            "ON messages (username, chat_id, user_id, timestamp)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_intents_message ON intents (message_id)")
+
+        # Tabel terpisah dari versi sebelumnya dipindahkan ke tabel messages
+        legacy = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'conversation_messages'"
+        ).fetchone()
+        if legacy:
+            conn.execute(
+                "INSERT INTO messages (username, chat_id, user_id, timestamp, message_type, content) "
+                "SELECT username, chat_id, user_id, timestamp, message_type, content "
+                "FROM conversation_messages ORDER BY id"
+            )
+            conn.execute("DROP TABLE conversation_messages")
+            # Posisi impor lama tidak diketahui: impor berikutnya membaca ulang dengan deduplikasi
+            conn.execute("UPDATE conversation_imports SET byte_offset = NULL")
+
+def parse_conversation_filename(filename):
+    """
+    Ambil (username, chat_id, user_id) dari nama file percakapan
+
+    Returns:
+        tuple: Kunci percakapan, atau None jika format nama tidak dikenal
+    """
+    parts = os.path.splitext(os.path.basename(filename))[0].split("_")
+    if len(parts) < 3:
+        return None
+    return parts[0], parts[1], parts[2]
+
+def _read_new_messages(path, offset):
+    """
+    Baca pesan dari file percakapan mulai posisi byte tertentu
+
+    Baris terakhir yang belum diakhiri newline (sedang ditulis) tidak dibaca.
+
+    Returns:
+        tuple: (daftar pesan, posisi byte setelah baris lengkap terakhir)
+    """
+    if not path.endswith(".jsonl"):
+        with open(path, 'r') as f:
+            messages = json.load(f)
+        return messages, os.path.getsize(path)
+
+    messages = []
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            offset += len(line)
+            line = line.strip()
+            if line:
+                try:
+                    messages.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    return messages, offset
+
+class SQLiteConversationBackend:
+    """
+    Penyimpanan percakapan berbasis SQLite dengan WAL
+    """
+
+    name = "sqlite"
+
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        """
+        Args:
+            db_path (str): Path ke database SQLite
+        """
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        # Satu koneksi per thread (thread write-behind dan thread pembaca)
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        ensure_schema(self._get_connection())
+
+    def _get_connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    @staticmethod
+    def _insert_messages(conn, key, messages):
+        """
+        Simpan pesan satu chat (beserta intent jika ada) dan perbarui tabel users
+
+        Returns:
+            bool: True jika pengguna baru ditambahkan ke tabel users
+        """
+        if not messages:
+            return False
+        username, chat_id, user_id = key
+        rows = [
+            (username, chat_id, user_id, m.get("timestamp", ""), m.get("type", "unknown"), m.get("content", ""))
+            for m in messages
+        ]
+        if not any(m.get("intent") for m in messages):
+            conn.executemany(INSERT_MESSAGE_SQL, rows)
+        else:
+            # Pesan berlabel: id tiap pesan diperlukan untuk tabel intents
+            for row, message in zip(rows, messages):
+                cursor = conn.execute(INSERT_MESSAGE_SQL, row)
+                if message.get("intent"):
+                    conn.executemany(INSERT_INTENT_SQL, [
+                        (cursor.lastrowid, name, float(confidence)) for name, confidence in message["intent"].items()
+                    ])
+
+        new_user = conn.execute("SELECT 1 FROM users WHERE user_id = ?", (user_id,)).fetchone() is None
+        conn.execute(UPSERT_USER_SQL, (
+            user_id, chat_id, username, messages[0].get("timestamp"), messages[-1].get("timestamp")
+        ))
+        return new_user
+
+    def append_batch(self, batch):
+        """
+        Simpan banyak pesan dari banyak chat dalam satu transaksi
+
+        Args:
+            batch (dict): (username, chat_id, user_id) -> daftar pesan
+        """
+        conn = self._get_connection()
+        with conn:
+            for key, messages in batch.items():
+                self._insert_messages(conn, key, messages)
+
+    def tail(self, key, count):
+        """
+        Ambil `count` pesan terakhir sebuah chat lewat indeks
+
+        Returns:
+            list: Daftar pesan (urutan lama ke baru)
+        """
+        cursor = self._get_connection().execute(SELECT_TAIL_SQL, (*key, count))
+        rows = cursor.fetchall()
+        rows.reverse()
+        return [{"timestamp": ts, "type": msg_type, "content": content} for ts, msg_type, content in rows]
+
+    def read_all(self, key):
+        """
+        Ambil seluruh pesan sebuah chat, termasuk intent dari tabel intents
+
+        Returns:
+            list: Daftar pesan (urutan lama ke baru)
+        """
+        messages = []
+        last_id = None
+        for message_id, ts, msg_type, content, intent_name, confidence in \
+                self._get_connection().execute(SELECT_CONVERSATION_SQL, key):
+            if message_id != last_id:
+                messages.append({"timestamp": ts, "type": msg_type, "content": content})
+                last_id = message_id
+            if intent_name is not None:
+                messages[-1].setdefault("intent", {})[intent_name] = confidence
+        return messages
+
+    def conversations(self, username=None, key=None):
+        """
+        Ringkasan setiap percakapan yang tersimpan
+
+        Args:
+            username (str, optional): Filter akun JTRADE
+            key (tuple, optional): Hanya percakapan (username, chat_id, user_id) ini
+
+        Returns:
+            list: Dict berisi username, chat_id, user_id, path, filename, size,
+                modified, messages, first_timestamp, last_timestamp
+        """
+        query = (
+            "SELECT username, chat_id, user_id, COUNT(*), MIN(timestamp), MAX(timestamp), "
+            "SUM(LENGTH(content)) FROM messages WHERE username IS NOT NULL"
+        )
+        params = []
+        if key is not None:
+            query += " AND username = ? AND chat_id = ? AND user_id = ?"
+            params.extend(key)
+        elif username is not None:
+            query += " AND username = ?"
+            params.append(username)
+        query += " GROUP BY username, chat_id, user_id"
+
+        results = []
+        for name, chat_id, user_id, count, first_ts, last_ts, size in \
+                self._get_connection().execute(query, params):
+            try:
+                modified = datetime.datetime.fromisoformat(last_ts)
+            except (TypeError, ValueError):
+                modified = datetime.datetime.min
+            results.append({
+                "username": name,
+                "chat_id": chat_id,
+                "user_id": user_id,
+                "path": self.db_path,
+                "filename": f"{name}_{chat_id}_{user_id}",
+                "size": size or 0,
+                "modified": modified,
+                "messages": count,
+                "first_timestamp": first_ts or "",
+                "last_timestamp": last_ts or ""
+            })
+        return results
+
+    def iter_incoming(self, batch_size=50000):
+        """
+        Iterasi pesan masuk per batch (untuk label ulang intent)
+
+        Yields:
+            tuple: (daftar id pesan, daftar isi pesan)
+        """
+        conn = self._get_connection()
+        last_id = 0
+        while True:
+            rows = conn.execute(
+                "SELECT id, content FROM messages WHERE message_type = 'incoming' AND id > ? "
+                "ORDER BY id LIMIT ?", (last_id, batch_size)
+            ).fetchall()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            yield [row[0] for row in rows], [row[1] or "" for row in rows]
+
+    def set_intents(self, labelled):
+        """
+        Ganti intent sejumlah pesan dalam satu transaksi
+
+        Args:
+            labelled (iterable): Pasangan (id pesan, dict intent -> confidence)
+        """
+        labelled = list(labelled)
+        conn = self._get_connection()
+        with conn:
+            conn.executemany("DELETE FROM intents WHERE message_id = ?", [(message_id,) for message_id, _ in labelled])
+            conn.executemany(INSERT_INTENT_SQL, [
+                (message_id, name, float(confidence))
+                for message_id, intent in labelled
+                for name, confidence in intent.items()
+            ])
+
+    def import_file(self, path, key=None):
+        """
+        Impor pesan baru dari satu file percakapan (.jsonl atau .json lama)
+
+        Posisi byte dan inode file dicatat di conversation_imports. Jika file
+        belum pernah diimpor atau sudah ditulis ulang (inode berubah, file
+        mengecil), seluruh file dibaca ulang dan pesan yang sudah ada di
+        database dilewati.
+
+        Args:
+            path (str): Path file percakapan
+            key (tuple, optional): (username, chat_id, user_id), default dari nama file
+
+        Returns:
+            tuple: (jumlah pesan diimpor, True jika pengguna baru ditambahkan)
+        """
+        key = key or parse_conversation_filename(path)
+        if key is None:
+            raise ValueError(f"Unrecognized conversation filename: {path}")
+        stat = os.stat(path)
+
+        conn = self._get_connection()
+        with conn:
+            row = conn.execute(
+                "SELECT byte_offset, inode, messages FROM conversation_imports WHERE path = ?", (path,)
+            ).fetchone()
+            offset, inode, imported = row if row else (None, None, 0)
+            if offset is not None and (inode != stat.st_ino or offset > stat.st_size):
+                offset = None
+            if offset is not None and offset == stat.st_size:
+                return 0, False
+
+            messages, new_offset = _read_new_messages(path, offset or 0)
+            if offset is None or not path.endswith(".jsonl"):
+                # Baca ulang penuh: lewati pesan yang sudah tersimpan
+                existing = {
+                    tuple(r) for r in conn.execute(
+                        "SELECT timestamp, message_type, content FROM messages "
+                        "WHERE username = ? AND chat_id = ? AND user_id = ?", key
+                    )
+                }
+                messages = [
+                    m for m in messages
+                    if (m.get("timestamp", ""), m.get("type", "unknown"), m.get("content", "")) not in existing
+                ]
+
+            new_user = self._insert_messages(conn, key, messages)
+            conn.execute(
+                "INSERT INTO conversation_imports (path, byte_offset, inode, messages, imported_at) "
+                "VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP) "
+                "ON CONFLICT(path) DO UPDATE SET byte_offset = excluded.byte_offset, inode = excluded.inode, "
+                "messages = excluded.messages, imported_at = excluded.imported_at",
+                (path, new_offset, stat.st_ino, (imported or 0) + len(messages))
+            )
+        return len(messages), new_user
+
+    def import_files(self, conversations_dir=DEFAULT_CONVERSATIONS_DIR):
+        """
+        Impor semua file percakapan di direktori (bisa dijalankan berulang)
+
+        Returns:
+            dict: Jumlah file, pesan, pengguna baru, dan daftar error
+        """
+        results = {"processed_files": 0, "processed_messages": 0, "users_added": 0, "errors": []}
+        if not os.path.isdir(conversations_dir):
+            results["errors"].append(f"Conversations directory not found: {conversations_dir}")
+            return results
+
+        for filename in sorted(os.listdir(conversations_dir)):
+            if not filename.endswith((".json", ".jsonl")) or parse_conversation_filename(filename) is None:
+                continue
+            path = os.path.join(conversations_dir, filename)
+            try:
+                count, new_user = self.import_file(path)
+            except Exception as e:
+                results["errors"].append(f"Error importing {path}: {e}")
+                continue
+            results["processed_files"] += 1
+            results["processed_messages"] += count
+            results["users_added"] += int(new_user)
+        return results
+
+    def backup(self, target_path):
+        """
+        Salin database secara konsisten (API backup SQLite, aman saat bot berjalan)
+        """
+        os.makedirs(os.path.dirname(target_path) or ".", exist_ok=True)
+        target = sqlite3.connect(target_path)
+        try:
+            self._get_connection().backup(target)
+        finally:
+            target.close()
+
+    def sync(self):
+        """
+        Checkpoint WAL ke file database utama
+        """
+        self._get_connection().execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def close(self):
+        with self._connections_lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            self._connections.clear()
+        self._local = threading.local()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Kelola database percakapan SQLite")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import", help="Impor (lanjutan) file percakapan ke database")
+    import_parser.add_argument("--dir", default=DEFAULT_CONVERSATIONS_DIR)
+    import_parser.add_argument("--db", default=DEFAULT_DB_PATH)
+
+    args = parser.parse_args()
+
+    backend = SQLiteConversationBackend(args.db)
+    try:
+        report = backend.import_files(args.dir)
+    finally:
+        backend.close()
+    print(f"{report['processed_files']} file, {report['processed_messages']} pesan baru, "
+          f"{report['users_added']} pengguna baru diimpor ke {args.db}")
+    for error in report["errors"]:
+        print(error)
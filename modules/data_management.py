@@ -12,6 +12,9 @@ import datetime
 import zipfile
 import csv
 from pathlib import Path
+from modules.conversation import (
+    get_conversation_backend, list_conversation_info, read_conversation
+)
 
 def list_conversations(username=None, limit=None, sort_by="latest"):
     """
@@ -25,44 +28,8 @@ def list_conversations(username=None, limit=None, sort_by="latest"):
     Returns:
         list: Daftar file percakapan
     """
-    conv_dir = "data/conversations"
-    if not os.path.exists(conv_dir):
-        return []
-    
-    # Ambil semua file percakapan
-    files = []
-    pattern = f"{username}_*" if username else "*"
-    
-    for filepath in Path(conv_dir).glob(pattern):
-        if filepath.is_file() and filepath.suffix.lower() == '.json':
-            file_info = {
-                "path": str(filepath),
-                "filename": filepath.name,
-                "size": filepath.stat().st_size,
-                "modified": datetime.datetime.fromtimestamp(filepath.stat().st_mtime)
-            }
-            
-            # Parse username dan ID
-            parts = filepath.stem.split('_')
-            if len(parts) >= 3:
-                file_info["username"] = parts[0]
-                file_info["chat_id"] = parts[1]
-                file_info["user_id"] = parts[2]
-            
-            # Load a bit of content to get metadata
-            try:
-                with open(filepath, 'r') as f:
-                    data = json.load(f)
-                
-                if data:
-                    if isinstance(data, list) and len(data) > 0:
-                        file_info["messages"] = len(data)
-                        file_info["first_timestamp"] = data[0].get("timestamp", "")
-                        file_info["last_timestamp"] = data[-1].get("timestamp", "")
-            except Exception as e:
-                file_info["error"] = str(e)
-            
-            files.append(file_info)
+    # Ringkasan diambil dari backend aktif (file JSONL atau SQLite)
+    files = list_conversation_info(username=username)
     
     # Sort files
     if sort_by == "latest":
@@ -90,24 +57,24 @@ def get_conversation_data(username, chat_id, user_id):
     Returns:
         dict: Data percakapan dengan metadata
     """
-    filename = f"data/conversations/{username}_{chat_id}_{user_id}.json"
-    
-    if not os.path.exists(filename):
-        return {"error": "File not found"}
+    key = (username, str(chat_id), str(user_id))
     
     try:
-        with open(filename, 'r') as f:
-            raw_data = json.load(f)
+        info = list_conversation_info(key=key)
+        if not info:
+            return {"error": "File not found"}
+        
+        raw_data = read_conversation(*key)
         
         # Extract metadata
         metadata = {
             "username": username,
             "chat_id": chat_id,
             "user_id": user_id,
-            "filepath": filename,
+            "filepath": info[0]["path"],
             "message_count": len(raw_data),
-            "filesize": os.path.getsize(filename),
-            "last_modified": datetime.datetime.fromtimestamp(os.path.getmtime(filename)).isoformat()
+            "filesize": info[0]["size"],
+            "last_modified": info[0]["modified"].isoformat()
         }
         
         # Count message types
@@ -168,9 +135,16 @@ def backup_data(target_dir=None, include_analytics=True, include_conversations=T
     if include_analytics and os.path.exists("data/analytics"):
         to_backup.append("data/analytics")
     
+    backend = get_conversation_backend()
     if include_conversations and os.path.exists("data/conversations"):
         to_backup.append("data/conversations")
     
+    # Database percakapan disalin lewat API backup SQLite agar konsisten
+    conversation_db = None
+    if include_conversations and backend.name == "sqlite":
+        conversation_db = os.path.join(target_dir, "db", os.path.basename(backend.db_path))
+        backend.backup(conversation_db)
+    
     if include_kb and os.path.exists("data/knowledge_base"):
         to_backup.append("data/knowledge_base")
     
@@ -183,6 +157,7 @@ def backup_data(target_dir=None, include_analytics=True, include_conversations=T
         "timestamp": timestamp,
         "backup_path": target_dir,
         "included_directories": to_backup,
+        "conversation_db": conversation_db,
         "files_copied": {}
     }
     
@@ -292,13 +267,11 @@ def export_conversations_to_csv(username=None, output_path=None):
         # Process each file
         for file_info in conv_files:
             try:
-                filepath = file_info["path"]
                 username = file_info.get("username", "unknown")
                 chat_id = file_info.get("chat_id", "unknown")
                 user_id = file_info.get("user_id", "unknown")
                 
-                with open(filepath, 'r') as f:
-                    messages = json.load(f)
+                messages = read_conversation(username, chat_id, user_id)
                 
                 for message in messages:
                     writer.writerow([
@@ -11,7 +11,7 @@ import datetime
 import csv
 import sqlite3
 import logging
-from pathlib import Path
+from modules.conversation_sqlite import SQLiteConversationBackend, ensure_schema
 
 # Set up logging
 logging.basicConfig(
@@ -39,44 +39,10 @@ def create_sqlite_db():
     
     try:
         conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # Create tables
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            user_id TEXT PRIMARY KEY,
-            chat_id TEXT,
-            username TEXT,
-            first_name TEXT,
-            last_name TEXT,
-            first_interaction TIMESTAMP,
-            last_interaction TIMESTAMP
-        )
-        ''')
-        
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS messages (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT,
-            chat_id TEXT,
-            timestamp TIMESTAMP,
-            message_type TEXT,
-            content TEXT,
-            FOREIGN KEY (user_id) REFERENCES users(user_id)
-        )
-        ''')
         
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS intents (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            message_id INTEGER,
-            intent_name TEXT,
-            confidence REAL,
-            FOREIGN KEY (message_id) REFERENCES messages(id)
-        )
-        ''')
+        # Skema yang sama dengan backend percakapan SQLite
+        ensure_schema(conn)
         
-        conn.commit()
         conn.close()
         
         logger.info(f"Successfully created SQLite database at {db_path}")
@@ -108,94 +74,19 @@ def import_conversations_to_db(db_path=None):
     if not os.path.exists(conv_dir):
         return {"status": "error", "message": "Conversations directory not found"}
     
-    results = {
-        "status": "success",
-        "processed_files": 0,
-        "processed_messages": 0,
-        "users_added": 0,
-        "errors": []
-    }
-    
     try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # Process each JSON file
-        for filepath in Path(conv_dir).glob("*.json"):
-            try:
-                # Parse filename
-                filename = filepath.stem
-                parts = filename.split('_')
-                
-                if len(parts) >= 3:
-                    username = parts[0]
-                    chat_id = parts[1]
-                    user_id = parts[2]
-                    
-                    # Read messages
-                    with open(filepath, 'r') as f:
-                        messages = json.load(f)
-                    
-                    # If messages exist, update or insert user
-                    if messages:
-                        first_msg_time = messages[0].get("timestamp", None)
-                        last_msg_time = messages[-1].get("timestamp", None)
-                        
-                        # Check if user exists
-                        cursor.execute("SELECT user_id FROM users WHERE user_id = ?", (user_id,))
-                        user_exists = cursor.fetchone()
-                        
-                        if not user_exists:
-                            # Insert new user
-                            cursor.execute('''
-                            INSERT INTO users (user_id, chat_id, username, first_interaction, last_interaction)
-                            VALUES (?, ?, ?, ?, ?)
-                            ''', (user_id, chat_id, username, first_msg_time, last_msg_time))
-                            results["users_added"] += 1
-                        else:
-                            # Update existing user
-                            cursor.execute('''
-                            UPDATE users 
-                            SET last_interaction = MAX(last_interaction, ?) 
-                            WHERE user_id = ?
-                            ''', (last_msg_time, user_id))
-                        
-                        # Insert messages
-                        for message in messages:
-                            timestamp = message.get("timestamp", None)
-                            msg_type = message.get("type", "unknown")
-                            content = message.get("content", "")
-                            
-                            cursor.execute('''
-                            INSERT INTO messages (user_id, chat_id, timestamp, message_type, content)
-                            VALUES (?, ?, ?, ?, ?)
-                            ''', (user_id, chat_id, timestamp, msg_type, content))
-                            
-                            # Get message ID
-                            msg_id = cursor.lastrowid
-                            
-                            # If it's an incoming message, check for intent
-                            if msg_type == "incoming" and message.get("intent"):
-                                for intent_name, confidence in message["intent"].items():
-                                    cursor.execute('''
-                                    INSERT INTO intents (message_id, intent_name, confidence)
-                                    VALUES (?, ?, ?)
-                                    ''', (msg_id, intent_name, float(confidence)))
-                            
-                            results["processed_messages"] += 1
-                        
-                    results["processed_files"] += 1
-                
-            except Exception as e:
-                error_msg = f"Error processing {filepath}: {str(e)}"
-                logger.error(error_msg)
-                results["errors"].append(error_msg)
+        # Impor bisa diulang: hanya baris baru sejak impor terakhir yang dibaca
+        backend = SQLiteConversationBackend(db_path)
+        try:
+            report = backend.import_files(conv_dir)
+        finally:
+            backend.close()
         
-        conn.commit()
-        conn.close()
+        for error_msg in report["errors"]:
+            logger.error(error_msg)
         
-        logger.info(f"Migration completed: {results['processed_files']} files, {results['processed_messages']} messages")
-        return results
+        logger.info(f"Migration completed: {report['processed_files']} files, {report['processed_messages']} messages")
+        return {"status": "success", **report}
         
     except Exception as e:
         logger.error(f"Database error: {str(e)}")
@@ -10,7 +10,7 @@ import json
 import datetime
 import matplotlib.pyplot as plt
 import numpy as np
-from modules.analytics import get_daily_stats, get_weekly_stats, generate_dashboard_data
+from modules.analytics import get_daily_stats_range, get_weekly_stats, generate_dashboard_data
 
 # Pastikan direktori visualisasi ada
 if not os.path.exists("data/visualizations"):
@@ -36,13 +36,16 @@ def plot_daily_interactions(username, days=30, save=True, show=False):
     incoming = []
     outgoing = []
     
+    start_date = end_date - datetime.timedelta(days=days-1)
+    daily_range = get_daily_stats_range(username, start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d"))
+    
     for i in range(days-1, -1, -1):
         date = (end_date - datetime.timedelta(days=i))
         date_str = date.strftime("%Y-%m-%d")
         dates.append(date)
         
-        stats = get_daily_stats(username, date_str)
-        if "message" not in stats:  # Jika ada data
+        stats = daily_range.get(date_str)
+        if stats:  # Jika ada data
             incoming.append(stats["incoming_messages"])
             outgoing.append(stats["outgoing_messages"])
         else:
@@ -0,0 +1,274 @@
+# modules/embedding_backends.py
+
+"""
+Backend embedding untuk RAG Engine
+Menyediakan antarmuka bersama untuk beberapa penyedia embedding:
+- hash: placeholder berbasis MD5 (perilaku lama)
+- ngram: vectorizer n-gram karakter ter-hash, lokal tanpa dependensi
+- remote: API embedding kompatibel OpenAI (/v1/embeddings), bisa diarahkan ke stub lokal
+Teks di-embed per batch dan batch dijalankan bersamaan.
+"""
+
+import os
+import json
+import zlib
+import hashlib
+import argparse
+import urllib.request
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_BATCH_SIZE = 64
+
+class EmbeddingBackend:
+    """
+    Antarmuka dasar backend embedding
+    """
+    
+    name = "base"
+    
+    def __init__(self, dim, batch_size=DEFAULT_BATCH_SIZE, max_workers=1):
+        """
+        Args:
+            dim (int): Dimensi vektor yang dihasilkan
+            batch_size (int): Jumlah teks maksimum per batch
+            max_workers (int): Jumlah batch yang dijalankan bersamaan
+        """
+        self.dim = dim
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+    
+    @property
+    def fingerprint(self):
+        """
+        Identitas backend; vektor dari backend berbeda tidak bisa dicampur
+        """
+        return f"{self.name}:{self.dim}"
+    
+    def embed_batch(self, texts):
+        """
+        Embed satu batch teks
+
+        Args:
+            texts (list): Daftar teks (maksimal batch_size)
+
+        Returns:
+            np.ndarray: Matriks float32 (len(texts) x dim)
+        """
+        raise NotImplementedError
+    
+    def embed(self, texts):
+        """
+        Embed daftar teks dengan membaginya ke batch yang dijalankan bersamaan
+
+        Args:
+            texts (list): Daftar teks
+
+        Returns:
+            np.ndarray: Matriks float32 (len(texts) x dim)
+        """
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) == 1 or self.max_workers <= 1:
+            results = [self.embed_batch(batch) for batch in batches]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as pool:
+                results = list(pool.map(self.embed_batch, batches))
+        
+        return np.vstack(results).astype(np.float32, copy=False)
+
+class HashEmbeddingBackend(EmbeddingBackend):
+    """
+    Embedding placeholder dari digest MD5 (tidak membawa makna semantik)
+    """
+    
+    name = "hash"
+    
+    def __init__(self, dim=128, batch_size=DEFAULT_BATCH_SIZE, max_workers=1):
+        super().__init__(dim, batch_size, max_workers)
+    
+    def embed_batch(self, texts):
+        digests = np.frombuffer(b"".join(hashlib.md5(t.encode()).digest() for t in texts), dtype=np.uint8)
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        matrix[:, :16] = (digests.reshape(len(texts), 16) % 10).astype(np.float32)
+        return matrix
+
+class NGramEmbeddingBackend(EmbeddingBackend):
+    """
+    Vectorizer n-gram karakter + kata dengan hashing trick (signed), bobot
+    log(1 + tf) dan normalisasi L2. Tidak memakai IDF agar vektor stabil
+    untuk indexing inkremental.
+    """
+    
+    name = "ngram"
+    
+    def __init__(self, dim=512, batch_size=DEFAULT_BATCH_SIZE, max_workers=1, ngram_range=(3, 5)):
+        super().__init__(dim, batch_size, max_workers)
+        self.ngram_range = ngram_range
+    
+    @property
+    def fingerprint(self):
+        return f"{self.name}:{self.dim}:{self.ngram_range[0]}-{self.ngram_range[1]}"
+    
+    def _features(self, text):
+        """
+        Ekstrak fitur: kata utuh dan n-gram karakter per kata
+        """
+        min_n, max_n = self.ngram_range
+        features = []
+        for word in text.lower().split():
+            features.append(f"w:{word}")
+            padded = f" {word} "
+            for n in range(min_n, max_n + 1):
+                for i in range(len(padded) - n + 1):
+                    features.append(padded[i:i + n])
+        return features
+    
+    def embed_batch(self, texts):
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            hashed = np.array([zlib.crc32(f.encode()) for f in self._features(text)], dtype=np.uint32)
+            if hashed.size == 0:
+                continue
+            signs = np.where(hashed & 0x80000000, -1.0, 1.0).astype(np.float32)
+            np.add.at(matrix[row], hashed % self.dim, signs)
+        
+        # Sublinear tf dengan tetap mempertahankan tanda
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (matrix / norms).astype(np.float32)
+
+class RemoteEmbeddingBackend(EmbeddingBackend):
+    """
+    Backend yang memanggil endpoint embedding kompatibel OpenAI
+    """
+    
+    name = "remote"
+    
+    def __init__(self, url, model="text-embedding-3-small", api_key=None, dim=1536,
+                 batch_size=DEFAULT_BATCH_SIZE, max_workers=4, timeout=30):
+        """
+        Args:
+            url (str): URL endpoint, misalnya https://api.openai.com/v1/embeddings
+            model (str): Nama model embedding
+            api_key (str, optional): API key untuk header Authorization
+            dim (int): Dimensi vektor dari model
+            batch_size (int): Jumlah teks per request
+            max_workers (int): Jumlah request bersamaan
+            timeout (float): Batas waktu per request (detik)
+        """
+        super().__init__(dim, batch_size, max_workers)
+        self.url = url
+        self.model = model
+        self.api_key = api_key
+        self.timeout = timeout
+    
+    @property
+    def fingerprint(self):
+        return f"{self.name}:{self.model}:{self.dim}"
+    
+    def embed_batch(self, texts):
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        
+        payload = json.dumps({"model": self.model, "input": list(texts)}).encode("utf-8")
+        request = urllib.request.Request(self.url, data=payload, headers=headers, method="POST")
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            body = json.loads(response.read())
+        
+        # Urutkan sesuai index karena API tidak menjamin urutan
+        data = sorted(body["data"], key=lambda item: item["index"])
+        matrix = np.array([item["embedding"] for item in data], dtype=np.float32)
+        if matrix.shape != (len(texts), self.dim):
+            raise ValueError(f"Unexpected embedding shape {matrix.shape}, expected {(len(texts), self.dim)}")
+        return matrix
+
+EMBEDDING_BACKENDS = {
+    "hash": HashEmbeddingBackend,
+    "ngram": NGramEmbeddingBackend,
+    "remote": RemoteEmbeddingBackend,
+}
+
+def get_embedding_backend(name=None, **kwargs):
+    """
+    Buat backend embedding berdasarkan nama atau variabel lingkungan
+
+    Variabel lingkungan yang dibaca jika argumen tidak diberikan:
+    RAG_EMBEDDING_BACKEND, RAG_EMBEDDING_BATCH_SIZE, RAG_EMBEDDING_URL,
+    RAG_EMBEDDING_MODEL, RAG_EMBEDDING_DIM, RAG_EMBEDDING_API_KEY
+
+    Args:
+        name (str, optional): 'hash', 'ngram', atau 'remote'
+        **kwargs: Parameter tambahan untuk konstruktor backend
+
+    Returns:
+        EmbeddingBackend: Instance backend
+    """
+    name = name or os.getenv("RAG_EMBEDDING_BACKEND", "hash")
+    if name not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Embedding backend '{name}' tidak dikenal. Pilih: {', '.join(EMBEDDING_BACKENDS)}")
+    
+    if os.getenv("RAG_EMBEDDING_BATCH_SIZE"):
+        kwargs.setdefault("batch_size", int(os.getenv("RAG_EMBEDDING_BATCH_SIZE")))
+    
+    if name == "remote":
+        kwargs.setdefault("url", os.getenv("RAG_EMBEDDING_URL", "https://api.openai.com/v1/embeddings"))
+        kwargs.setdefault("api_key", os.getenv("RAG_EMBEDDING_API_KEY"))
+        if os.getenv("RAG_EMBEDDING_MODEL"):
+            kwargs.setdefault("model", os.getenv("RAG_EMBEDDING_MODEL"))
+        if os.getenv("RAG_EMBEDDING_DIM"):
+            kwargs.setdefault("dim", int(os.getenv("RAG_EMBEDDING_DIM")))
+    
+    return EMBEDDING_BACKENDS[name](**kwargs)
+
+def serve_stub(port=8765, dim=1536):
+    """
+    Jalankan server stub /v1/embeddings lokal untuk menguji backend remote
+    tanpa koneksi ke OpenAI (vektor dihasilkan oleh NGramEmbeddingBackend)
+
+    Args:
+        port (int): Port HTTP
+        dim (int): Dimensi vektor yang dikembalikan
+    """
+    local = NGramEmbeddingBackend(dim=dim)
+    
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length))
+            inputs = request["input"] if isinstance(request["input"], list) else [request["input"]]
+            vectors = local.embed(inputs)
+            body = json.dumps({
+                "object": "list",
+                "model": request.get("model"),
+                "data": [{"object": "embedding", "index": i, "embedding": v.tolist()} for i, v in enumerate(vectors)]
+            }).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, format, *args):
+            pass
+    
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    print(f"Embedding stub listening on http://127.0.0.1:{port}/v1/embeddings")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub server embedding lokal")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--dim", type=int, default=1536)
+    args = parser.parse_args()
+    serve_stub(args.port, args.dim)
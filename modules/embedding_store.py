@@ -0,0 +1,190 @@
+# modules/embedding_store.py
+
+"""
+Penyimpanan embedding biner untuk RAG Engine
+Matriks float32 mentah yang di-memory-map read-only, ditambah file sidecar
+JSON kecil berisi dimensi, jumlah baris, urutan key (index = offset baris)
+dan hash konten per baris. Beberapa proses bisa berbagi page cache yang sama
+tanpa parsing ulang, dan perubahan kecil ditulis langsung ke baris terkait.
+"""
+
+import os
+import json
+import numpy as np
+from collections.abc import Mapping
+
+class EmbeddingStore(Mapping):
+    """
+    Store embedding berbasis file biner yang bisa dibaca seperti dict key -> vektor
+    """
+    
+    def __init__(self, base_path, dim):
+        """
+        Inisialisasi store dan muat data jika sudah ada
+        
+        Args:
+            base_path (str): Path dasar tanpa ekstensi (menjadi .f32 dan .json)
+            dim (int): Dimensi embedding
+        """
+        self.matrix_file = f"{base_path}.f32"
+        self.index_file = f"{base_path}.json"
+        self.dim = dim
+        self.keys = []       # key per baris, None untuk baris kosong (bisa dipakai ulang)
+        self.row_hashes = [] # hash konten per baris
+        self.offsets = {}
+        self.hashes = {}
+        self.matrix = np.zeros((0, dim), dtype=np.float32)
+        
+        os.makedirs(os.path.dirname(self.matrix_file) or ".", exist_ok=True)
+        self.load()
+    
+    def load(self):
+        """
+        Memory-map matriks dari disk (waktu muat konstan terhadap ukuran matriks)
+        """
+        if not os.path.exists(self.index_file) or not os.path.exists(self.matrix_file):
+            return
+        
+        try:
+            with open(self.index_file, 'r') as f:
+                meta = json.load(f)
+            
+            count = meta["count"]
+            dim = meta["dim"]
+            expected_size = count * dim * np.dtype(np.float32).itemsize
+            if os.path.getsize(self.matrix_file) < expected_size:
+                raise ValueError(f"{self.matrix_file} lebih kecil dari yang tercatat di {self.index_file}")
+            
+            if count:
+                self.matrix = np.memmap(self.matrix_file, dtype=np.float32, mode='r', shape=(count, dim))
+            else:
+                self.matrix = np.zeros((0, dim), dtype=np.float32)
+            self.dim = dim
+            self.keys = meta["keys"]
+            self.row_hashes = meta.get("hashes") or [None] * count
+            self.offsets = {key: i for i, key in enumerate(self.keys) if key is not None}
+            self.hashes = {key: self.row_hashes[i] for key, i in self.offsets.items()}
+        except Exception as e:
+            print(f"Error loading embedding store: {e}")
+    
+    @property
+    def free_rows(self):
+        """
+        Jumlah baris kosong bekas key yang dihapus
+        """
+        return len(self.keys) - len(self.offsets)
+    
+    def save(self, keys, matrix, hashes=None):
+        """
+        Tulis ulang seluruh store secara atomik lalu muat ulang
+        
+        Args:
+            keys (list): Daftar key, urutannya sama dengan baris matriks
+            matrix (np.ndarray): Matriks embedding (len(keys) x dim)
+            hashes (list, optional): Hash konten per key
+        """
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32).reshape(len(keys), self.dim)
+        
+        tmp_matrix = f"{self.matrix_file}.tmp"
+        with open(tmp_matrix, 'wb') as f:
+            matrix.tofile(f)
+        os.replace(tmp_matrix, self.matrix_file)
+        
+        self._write_index({
+            "dim": self.dim,
+            "count": len(keys),
+            "keys": list(keys),
+            "hashes": list(hashes) if hashes is not None else [None] * len(keys)
+        })
+        self.load()
+    
+    def update(self, upserts, removals=()):
+        """
+        Perbarui store secara inkremental: hanya baris yang berubah yang ditulis
+        
+        Args:
+            upserts (dict): key -> (hash konten, vektor) untuk key baru atau berubah
+            removals (iterable): Key yang dihapus dari store
+        """
+        keys = list(self.keys)
+        row_hashes = list(self.row_hashes)
+        offsets = dict(self.offsets)
+        
+        # Kosongkan baris key yang dihapus agar bisa dipakai ulang
+        free = [i for i, key in enumerate(keys) if key is None]
+        for key in removals:
+            row = offsets.pop(key, None)
+            if row is not None:
+                keys[row] = None
+                row_hashes[row] = None
+                free.append(row)
+        
+        writes = []
+        for key, (content_hash, vector) in upserts.items():
+            row = offsets.get(key)
+            if row is None:
+                if free:
+                    row = free.pop()
+                else:
+                    row = len(keys)
+                    keys.append(None)
+                    row_hashes.append(None)
+                offsets[key] = row
+                keys[row] = key
+            row_hashes[row] = content_hash
+            writes.append((row, np.asarray(vector, dtype=np.float32).reshape(self.dim)))
+        
+        # Baris kosong diisi nol agar tidak pernah cocok dengan query
+        zero = np.zeros(self.dim, dtype=np.float32)
+        writes.extend((row, zero) for row in free if row < len(keys))
+        
+        mode = 'r+b' if os.path.exists(self.matrix_file) else 'w+b'
+        row_size = self.dim * np.dtype(np.float32).itemsize
+        with open(self.matrix_file, mode) as f:
+            for row, vector in sorted(writes, key=lambda w: w[0]):
+                f.seek(row * row_size)
+                f.write(vector.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        
+        self._write_index({"dim": self.dim, "count": len(keys), "keys": keys, "hashes": row_hashes})
+        self.load()
+    
+    def reset(self, dim):
+        """
+        Kosongkan store dan ganti dimensinya (misalnya saat backend embedding berganti)
+        
+        Args:
+            dim (int): Dimensi embedding yang baru
+        """
+        self.dim = dim
+        self.save([], np.zeros((0, dim), dtype=np.float32))
+    
+    def compact(self):
+        """
+        Tulis ulang store tanpa baris kosong
+        """
+        live = [key for key in self.keys if key is not None]
+        if len(live) == len(self.keys):
+            return
+        rows = [self.offsets[key] for key in live]
+        matrix = np.array(self.matrix[rows]) if rows else np.zeros((0, self.dim), dtype=np.float32)
+        self.save(live, matrix, [self.hashes[key] for key in live])
+    
+    def _write_index(self, meta):
+        """
+        Tulis file sidecar secara atomik
+        """
+        tmp_index = f"{self.index_file}.tmp"
+        with open(tmp_index, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_index, self.index_file)
+    
+    def __getitem__(self, key):
+        return self.matrix[self.offsets[key]]
+    
+    def __iter__(self):
+        return iter(self.offsets)
+    
+    def __len__(self):
+        return len(self.offsets)
@@ -0,0 +1,38 @@
+# modules/immutable.py
+
+"""
+Helper untuk membuat salinan data read-only
+Dipakai oleh objek yang dibagikan antar pemanggil (persona, snapshot knowledge
+base) agar tidak bisa diubah tanpa sengaja setelah dimuat.
+"""
+
+from types import MappingProxyType
+from collections.abc import Mapping
+
+def freeze(value):
+    """
+    Ubah dict/list bersarang menjadi bentuk read-only
+
+    Args:
+        value: Data hasil json.load atau sejenisnya
+
+    Returns:
+        object: dict -> MappingProxyType, list -> tuple, set -> frozenset
+    """
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    if isinstance(value, set):
+        return frozenset(freeze(v) for v in value)
+    return value
+
+def thaw(value):
+    """
+    Kebalikan freeze: salinan dict/list biasa (bisa diubah dan di-serialisasi JSON)
+    """
+    if isinstance(value, Mapping):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, (tuple, frozenset)):
+        return [thaw(v) for v in value]
+    return value
@@ -7,9 +7,26 @@
 """
 Modul untuk mendeteksi intent/maksud dari pesan customer
 Membantu persona memberikan respons yang sesuai dengan kebutuhan
+
+Semua keyword dikompilasi sekali menjadi satu regex alternation sehingga
+seluruh kategori dinilai dalam satu kali scan pesan. Hasil per pesan
+di-memoize karena pesan yang sama dideteksi lebih dari sekali (main.py
+dan generate_prompt).
+
+Model statistik (intent_model.py) bisa diaktifkan lewat INTENT_DETECTOR:
+'keyword' (default), 'model', atau 'hybrid' (keyword + intent tambahan dari
+model). Pada mode model/hybrid skor berupa confidence 0-1.
 """
 
+import os
 import re
+import sys
+import json
+import time
+import bisect
+import argparse
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
 
 # Kategori utama dari intent customer
 INTENT_CATEGORIES = {
@@ -24,37 +41,401 @@ INTENT_CATEGORIES = {
     "farewell": ["bye", "dadah", "sampai jumpa", "selamat tinggal", "ciao", "see ya"]
 }
 
+# Jumlah pesan unik yang hasil deteksinya disimpan
+INTENT_CACHE_SIZE = 4096
+# Jumlah pesan per potongan untuk detect_intent_batch
+BATCH_CHUNK_SIZE = 5000
+
+# Mode deteksi: 'keyword', 'model' atau 'hybrid'
+INTENT_DETECTOR_MODE = os.getenv("INTENT_DETECTOR", "keyword").lower()
+INTENT_MODEL_PATH = os.getenv("INTENT_MODEL_PATH", "data/models/intent_model.npz")
+
+
+def _compile_keywords(categories):
+    """
+    Kompilasi tabel keyword menjadi satu regex dan tabel lookup
+
+    Regex berupa lookahead di setiap batas kata yang mencoba keyword terpanjang
+    lebih dulu. Keyword lain yang juga cocok di posisi yang sama pasti prefiks
+    dari keyword terpanjang itu, jadi dicatat lewat tabel `implied`.
+
+    Returns:
+        tuple: (regex, keyword -> daftar kategori, keyword -> keyword prefiks yang ikut cocok)
+    """
+    owners = {}
+    for category, keywords in categories.items():
+        for keyword in keywords:
+            owners.setdefault(keyword, [])
+            if category not in owners[keyword]:
+                owners[keyword].append(category)
+
+    ordered = sorted(owners, key=len, reverse=True)
+    pattern = re.compile(r'\b(?=(' + "|".join(re.escape(k) for k in ordered) + r')\b)')
+
+    implied = {}
+    for keyword in ordered:
+        implied[keyword] = [
+            other for other in ordered
+            if other != keyword and keyword.startswith(other)
+            and re.match(re.escape(other) + r'\b', keyword)
+        ]
+    return pattern, owners, implied
+
+_pattern, _keyword_owners, _implied_keywords = _compile_keywords(INTENT_CATEGORIES)
+
+def reload_intent_categories():
+    """
+    Kompilasi ulang tabel keyword setelah INTENT_CATEGORIES diubah
+    """
+    global _pattern, _keyword_owners, _implied_keywords
+    _pattern, _keyword_owners, _implied_keywords = _compile_keywords(INTENT_CATEGORIES)
+    _detect_intent_cached.cache_clear()
+    _detect_intent_with_model.cache_clear()
+
+def _score_keywords(found, has_question):
+    """
+    Ubah himpunan keyword yang ditemukan menjadi skor intent
+    """
+    # Dictionary untuk menyimpan skor intent
+    intent_scores = {category: 0 for category in INTENT_CATEGORIES}
+    for keyword in found:
+        for category in _keyword_owners[keyword]:
+            intent_scores[category] += 1
+    
+    # Tambahkan intent lainnya yang mungkin terdeteksi
+    if has_question:
+        intent_scores["question"] = 1
+    
+    # Filter hanya intent dengan skor > 0
+    detected_intents = {k: v for k, v in intent_scores.items() if v > 0}
+    
+    # Jika tidak ada intent yang terdeteksi, gunakan "general"
+    if not detected_intents:
+        detected_intents["general"] = 1
+    
+    return detected_intents
+
+@lru_cache(maxsize=INTENT_CACHE_SIZE)
+def _detect_intent_cached(message):
+    # Keyword unik yang muncul di pesan (setiap keyword dihitung sekali)
+    found = set()
+    for match in _pattern.finditer(message):
+        keyword = match.group(1)
+        found.add(keyword)
+        found.update(_implied_keywords[keyword])
+    
+    return _score_keywords(found, "?" in message)
+
+_intent_model = None
+_intent_model_loaded = False
+
+def get_intent_model():
+    """
+    Muat model intent statistik (sekali per proses)
+
+    Returns:
+        IntentModel: Model, atau None jika belum dilatih
+    """
+    global _intent_model, _intent_model_loaded
+    if not _intent_model_loaded:
+        from modules.intent_model import IntentModel
+        _intent_model = IntentModel.load(INTENT_MODEL_PATH)
+        _intent_model_loaded = True
+        if _intent_model is None:
+            print(f"Intent model not found at {INTENT_MODEL_PATH}, using keyword rules")
+    return _intent_model
+
+@lru_cache(maxsize=INTENT_CACHE_SIZE)
+def _detect_intent_with_model(message, mode):
+    model = get_intent_model()
+    detected_intents = {}
+    
+    if mode == "hybrid":
+        # Intent dari keyword dianggap pasti
+        detected_intents = {k: 1.0 for k in _detect_intent_cached(message) if k != "general"}
+    
+    for intent_type, confidence in model.predict(message).items():
+        detected_intents[intent_type] = max(detected_intents.get(intent_type, 0.0), confidence)
+    
+    if "?" in message:
+        detected_intents["question"] = 1.0
+    
+    if not detected_intents:
+        detected_intents["general"] = 1.0
+    
+    return detected_intents
 
-def detect_intent(message):
+def detect_intent(message, mode=None):
     """
     Mendeteksi intent dari pesan customer
     
     Args:
         message (str): Pesan dari customer
+        mode (str, optional): 'keyword', 'model' atau 'hybrid'; default INTENT_DETECTOR_MODE
         
     Returns:
         dict: Intent yang terdeteksi dengan skor relevansi
     """
     message = message.lower()
+    mode = mode or INTENT_DETECTOR_MODE
     
-    # Dictionary untuk menyimpan skor intent
-    intent_scores = {category: 0 for category in INTENT_CATEGORIES}
+    # Salinan, agar pemanggil bebas mengubah hasil tanpa merusak cache
+    if mode in ("model", "hybrid") and get_intent_model() is not None:
+        return dict(_detect_intent_with_model(message, mode))
+    return dict(_detect_intent_cached(message))
+
+def _detect_intent_chunk(messages):
+    """
+    Deteksi intent untuk satu potongan pesan dengan satu scan regex
+
+    Pesan digabung dengan pemisah baris baru (tidak ada keyword yang memuatnya)
+    lalu setiap match dipetakan kembali ke pesannya lewat offset.
+    """
+    lowered = [(message or "").lower() for message in messages]
+    starts = []
+    position = 0
+    for message in lowered:
+        starts.append(position)
+        position += len(message) + 1
     
-    # Periksa setiap kategori intent
+    found = [set() for _ in lowered]
+    for match in _pattern.finditer("\n".join(lowered)):
+        keyword = match.group(1)
+        index = bisect.bisect_right(starts, match.start()) - 1
+        found[index].add(keyword)
+        found[index].update(_implied_keywords[keyword])
+    
+    return [_score_keywords(keywords, "?" in message) for keywords, message in zip(found, lowered)]
+
+def detect_intent_batch(messages, processes=None, chunk_size=BATCH_CHUNK_SIZE):
+    """
+    Mendeteksi intent untuk banyak pesan sekaligus (backfill / reprocessing)
+    
+    Args:
+        messages (list): Daftar pesan
+        processes (int, optional): Jumlah proses worker; None atau 1 berarti
+            dikerjakan di proses ini
+        chunk_size (int): Jumlah pesan per potongan
+        
+    Returns:
+        list: Intent untuk setiap pesan, urutan sama dengan input
+            (format sama seperti detect_intent)
+    """
+    messages = list(messages)
+    chunks = [messages[i:i + chunk_size] for i in range(0, len(messages), chunk_size)]
+    
+    if not processes or processes <= 1 or len(chunks) <= 1:
+        results = []
+        for chunk in chunks:
+            results.extend(_detect_intent_chunk(chunk))
+        return results
+    
+    results = []
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        for chunk_results in executor.map(_detect_intent_chunk, chunks):
+            results.extend(chunk_results)
+    return results
+
+def relabel_conversation_file(path, output_path=None, mode="keyword"):
+    """
+    Tulis ulang intent untuk semua pesan masuk di satu file percakapan
+    
+    Args:
+        path (str): File percakapan (.jsonl atau .json lama)
+        output_path (str, optional): File tujuan, default menimpa `path` secara atomik
+        mode (str): 'keyword' (batch, skor jumlah keyword) atau 'model'/'hybrid'
+            (confidence 0-1 untuk tabel intents di data_migration)
+        
+    Returns:
+        int: Jumlah pesan masuk yang diberi label
+    """
+    from modules.conversation import read_messages
+    
+    messages = read_messages(path)
+    incoming = [m for m in messages if m.get("type") == "incoming"]
+    contents = [m.get("content") or "" for m in incoming]
+    if mode == "keyword":
+        intents = _detect_intent_chunk(contents)
+    else:
+        intents = [detect_intent(content, mode) for content in contents]
+    for message, intent in zip(incoming, intents):
+        message["intent"] = intent
+    
+    output_path = output_path or path
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        if str(path).endswith(".jsonl"):
+            for message in messages:
+                f.write(json.dumps(message, ensure_ascii=False, separators=(",", ":")) + "\n")
+        else:
+            json.dump(messages, f, indent=4)
+    os.replace(tmp_path, output_path)
+    return len(incoming)
+
+def _relabel_job(job):
+    path, output_path, mode = job
+    try:
+        return path, relabel_conversation_file(path, output_path, mode), None
+    except Exception as e:
+        return path, 0, str(e)
+
+def relabel_database(backend, processes=None, mode="keyword"):
+    """
+    Label ulang intent semua pesan masuk di database percakapan SQLite
+    
+    Args:
+        backend (SQLiteConversationBackend): Backend percakapan
+        processes (int, optional): Jumlah proses worker untuk mode 'keyword'
+        mode (str): Mode deteksi, lihat relabel_conversation_file
+        
+    Returns:
+        dict: Jumlah pesan yang dilabel dan daftar error
+    """
+    results = {"files": 0, "labelled_messages": 0, "errors": []}
+    for message_ids, contents in backend.iter_incoming():
+        if mode == "keyword":
+            intents = detect_intent_batch(contents, processes=processes)
+        else:
+            intents = [detect_intent(content, mode) for content in contents]
+        backend.set_intents(zip(message_ids, intents))
+        results["labelled_messages"] += len(message_ids)
+    return results
+
+def relabel_conversations(conversations_dir=None, output_dir=None, processes=None, mode="keyword"):
+    """
+    Label ulang intent seluruh file percakapan secara paralel (satu file per tugas)
+    
+    Jika output_dir tidak diberikan, file ditimpa di tempat; lakukan saat bot
+    tidak berjalan agar pesan baru tidak tertimpa. Tanpa conversations_dir,
+    data diambil dari backend percakapan aktif (file atau database SQLite).
+    
+    Args:
+        conversations_dir (str, optional): Direktori percakapan
+        output_dir (str, optional): Direktori tujuan (hanya untuk file)
+        processes (int, optional): Jumlah proses worker (default jumlah CPU)
+        mode (str): Mode deteksi, lihat relabel_conversation_file
+        
+    Returns:
+        dict: Jumlah file, pesan yang dilabel, dan daftar error
+    """
+    if conversations_dir is None:
+        from modules.conversation import CONVERSATIONS_DIR, flush_conversations, get_conversation_backend
+        
+        backend = get_conversation_backend()
+        if backend.name == "sqlite":
+            if output_dir:
+                raise ValueError("output_dir is not supported for the sqlite conversation backend")
+            flush_conversations()
+            return relabel_database(backend, processes or os.cpu_count(), mode)
+        conversations_dir = CONVERSATIONS_DIR
+    
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    
+    jobs = []
+    for root, _, files in os.walk(conversations_dir):
+        for filename in sorted(files):
+            if not filename.endswith((".json", ".jsonl")):
+                continue
+            path = os.path.join(root, filename)
+            target = None
+            if output_dir:
+                target = os.path.join(output_dir, os.path.relpath(path, conversations_dir))
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+            jobs.append((path, target, mode))
+    
+    results = {"files": 0, "labelled_messages": 0, "errors": []}
+    with ProcessPoolExecutor(max_workers=processes or os.cpu_count()) as executor:
+        for path, count, error in executor.map(_relabel_job, jobs, chunksize=16):
+            if error:
+                results["errors"].append(f"{path}: {error}")
+            else:
+                results["files"] += 1
+                results["labelled_messages"] += count
+    return results
+
+def _detect_intent_per_keyword(message):
+    """
+    Implementasi lama (satu regex per keyword), untuk verifikasi dan benchmark
+    """
+    message = message.lower()
+    intent_scores = {category: 0 for category in INTENT_CATEGORIES}
     for category, keywords in INTENT_CATEGORIES.items():
         for keyword in keywords:
             if re.search(r'\b' + re.escape(keyword) + r'\b', message):
                 intent_scores[category] += 1
-    
-    # Tambahkan intent lainnya yang mungkin terdeteksi
     if "?" in message:
         intent_scores["question"] = 1
-    
-    # Filter hanya intent dengan skor > 0
     detected_intents = {k: v for k, v in intent_scores.items() if v > 0}
-    
-    # Jika tidak ada intent yang terdeteksi, gunakan "general"
     if not detected_intents:
         detected_intents["general"] = 1
+    return detected_intents
+
+def benchmark(messages=None, repeat=5):
+    """
+    Bandingkan throughput detektor lama dan detektor terkompilasi
+
+    Args:
+        messages (list, optional): Pesan uji, default contoh pesan customer
+        repeat (int): Berapa kali daftar pesan diproses
+
+    Returns:
+        dict: Pesan per detik untuk setiap implementasi dan jumlah hasil yang berbeda
+    """
+    if messages is None:
+        messages = [
+            "Halo kak, selamat pagi. Mau tanya biaya buka akun berapa ya?",
+            "gimana cara mulai trading saham di jtrade?",
+            "kok aplikasinya error terus, nggak bisa login. kenapa ya",
+            "mending reksa dana atau obligasi? lebih baik mana dibanding deposito",
+            "makasih banyak kak, mantap! selamat tinggal, see ya",
+            "ok",
+        ]
+        # Variasikan pesan agar cache tidak membuat hasil terlalu optimis
+        messages = [f"{m} #{i}" for i in range(200) for m in messages]
+
+    expected = [_detect_intent_per_keyword(m) for m in messages]
+    mismatches = sum(1 for m, e in zip(messages, expected) if detect_intent(m, "keyword") != e)
+    mismatches += sum(1 for r, e in zip(detect_intent_batch(messages), expected) if r != e)
+
+    report = {"messages": len(messages) * repeat, "mismatches": mismatches}
+    for name, fn in (("per_keyword", _detect_intent_per_keyword),
+                     ("compiled", lambda m: _detect_intent_cached.__wrapped__(m.lower())),
+                     ("cached", lambda m: detect_intent(m, "keyword"))):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for message in messages:
+                fn(message)
+        report[f"{name}_per_second"] = report["messages"] / (time.perf_counter() - start)
+    
+    start = time.perf_counter()
+    for _ in range(repeat):
+        detect_intent_batch(messages)
+    report["batch_per_second"] = report["messages"] / (time.perf_counter() - start)
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark dan pelabelan ulang intent")
+    subparsers = parser.add_subparsers(dest="command")
+    
+    bench_parser = subparsers.add_parser("benchmark", help="Bandingkan throughput detektor")
+    bench_parser.add_argument("--repeat", type=int, default=5)
+    
+    relabel_parser = subparsers.add_parser("relabel", help="Label ulang intent di direktori percakapan")
+    relabel_parser.add_argument("--dir", default=None, help="Direktori percakapan (default: backend aktif)")
+    relabel_parser.add_argument("--output", default=None, help="Direktori tujuan (default: timpa di tempat)")
+    relabel_parser.add_argument("--processes", type=int, default=None)
+    relabel_parser.add_argument("--mode", choices=["keyword", "model", "hybrid"], default="keyword")
+    
+    args = parser.parse_args()
     
-    return detected_intents
\ No newline at end of file
+    if args.command == "relabel":
+        report = relabel_conversations(args.dir, args.output, args.processes, args.mode)
+        print(f"{report['files']} file, {report['labelled_messages']} pesan masuk dilabel ulang")
+        for error in report["errors"]:
+            print(f"Error: {error}", file=sys.stderr)
+    else:
+        report = benchmark(repeat=getattr(args, "repeat", 5))
+        print(f"{report['messages']} pesan, {report['mismatches']} hasil berbeda")
+        for name in ("per_keyword", "compiled", "cached", "batch"):
+            print(f"{name:<12}: {report[f'{name}_per_second']:,.0f} pesan/detik")
@@ -0,0 +1,314 @@
+# modules/intent_model.py
+
+"""
+Model intent statistik ringan
+Fitur: n-gram karakter ter-hash (NGramEmbeddingBackend), klasifier: regresi
+logistik one-vs-rest (multi-label) yang dilatih dengan NumPy murni.
+Menangkap slang dan typo yang tidak ada di INTENT_CATEGORIES karena belajar
+dari potongan kata, bukan keyword utuh.
+
+Data latih diambil dari log percakapan: pesan masuk dengan field "intent"
+(lihat `python -m modules.intent_detector relabel`), atau dilabel dengan
+keyword rules jika field itu belum ada.
+"""
+
+import os
+import time
+import argparse
+import numpy as np
+from modules.embedding_backends import NGramEmbeddingBackend
+
+MODEL_PATH = "data/models/intent_model.npz"
+FEATURE_DIM = 1024
+NGRAM_RANGE = (3, 5)
+THRESHOLD = 0.5
+
+# Label yang tidak dipelajari model: ditentukan oleh aturan di intent_detector
+RULE_LABELS = ("general", "question")
+
+class IntentModel:
+    """
+    Klasifier intent multi-label di atas fitur n-gram karakter ter-hash
+    """
+
+    def __init__(self, labels, weights, bias, dim=FEATURE_DIM, ngram_range=NGRAM_RANGE, threshold=THRESHOLD):
+        """
+        Args:
+            labels (list): Nama intent, urutan sesuai kolom bobot
+            weights (np.ndarray): Matriks bobot (dim x jumlah label)
+            bias (np.ndarray): Bias per label
+            dim (int): Dimensi fitur ter-hash
+            ngram_range (tuple): Rentang panjang n-gram karakter
+            threshold (float): Probabilitas minimum agar intent dianggap terdeteksi
+        """
+        self.labels = list(labels)
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.bias = np.asarray(bias, dtype=np.float32)
+        self.threshold = threshold
+        self.featurizer = NGramEmbeddingBackend(dim=dim, ngram_range=tuple(ngram_range))
+
+    @property
+    def dim(self):
+        return self.featurizer.dim
+
+    def featurize(self, texts):
+        """
+        Ubah teks menjadi matriks fitur (len(texts) x dim)
+        """
+        return self.featurizer.embed_batch(list(texts))
+
+    def predict_proba(self, texts):
+        """
+        Probabilitas setiap intent untuk setiap teks
+
+        Args:
+            texts (list): Daftar pesan
+
+        Returns:
+            np.ndarray: Matriks probabilitas (len(texts) x jumlah label)
+        """
+        return _sigmoid(self.featurize(texts) @ self.weights + self.bias)
+
+    def predict(self, text, threshold=None):
+        """
+        Intent yang terdeteksi untuk satu pesan
+
+        Args:
+            text (str): Pesan customer
+            threshold (float, optional): Ambang probabilitas, default self.threshold
+
+        Returns:
+            dict: Intent -> confidence (0-1), hanya yang melewati ambang
+        """
+        threshold = self.threshold if threshold is None else threshold
+        probabilities = self.predict_proba([text])[0]
+        return {
+            label: round(float(p), 3)
+            for label, p in zip(self.labels, probabilities)
+            if p >= threshold
+        }
+
+    @classmethod
+    def train(cls, texts, label_sets, labels=None, dim=FEATURE_DIM, ngram_range=NGRAM_RANGE,
+              epochs=300, learning_rate=2.0, l2=1e-4, threshold=THRESHOLD, seed=0):
+        """
+        Latih model dengan gradient descent full-batch (momentum) pada loss logistik
+
+        Args:
+            texts (list): Daftar pesan
+            label_sets (list): Himpunan/daftar intent untuk setiap pesan
+            labels (list, optional): Daftar label; default semua label di label_sets
+            dim (int): Dimensi fitur ter-hash
+            ngram_range (tuple): Rentang panjang n-gram karakter
+            epochs (int): Jumlah iterasi
+            learning_rate (float): Laju belajar
+            l2 (float): Regularisasi L2
+            threshold (float): Ambang deteksi yang disimpan di model
+            seed (int): Seed random untuk inisialisasi
+
+        Returns:
+            IntentModel: Model terlatih
+        """
+        if labels is None:
+            labels = sorted({label for label_set in label_sets for label in label_set} - set(RULE_LABELS))
+
+        model = cls(labels, np.zeros((dim, len(labels))), np.zeros(len(labels)), dim, ngram_range, threshold)
+        if not texts or not labels:
+            return model
+
+        features = model.featurize(texts)
+        index = {label: i for i, label in enumerate(labels)}
+        targets = np.zeros((len(texts), len(labels)), dtype=np.float32)
+        for row, label_set in enumerate(label_sets):
+            for label in label_set:
+                if label in index:
+                    targets[row, index[label]] = 1.0
+
+        rng = np.random.default_rng(seed)
+        weights = rng.normal(0, 0.01, (dim, len(labels))).astype(np.float32)
+        # Bias awal = log-odds frekuensi label, agar label jarang tidak langsung tertekan
+        prior = np.clip(targets.mean(axis=0), 1e-3, 1 - 1e-3)
+        bias = np.log(prior / (1 - prior)).astype(np.float32)
+        velocity_w = np.zeros_like(weights)
+        velocity_b = np.zeros_like(bias)
+        n = len(texts)
+
+        for _ in range(epochs):
+            error = _sigmoid(features @ weights + bias) - targets
+            grad_w = features.T @ error / n + l2 * weights
+            grad_b = error.mean(axis=0)
+            velocity_w = 0.9 * velocity_w - learning_rate * grad_w
+            velocity_b = 0.9 * velocity_b - learning_rate * grad_b
+            weights += velocity_w
+            bias += velocity_b
+
+        model.weights = weights
+        model.bias = bias
+        return model
+
+    def evaluate(self, texts, label_sets):
+        """
+        Hitung precision/recall/F1 micro dan latensi inferensi
+
+        Returns:
+            dict: Metrik evaluasi
+        """
+        index = {label: i for i, label in enumerate(self.labels)}
+        targets = np.zeros((len(texts), len(self.labels)), dtype=bool)
+        for row, label_set in enumerate(label_sets):
+            for label in label_set:
+                if label in index:
+                    targets[row, index[label]] = True
+
+        predicted = self.predict_proba(texts) >= self.threshold
+        true_positive = int((predicted & targets).sum())
+        precision = true_positive / max(int(predicted.sum()), 1)
+        recall = true_positive / max(int(targets.sum()), 1)
+
+        start = time.perf_counter()
+        for text in texts[:1000]:
+            self.predict(text)
+        per_message = (time.perf_counter() - start) / max(min(len(texts), 1000), 1)
+
+        return {
+            "samples": len(texts),
+            "precision": precision,
+            "recall": recall,
+            "f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+            "us_per_message": per_message * 1e6
+        }
+
+    def save(self, path=MODEL_PATH):
+        """
+        Simpan model ke file .npz (atomik)
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            labels=np.array(self.labels, dtype=str),
+            weights=self.weights,
+            bias=self.bias,
+            dim=np.int64(self.dim),
+            ngram_range=np.array(self.featurizer.ngram_range, dtype=np.int64),
+            threshold=np.float64(self.threshold)
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=MODEL_PATH):
+        """
+        Muat model dari file .npz
+
+        Returns:
+            IntentModel: Model, atau None jika file tidak ada
+        """
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                data["labels"].tolist(),
+                data["weights"],
+                data["bias"],
+                int(data["dim"]),
+                tuple(int(n) for n in data["ngram_range"]),
+                float(data["threshold"])
+            )
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-np.clip(x, -30, 30)))
+
+def _iter_conversation_files(conversations_dir):
+    """
+    Iterasi daftar pesan dari setiap file percakapan di direktori
+    """
+    from modules.conversation import read_messages
+
+    for root, _, files in os.walk(conversations_dir):
+        for filename in sorted(files):
+            if not filename.endswith((".json", ".jsonl")):
+                continue
+            try:
+                yield read_messages(os.path.join(root, filename))
+            except Exception as e:
+                print(f"Error reading {filename}: {e}")
+
+def load_training_data(conversations_dir=None):
+    """
+    Kumpulkan pesan masuk dan labelnya dari riwayat percakapan
+
+    Args:
+        conversations_dir (str, optional): Direktori percakapan; default
+            backend percakapan aktif (file atau database SQLite)
+
+    Returns:
+        tuple: (daftar teks, daftar himpunan label)
+    """
+    from modules.intent_detector import detect_intent_batch
+
+    if conversations_dir is None:
+        from modules.conversation import iter_conversations
+        conversations = (messages for _, messages in iter_conversations())
+    else:
+        conversations = _iter_conversation_files(conversations_dir)
+
+    texts = []
+    label_sets = []
+    unlabelled = []
+    for messages in conversations:
+        for message in messages:
+            if message.get("type") != "incoming" or not message.get("content"):
+                continue
+            texts.append(message["content"])
+            if message.get("intent"):
+                label_sets.append(set(message["intent"]))
+            else:
+                label_sets.append(None)
+                unlabelled.append(len(texts) - 1)
+
+    # Pesan tanpa label dilabel dengan keyword rules
+    for row, intents in zip(unlabelled, detect_intent_batch([texts[i] for i in unlabelled])):
+        label_sets[row] = set(intents)
+
+    return texts, [label_set - set(RULE_LABELS) for label_set in label_sets]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latih dan uji model intent statistik")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    train_parser = subparsers.add_parser("train", help="Latih model dari log percakapan")
+    train_parser.add_argument("--dir", default=None, help="Direktori percakapan (default: backend aktif)")
+    train_parser.add_argument("--output", default=MODEL_PATH)
+    train_parser.add_argument("--dim", type=int, default=FEATURE_DIM)
+    train_parser.add_argument("--epochs", type=int, default=300)
+    train_parser.add_argument("--holdout", type=float, default=0.2, help="Porsi data untuk evaluasi")
+
+    predict_parser = subparsers.add_parser("predict", help="Prediksi intent satu pesan")
+    predict_parser.add_argument("message")
+    predict_parser.add_argument("--model", default=MODEL_PATH)
+
+    args = parser.parse_args()
+
+    if args.command == "train":
+        texts, label_sets = load_training_data(args.dir)
+        order = np.random.default_rng(0).permutation(len(texts))
+        split = int(len(texts) * (1 - args.holdout))
+        train_rows, test_rows = order[:split], order[split:]
+
+        model = IntentModel.train([texts[i] for i in train_rows], [label_sets[i] for i in train_rows],
+                                  dim=args.dim, epochs=args.epochs)
+        if len(test_rows):
+            report = model.evaluate([texts[i] for i in test_rows], [label_sets[i] for i in test_rows])
+            print(f"holdout {report['samples']} pesan: precision {report['precision']:.3f} "
+                  f"recall {report['recall']:.3f} f1 {report['f1']:.3f}, {report['us_per_message']:.0f} us/pesan")
+
+        # Model akhir dilatih dengan seluruh data
+        model = IntentModel.train(texts, label_sets, dim=args.dim, epochs=args.epochs)
+        model.save(args.output)
+        print(f"Model {len(model.labels)} label dari {len(texts)} pesan disimpan ke {args.output}")
+    else:
+        model = IntentModel.load(args.model)
+        if model is None:
+            print(f"Model tidak ditemukan: {args.model}")
+        else:
+            print(model.predict(args.message))
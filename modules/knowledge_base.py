@@ -3,14 +3,182 @@
 """
 Modul untuk mengelola knowledge base
 Menyediakan informasi dan FAQ tentang JTRADE
+
+Semua file knowledge base dimuat ke satu snapshot immutable di memori yang
+dipakai bersama oleh generate_prompt dan RAGEngine. Thread latar belakang
+memeriksa mtime file setiap KB_CHECK_INTERVAL detik dan menukar snapshot
+secara atomik jika ada perubahan, sehingga pembacaan tidak melakukan I/O.
 """
 
 import os
 import json
+import time
+import threading
+from pathlib import Path
+from types import MappingProxyType
+from modules.immutable import freeze
+
+KB_DIR = "data/knowledge_base"
+GENERAL_KB_FILE = f"{KB_DIR}/general.json"
+
+# Jeda pemeriksaan perubahan file knowledge base (detik)
+KB_CHECK_INTERVAL = 2.0
 
 # Pastikan direktori knowledge_base ada
-if not os.path.exists("data/knowledge_base"):
-    os.makedirs("data/knowledge_base")
+if not os.path.exists(KB_DIR):
+    os.makedirs(KB_DIR)
+
+DEFAULT_KB = {
+    "company_info": {
+        "name": "JTRADE",
+        "description": "Platform investasi modern yang fokus pada pengalaman investor",
+        "unique_selling_points": [
+            "Biaya transaksi terendah di industri",
+            "Eksekusi order tercepat",
+            "Analisis pasar real-time",
+            "Layanan personal oleh financial advisor berpengalaman"
+        ]
+    },
+    "products": {
+        "stock_trading": {
+            "description": "Perdagangan saham dengan komisi terendah di pasar",
+            "features": ["Real-time quotes", "Advanced charting", "Research reports"]
+        },
+        "mutual_funds": {
+            "description": "Investasi reksa dana tanpa biaya pembelian",
+            "features": ["Seleksi reksa dana terbaik", "Analisis kinerja mendalam"]
+        },
+        "bonds": {
+            "description": "Investasi obligasi pemerintah dan korporasi",
+            "features": ["Yield kompetitif", "Analisis credit rating"]
+        }
+    },
+    "faq": [
+        {
+            "question": "Berapa minimum deposit di JTRADE?",
+            "answer": "Minimum deposit di JTRADE adalah Rp 1.000.000 untuk membuka akun reguler."
+        },
+        {
+            "question": "Bagaimana cara membuka akun di JTRADE?",
+            "answer": "Membuka akun di JTRADE sangat mudah. Anda cukup mengunduh aplikasi kami, melengkapi formulir pendaftaran online, dan mengunggah dokumen identitas. Proses verifikasi biasanya selesai dalam 1 hari kerja."
+        },
+        {
+            "question": "Apa saja biaya transaksi di JTRADE?",
+            "answer": "JTRADE menawarkan biaya transaksi terendah di industri, mulai dari 0.1% untuk transaksi saham dan gratis untuk pembelian reksa dana."
+        }
+    ]
+}
+
+class KnowledgeSnapshot:
+    """
+    Isi knowledge base pada satu waktu (read-only)
+    """
+
+    __slots__ = ("data", "mtimes", "version", "loaded_at")
+
+    def __init__(self, data, mtimes, version):
+        """
+        Args:
+            data (dict): Nama knowledge base (nama file) -> isi
+            mtimes (dict): Path file -> mtime saat dimuat
+            version (int): Nomor urut snapshot
+        """
+        object.__setattr__(self, "data", freeze(data))
+        object.__setattr__(self, "mtimes", MappingProxyType(dict(mtimes)))
+        object.__setattr__(self, "version", version)
+        object.__setattr__(self, "loaded_at", time.time())
+
+    def __setattr__(self, name, value):
+        raise AttributeError("KnowledgeSnapshot bersifat immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("KnowledgeSnapshot bersifat immutable")
+
+def _ensure_default_kb():
+    """
+    Buat knowledge base umum dengan data default jika belum ada
+    """
+    if not os.path.exists(GENERAL_KB_FILE):
+        with open(GENERAL_KB_FILE, "w") as f:
+            json.dump(DEFAULT_KB, f, indent=4)
+
+def _scan_mtimes():
+    mtimes = {}
+    for file_path in Path(KB_DIR).glob("*.json"):
+        try:
+            mtimes[str(file_path)] = file_path.stat().st_mtime_ns
+        except OSError:
+            continue
+    return mtimes
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+_watcher = None
+
+def _load_snapshot(mtimes):
+    """
+    Baca semua file knowledge base menjadi snapshot baru
+    """
+    data = {}
+    mtimes = dict(mtimes)
+    for path in sorted(mtimes):
+        try:
+            with open(path, 'r') as f:
+                data[Path(path).stem] = json.load(f)
+        except Exception as e:
+            print(f"Error loading {path}: {e}")
+            # Pertahankan isi lama file yang sedang ditulis/rusak; mtime-nya tidak
+            # dicatat agar file dibaca ulang pada pemeriksaan berikutnya
+            del mtimes[path]
+            if _snapshot is not None and Path(path).stem in _snapshot.data:
+                data[Path(path).stem] = _snapshot.data[Path(path).stem]
+    version = _snapshot.version + 1 if _snapshot is not None else 1
+    return KnowledgeSnapshot(data, mtimes, version)
+
+def refresh_knowledge(force=False):
+    """
+    Muat ulang snapshot jika ada file knowledge base yang berubah
+    (juga menjalankan thread pemantau saat pertama kali dipanggil)
+
+    Args:
+        force (bool): Muat ulang walaupun tidak ada perubahan mtime
+
+    Returns:
+        KnowledgeSnapshot: Snapshot yang berlaku
+    """
+    global _snapshot, _watcher
+    with _snapshot_lock:
+        _ensure_default_kb()
+        mtimes = _scan_mtimes()
+        if force or _snapshot is None or mtimes != dict(_snapshot.mtimes):
+            # Penugasan referensi bersifat atomik: pembaca melihat snapshot lama atau baru
+            _snapshot = _load_snapshot(mtimes)
+
+        if _watcher is None:
+            _watcher = threading.Thread(target=_watch_knowledge, args=(KB_CHECK_INTERVAL,),
+                                        name="knowledge_watcher", daemon=True)
+            _watcher.start()
+        return _snapshot
+
+def _watch_knowledge(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            refresh_knowledge()
+        except Exception as e:
+            print(f"Error refreshing knowledge base: {e}")
+
+def get_knowledge_snapshot():
+    """
+    Snapshot knowledge base saat ini (dimuat saat pertama kali dipanggil)
+
+    Returns:
+        KnowledgeSnapshot: Snapshot bersama
+    """
+    snapshot = _snapshot
+    if snapshot is not None:
+        return snapshot
+    return refresh_knowledge()
 
 def get_knowledge(topic=None):
     """
@@ -20,63 +188,12 @@ def get_knowledge(topic=None):
         topic (str, optional): Topik spesifik yang diinginkan
         
     Returns:
-        dict: Data dari knowledge base
+        Mapping: Data dari knowledge base umum (read-only)
     """
-    # File untuk knowledge base umum
-    general_kb_file = "data/knowledge_base/general.json"
-    
-    # Jika file tidak ada, buat dengan data default
-    if not os.path.exists(general_kb_file):
-        default_kb = {
-            "company_info": {
-                "name": "JTRADE",
-                "description": "Platform investasi modern yang fokus pada pengalaman investor",
-                "unique_selling_points": [
-                    "Biaya transaksi terendah di industri",
-                    "Eksekusi order tercepat",
-                    "Analisis pasar real-time",
-                    "Layanan personal oleh financial advisor berpengalaman"
-                ]
-            },
-            "products": {
-                "stock_trading": {
-                    "description": "Perdagangan saham dengan komisi terendah di pasar",
-                    "features": ["Real-time quotes", "Advanced charting", "Research reports"]
-                },
-                "mutual_funds": {
-                    "description": "Investasi reksa dana tanpa biaya pembelian",
-                    "features": ["Seleksi reksa dana terbaik", "Analisis kinerja mendalam"]
-                },
-                "bonds": {
-                    "description": "Investasi obligasi pemerintah dan korporasi",
-                    "features": ["Yield kompetitif", "Analisis credit rating"]
-                }
-            },
-            "faq": [
-                {
-                    "question": "Berapa minimum deposit di JTRADE?",
-                    "answer": "Minimum deposit di JTRADE adalah Rp 1.000.000 untuk membuka akun reguler."
-                },
-                {
-                    "question": "Bagaimana cara membuka akun di JTRADE?",
-                    "answer": "Membuka akun di JTRADE sangat mudah. Anda cukup mengunduh aplikasi kami, melengkapi formulir pendaftaran online, dan mengunggah dokumen identitas. Proses verifikasi biasanya selesai dalam 1 hari kerja."
-                },
-                {
-                    "question": "Apa saja biaya transaksi di JTRADE?",
-                    "answer": "JTRADE menawarkan biaya transaksi terendah di industri, mulai dari 0.1% untuk transaksi saham dan gratis untuk pembelian reksa dana."
-                }
-            ]
-        }
-        
-        with open(general_kb_file, "w") as f:
-            json.dump(default_kb, f, indent=4)
-    
-    # Baca knowledge base
-    with open(general_kb_file, "r") as f:
-        knowledge_base = json.load(f)
+    knowledge_base = get_knowledge_snapshot().data.get("general", MappingProxyType({}))
     
     # Jika topic ditentukan, ambil hanya bagian tersebut
     if topic and topic in knowledge_base:
         return knowledge_base[topic]
     
-    return knowledge_base
\ No newline at end of file
+    return knowledge_base
@@ -0,0 +1,111 @@
+# modules/llm_client.py
+
+"""
+Registry client LLM per API key
+Setiap API key punya satu client dengan connection pool HTTP (keep-alive)
+sehingga koneksi TLS dipakai ulang antar respons dan antar akun tidak saling
+menimpa openai.api_key global.
+"""
+
+import os
+import openai
+import aiohttp
+from modules.rate_limiter import RateLimiter, DEFAULT_RPM, DEFAULT_TPM
+
+# Batas koneksi default per API key (bisa diatur lewat environment)
+DEFAULT_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+DEFAULT_KEEPALIVE_TIMEOUT = float(os.getenv("LLM_KEEPALIVE_TIMEOUT", "60"))  # detik
+
+# Registry client, key = API key
+_clients = {}
+
+class LLMClient:
+    """
+    Client OpenAI untuk satu API key dengan session aiohttp persisten
+    """
+    
+    def __init__(self, api_key, max_connections=DEFAULT_MAX_CONNECTIONS, keepalive_timeout=DEFAULT_KEEPALIVE_TIMEOUT,
+                 rpm=DEFAULT_RPM, tpm=DEFAULT_TPM):
+        """
+        Inisialisasi client
+        
+        Args:
+            api_key (str): OpenAI API key
+            max_connections (int): Jumlah maksimum koneksi simultan di pool
+            keepalive_timeout (float): Lama koneksi idle dipertahankan (detik)
+            rpm (int): Batas request per menit untuk API key ini
+            tpm (int): Batas token per menit untuk API key ini
+        """
+        self.api_key = api_key
+        self.max_connections = max_connections
+        self.keepalive_timeout = keepalive_timeout
+        self.rate_limiter = RateLimiter(rpm=rpm, tpm=tpm)
+        self._session = None
+    
+    def _get_session(self):
+        """
+        Ambil session aiohttp, dibuat sekali saat pertama dipakai di event loop
+        """
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                keepalive_timeout=self.keepalive_timeout
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+    
+    async def chat_completion(self, **kwargs):
+        """
+        Panggil ChatCompletion API memakai connection pool milik client ini
+        
+        Args:
+            **kwargs: Parameter untuk openai.ChatCompletion.acreate
+            
+        Returns:
+            OpenAIObject: Respons dari API
+        """
+        # aiosession adalah ContextVar, jadi hanya berlaku untuk task ini
+        token = openai.aiosession.set(self._get_session())
+        try:
+            return await openai.ChatCompletion.acreate(api_key=self.api_key, **kwargs)
+        finally:
+            openai.aiosession.reset(token)
+    
+    async def close(self):
+        """
+        Tutup connection pool
+        """
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+def get_client(api_key, max_connections=None):
+    """
+    Dapatkan client untuk API key tertentu, dibuat sekali lalu dipakai ulang
+    
+    Args:
+        api_key (str): OpenAI API key
+        max_connections (int, optional): Jumlah maksimum koneksi, default
+            LLM_MAX_CONNECTIONS (hanya dipakai saat client dibuat)
+        
+    Returns:
+        LLMClient: Client untuk API key tersebut
+    """
+    max_connections = max_connections or DEFAULT_MAX_CONNECTIONS
+    client = _clients.get(api_key)
+    if client is None:
+        client = LLMClient(api_key, max_connections=max_connections)
+        _clients[api_key] = client
+    elif client.max_connections != max_connections:
+        # Pool yang sudah terbuka tidak bisa diubah ukurannya tanpa memutus request aktif
+        print(f"LLM client already created with max_connections={client.max_connections}, "
+              f"ignoring requested {max_connections}")
+    return client
+
+async def close_all_clients():
+    """
+    Tutup semua connection pool, dipanggil saat aplikasi berhenti
+    """
+    for client in list(_clients.values()):
+        await client.close()
+    _clients.clear()
@@ -3,92 +3,264 @@
 """
 Modul untuk mengelola persona/identitas akun
 Mengkombinasikan profil, konteks, kepribadian, dan gaya
+
+Persona dimuat sekali ke registry sebagai objek immutable dan hanya dimuat
+ulang jika mtime salah satu file sumbernya berubah.
 """
 
 import os
+import time
+import threading
 import importlib.util
 import json
+from types import MappingProxyType
+from collections.abc import Mapping
+from modules.immutable import freeze, thaw
 
-def get_persona(username):
+PROFILE_DIR = "profil"
+PERSONA_DIR = "persona"
+
+# Jeda minimum antar pemeriksaan mtime file sumber per persona (detik)
+RELOAD_CHECK_INTERVAL = 2.0
+
+DEFAULT_PERSONA = {
+    "name": "CS JTRADE",
+    "gender": "netral",
+    "personality": "ramah dan profesional",
+    "context": "investment_advisor",
+    "style": "formal",
+    "background": "memiliki pengetahuan luas tentang investasi",
+    "goals": "membantu pengguna dalam menemukan investasi yang tepat"
+}
+
+class Persona(Mapping):
     """
-    Dapatkan persona lengkap untuk username tertentu
-    
-    Args:
-        username (str): Username akun JTRADE
-        
+    Persona immutable; dipakai seperti dict read-only (get, [], **persona)
+    """
+
+    __slots__ = ("username", "sources", "_data")
+
+    def __init__(self, username, data, sources):
+        """
+        Args:
+            username (str): Username akun JTRADE
+            data (dict): Data persona gabungan
+            sources (dict): Path file sumber -> mtime saat dimuat (None jika tidak ada)
+        """
+        object.__setattr__(self, "username", username)
+        object.__setattr__(self, "sources", MappingProxyType(dict(sources)))
+        object.__setattr__(self, "_data", freeze(data))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Persona bersifat immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("Persona bersifat immutable")
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __repr__(self):
+        return f"Persona({self.username!r}, {self.get('name')!r})"
+
+    def to_dict(self):
+        """
+        Salinan persona sebagai dict biasa (bisa diubah dan di-serialisasi JSON)
+        """
+        return thaw(self._data)
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+def _load_module_data(path, module_name, function_name, username, label):
+    """
+    Eksekusi file Python persona dan panggil fungsi datanya
+
+    Returns:
+        dict: Data dari fungsi, atau None jika file/fungsi tidak ada atau error
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        spec = importlib.util.spec_from_file_location(module_name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+        if hasattr(module, function_name):
+            return getattr(module, function_name)()
+    except Exception as e:
+        print(f"Error loading {label} for {username}: {e}")
+    return None
+
+def _build_persona(username):
+    """
+    Susun persona lengkap dari file profil, konteks, kepribadian, dan gaya
+
     Returns:
-        dict: Informasi persona termasuk profil, konteks, kepribadian, dan gaya
+        Persona: Persona immutable beserta mtime file sumbernya
     """
     # Persona default jika tidak ditemukan
-    persona = {
-        "name": "CS JTRADE",
-        "gender": "netral",
-        "personality": "ramah dan profesional",
-        "context": "investment_advisor",
-        "style": "formal",
-        "background": "memiliki pengetahuan luas tentang investasi",
-        "goals": "membantu pengguna dalam menemukan investasi yang tepat"
-    }
-    
+    persona = dict(DEFAULT_PERSONA)
+    sources = {}
+
     # Coba muat profil jika ada
-    profile_path = f"profil/{username}.py"
-    if os.path.exists(profile_path):
-        try:
-            # Dynamically import the profile module
-            spec = importlib.util.spec_from_file_location(f"profil.{username}", profile_path)
-            profile_module = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(profile_module)
-            
-            # Get profile data
-            if hasattr(profile_module, "get_profile"):
-                profile_data = profile_module.get_profile()
-                persona.update(profile_data)
-        except Exception as e:
-            print(f"Error loading profile for {username}: {e}")
-    
+    profile_path = f"{PROFILE_DIR}/{username}.py"
+    sources[profile_path] = _mtime(profile_path)
+    profile_data = _load_module_data(profile_path, f"profil.{username}", "get_profile", username, "profile")
+    if profile_data:
+        persona.update(profile_data)
+
     # Muat konteks jika ada
     context_type = persona.get("context", "investment_advisor")
-    context_path = f"persona/contexts/{context_type}.py"
-    if os.path.exists(context_path):
-        try:
-            spec = importlib.util.spec_from_file_location(f"persona.contexts.{context_type}", context_path)
-            context_module = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(context_module)
-            
-            if hasattr(context_module, "get_context"):
-                context_data = context_module.get_context()
-                persona["context_details"] = context_data
-        except Exception as e:
-            print(f"Error loading context for {username}: {e}")
-    
+    context_path = f"{PERSONA_DIR}/contexts/{context_type}.py"
+    sources[context_path] = _mtime(context_path)
+    context_data = _load_module_data(context_path, f"persona.contexts.{context_type}", "get_context", username, "context")
+    if context_data is not None:
+        persona["context_details"] = context_data
+
     # Muat kepribadian jika ada
     personality_traits = persona.get("personality", "ramah").lower().split(" ")[0]
-    personality_path = f"persona/personalities/{personality_traits}.py"
-    if os.path.exists(personality_path):
-        try:
-            spec = importlib.util.spec_from_file_location(f"persona.personalities.{personality_traits}", personality_path)
-            personality_module = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(personality_module)
-            
-            if hasattr(personality_module, "get_personality"):
-                personality_data = personality_module.get_personality()
-                persona["personality_details"] = personality_data
-        except Exception as e:
-            print(f"Error loading personality for {username}: {e}")
-    
+    personality_path = f"{PERSONA_DIR}/personalities/{personality_traits}.py"
+    sources[personality_path] = _mtime(personality_path)
+    personality_data = _load_module_data(personality_path, f"persona.personalities.{personality_traits}",
+                                         "get_personality", username, "personality")
+    if personality_data is not None:
+        persona["personality_details"] = personality_data
+
     # Muat gaya komunikasi jika ada
     style_type = persona.get("style", "formal").lower()
-    style_path = f"persona/styles/{style_type}.py"
-    if os.path.exists(style_path):
-        try:
-            spec = importlib.util.spec_from_file_location(f"persona.styles.{style_type}", style_path)
-            style_module = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(style_module)
-            
-            if hasattr(style_module, "get_style"):
-                style_data = style_module.get_style()
-                persona["style_details"] = style_data
-        except Exception as e:
-            print(f"Error loading style for {username}: {e}")
-    
-    return persona
\ No newline at end of file
+    style_path = f"{PERSONA_DIR}/styles/{style_type}.py"
+    sources[style_path] = _mtime(style_path)
+    style_data = _load_module_data(style_path, f"persona.styles.{style_type}", "get_style", username, "style")
+    if style_data is not None:
+        persona["style_details"] = style_data
+
+    return Persona(username, persona, sources)
+
+class PersonaRegistry:
+    """
+    Cache persona per username dengan reload berbasis mtime
+    """
+
+    def __init__(self, check_interval=RELOAD_CHECK_INTERVAL):
+        """
+        Args:
+            check_interval (float): Jeda minimum antar pemeriksaan mtime (detik)
+        """
+        self.check_interval = check_interval
+        self._personas = {}
+        self._checked_at = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "loads": 0, "reloads": 0, "mtime_checks": 0}
+
+    def _is_stale(self, persona):
+        self.stats["mtime_checks"] += 1
+        return any(_mtime(path) != mtime for path, mtime in persona.sources.items())
+
+    def get(self, username):
+        """
+        Ambil persona dari cache, muat (ulang) jika belum ada atau file berubah
+
+        Args:
+            username (str): Username akun JTRADE
+
+        Returns:
+            Persona: Persona immutable
+        """
+        now = time.monotonic()
+        with self._lock:
+            persona = self._personas.get(username)
+            if persona is not None:
+                if now - self._checked_at.get(username, 0.0) < self.check_interval:
+                    self.stats["hits"] += 1
+                    return persona
+                self._checked_at[username] = now
+                if not self._is_stale(persona):
+                    self.stats["hits"] += 1
+                    return persona
+                self.stats["reloads"] += 1
+
+            persona = _build_persona(username)
+            self.stats["loads"] += 1
+            self._personas[username] = persona
+            self._checked_at[username] = now
+            return persona
+
+    def load_all(self, usernames=None):
+        """
+        Muat persona di awal (default semua file di direktori profil)
+
+        Args:
+            usernames (list, optional): Username yang dimuat
+
+        Returns:
+            int: Jumlah persona yang dimuat
+        """
+        if usernames is None:
+            usernames = [f[:-3] for f in sorted(os.listdir(PROFILE_DIR))
+                         if f.endswith(".py") and not f.startswith("__")] if os.path.isdir(PROFILE_DIR) else []
+        for username in usernames:
+            self.get(username)
+        return len(usernames)
+
+    def invalidate(self, username=None):
+        """
+        Hapus persona dari cache (semua jika username None)
+        """
+        with self._lock:
+            if username is None:
+                self._personas.clear()
+                self._checked_at.clear()
+            else:
+                self._personas.pop(username, None)
+                self._checked_at.pop(username, None)
+
+    def get_stats(self):
+        """
+        Statistik registry
+
+        Returns:
+            dict: Jumlah hit, load, reload, pemeriksaan mtime, dan persona di cache
+        """
+        with self._lock:
+            stats = dict(self.stats)
+            stats["cached"] = len(self._personas)
+        requests = stats["hits"] + stats["loads"]
+        stats["hit_rate"] = stats["hits"] / requests if requests else 0.0
+        return stats
+
+_registry = PersonaRegistry()
+
+def get_persona_registry():
+    """
+    Registry persona bersama untuk seluruh proses
+    """
+    return _registry
+
+def get_persona(username):
+    """
+    Dapatkan persona lengkap untuk username tertentu
+
+    Args:
+        username (str): Username akun JTRADE
+
+    Returns:
+        Persona: Informasi persona termasuk profil, konteks, kepribadian, dan gaya
+            (mapping read-only; gunakan to_dict() untuk salinan yang bisa diubah)
+    """
+    return _registry.get(username)
+
+def get_persona_stats():
+    """
+    Statistik cache persona (untuk memastikan biaya per pesan mendekati nol)
+    """
+    return _registry.get_stats()
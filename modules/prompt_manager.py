@@ -1,93 +1,178 @@
 import os
 import json
 import time
+import asyncio
+import functools
+import threading
 from modules.knowledge_base import get_knowledge
 from modules.intent_detector import detect_intent
+from modules.rag_engine import get_rag_engine
+from modules.persona import Persona
+from modules.prompt_trace import get_prompt_tracer
+from modules.tokenizer import TokenBudgeter, count_tokens
 
-def generate_prompt(persona, conversation_history, latest_message, debug=False):
+# Statistik retrieval RAG per pesan
+_retrieval_stats = {
+    "calls": 0,
+    "errors": 0,
+    "total_ms": 0.0,
+    "max_ms": 0.0,
+    "total_chars": 0,
+    "last_ms": 0.0,
+    "last_chars": 0
+}
+# generate_prompt_async memanggil retrieval dari thread executor
+_retrieval_stats_lock = threading.Lock()
+
+# Template berdasarkan style persona
+STYLE_PROMPTS = {
+    "santai": {
+        "system": (
+            "Lu lagi jadi {name}! Anak {context} dari JTRADE yang santuy tapi paham cuan. "
+            "Ngomongnya ngalir aja kayak ngobrol di tongkrongan."
+        ),
+        "instruction": "Jawab singkat-singkat aja, bro. Jangan lebay, yang penting nyambung!"
+    },
+    "formal": {
+        "system": (
+            "Anda sedang berperan sebagai {name}, seorang {context} profesional dari JTRADE. "
+            "Gunakan bahasa sopan dan informatif sesuai etika komunikasi bisnis."
+        ),
+        "instruction": "Sampaikan jawaban secara ringkas, padat, dan jelas. Hindari bahasa informal."
+    },
+    "ramah": {
+        "system": (
+            "Kamu lagi jadi {name}, si {context} dari JTRADE yang super friendly. "
+            "Selalu kasih respon yang bikin user merasa disambut hangat!"
+        ),
+        "instruction": "Balas dengan 1-2 kalimat yang ramah banget, biar user ngerasa ditemenin."
+    },
+    "ngakak": {
+        "system": (
+            "Lo tuh {name}, si {context} dari JTRADE yang suka ngelawak tapi tetep paham cuan. "
+            "Bikin user ketawa tapi tetep dapet insight."
+        ),
+        "instruction": "Bikin jawabannya lucu dikit, 1-2 kalimat aja, jangan garing ya!"
+    },
+    "deep": {
+        "system": (
+            "Sekarang lo jadi {name}, {context} dari JTRADE yang ngomongnya dalem dan mikir. "
+            "Suarakan insight yang bisa nyentil tapi tetep simpel."
+        ),
+        "instruction": "Jawaban pendek tapi dalem. 1-2 kalimat yang bisa bikin mikir."
+    }
+}
+
+# Anggaran token untuk seluruh prompt (di luar max_tokens jawaban)
+PROMPT_TOKEN_BUDGET = 1000
+
+# Teks tetap yang membungkus bagian-bagian prompt
+_PROMPT_SCAFFOLD = "\n\nPercakapan sebelumnya:\n\n\nUser: \nAssistant:"
+
+# Intent yang membutuhkan data knowledge base di intent_info
+KB_INTENTS = {"inquiry_product", "inquiry_fee", "inquiry_registration"}
+
+# Prefix prompt per persona yang sudah dirender
+MAX_CACHED_PREFIXES = 256
+_prefix_cache = {}
+_prefix_stats = {"hits": 0, "misses": 0}
+_prefix_lock = threading.Lock()
+
+def _render_prompt_prefix(persona):
+    """
+    Render bagian statis prompt: system + instruction sesuai style persona
+    """
+    selected_template = STYLE_PROMPTS.get(persona.get("style", "santai"), STYLE_PROMPTS["santai"])
+    return (
+        f"{selected_template['system'].format(**persona)}\n\n"
+        f"{selected_template['instruction']}\n\n"
+    )
+
+def get_prompt_prefix(persona):
+    """
+    Ambil prefix statis prompt untuk persona dari cache
+
+    Prefix identik byte-per-byte untuk persona yang sama selama file sumbernya
+    tidak berubah, sehingga prompt caching di sisi provider bisa kena hit.
+
+    Args:
+        persona (Persona | dict): Informasi persona
+
+    Returns:
+        str: System + instruction, diakhiri baris kosong
+    """
+    # Hanya Persona dari registry yang punya identitas stabil (username + mtime sumber)
+    if not isinstance(persona, Persona):
+        with _prefix_lock:
+            _prefix_stats["misses"] += 1
+        return _render_prompt_prefix(persona)
+
+    key = (persona.username, tuple(persona.sources.items()))
+    with _prefix_lock:
+        prefix = _prefix_cache.get(key)
+        if prefix is not None:
+            _prefix_stats["hits"] += 1
+            return prefix
+        _prefix_stats["misses"] += 1
+
+    prefix = _render_prompt_prefix(persona)
+    with _prefix_lock:
+        if len(_prefix_cache) >= MAX_CACHED_PREFIXES:
+            _prefix_cache.clear()
+        _prefix_cache[key] = prefix
+    return prefix
+
+def get_prefix_stats():
+    """
+    Statistik cache prefix prompt
+
+    Returns:
+        dict: Jumlah hit, miss, dan prefix di cache
+    """
+    with _prefix_lock:
+        return dict(_prefix_stats, cached=len(_prefix_cache))
+
+def generate_prompt(persona, conversation_history, latest_message, debug=False, account=None):
     """
     Generate prompt untuk OpenAI API berdasarkan persona, riwayat percakapan, dan intent
 
     Args:
-        persona (dict): Informasi persona
+        persona (Persona | dict): Informasi persona
         conversation_history (list): Riwayat percakapan
         latest_message (str): Pesan terbaru dari pengguna
-        debug (bool): Jika True, tampilkan prompt dan estimasi token
+        debug (bool): Jika True, prompt selalu dicatat ke trace (tanpa sampling)
+        account (str, optional): Username akun untuk sampling trace, default username persona
 
     Returns:
         str: Prompt untuk dikirim ke OpenAI API
     """
     intents = detect_intent(latest_message)
-    knowledge = get_knowledge()
-
-    # Template berdasarkan style persona
-    def get_prompt_template(style, persona):
-        style_prompts = {
-            "santai": {
-                "system": (
-                    "Lu lagi jadi {name}! Anak {context} dari JTRADE yang santuy tapi paham cuan. "
-                    "Ngomongnya ngalir aja kayak ngobrol di tongkrongan."
-                ),
-                "instruction": "Jawab singkat-singkat aja, bro. Jangan lebay, yang penting nyambung!"
-            },
-            "formal": {
-                "system": (
-                    "Anda sedang berperan sebagai {name}, seorang {context} profesional dari JTRADE. "
-                    "Gunakan bahasa sopan dan informatif sesuai etika komunikasi bisnis."
-                ),
-                "instruction": "Sampaikan jawaban secara ringkas, padat, dan jelas. Hindari bahasa informal."
-            },
-            "ramah": {
-                "system": (
-                    "Kamu lagi jadi {name}, si {context} dari JTRADE yang super friendly. "
-                    "Selalu kasih respon yang bikin user merasa disambut hangat!"
-                ),
-                "instruction": "Balas dengan 1-2 kalimat yang ramah banget, biar user ngerasa ditemenin."
-            },
-            "ngakak": {
-                "system": (
-                    "Lo tuh {name}, si {context} dari JTRADE yang suka ngelawak tapi tetep paham cuan. "
-                    "Bikin user ketawa tapi tetep dapet insight."
-                ),
-                "instruction": "Bikin jawabannya lucu dikit, 1-2 kalimat aja, jangan garing ya!"
-            },
-            "deep": {
-                "system": (
-                    "Sekarang lo jadi {name}, {context} dari JTRADE yang ngomongnya dalem dan mikir. "
-                    "Suarakan insight yang bisa nyentil tapi tetep simpel."
-                ),
-                "instruction": "Jawaban pendek tapi dalem. 1-2 kalimat yang bisa bikin mikir."
-            }
-        }
-        return style_prompts.get(style, style_prompts["santai"])
-
-    style = persona.get("style", "santai")
-    selected_template = get_prompt_template(style, persona)
 
+    # Bagian statis (system + instruction) diambil dari cache per persona
     template = {
-        "system": selected_template["system"].format(**persona),
-        "instruction": selected_template["instruction"],
+        "prefix": get_prompt_prefix(persona),
         "intent_info": "",
         "history": "",
         "latest_message": latest_message.strip()
     }
 
-    # Ambil informasi intent terbatas
+    # Ambil informasi intent terbatas (knowledge base hanya dibaca jika perlu)
+    knowledge = get_knowledge() if intents.keys() & KB_INTENTS else {}
+    intent_lines = []
     if 'inquiry_product' in intents:
         products = list(knowledge.get('products', {}).items())[:2]
-        lines = ["Informasi produk yang relevan:"]
+        intent_lines.append("Informasi produk yang relevan:")
         for name, data in products:
-            lines.append(f"- {name}: {data['description']}")
-        template['intent_info'] += "\n" + "\n".join(lines)
+            intent_lines.append(f"- {name}: {data['description']}")
 
     if 'inquiry_fee' in intents or 'inquiry_registration' in intents:
         faqs = knowledge.get('faq', [])
         filtered = [f for f in faqs if any(k in f['question'].lower() for k in ['biaya', 'fee', 'daftar', 'buka akun'])][:2]
         for faq in filtered:
-            template['intent_info'] += f"\n- {faq['question']}: {faq['answer']}"
+            intent_lines.append(f"- {faq['question']}: {faq['answer']}")
 
     # Tambahkan RAG knowledge
-    template['rag_knowledge'] = get_relevant_knowledge(
+    rag_knowledge = get_relevant_knowledge(
         persona=persona,
         query=latest_message,
         intent=intents,
@@ -102,29 +187,73 @@ def generate_prompt(persona, conversation_history, latest_message, debug=False):
             formatted.append(f"User: {msg['user']}\nAssistant: {msg['assistant']}")
         else:
             formatted.append(str(msg))
-    template['history'] = "\n".join(formatted)
+
+    # Prefix (system) selalu utuh agar tetap identik dengan versi cache; sisa
+    # anggaran dibagi: pesan terbaru > RAG > info intent > riwayat (terbaru dulu)
+    selected, _ = TokenBudgeter(PROMPT_TOKEN_BUDGET).allocate([
+        {"name": "latest_message", "priority": 1, "text": template['latest_message']},
+        {"name": "rag_knowledge", "priority": 2, "items": rag_knowledge.split("\n") if rag_knowledge else []},
+        {"name": "intent_info", "priority": 3, "items": intent_lines},
+        {"name": "history", "priority": 4, "items": formatted, "keep": "tail"},
+    ], reserved_tokens=count_tokens(_PROMPT_SCAFFOLD) + count_tokens(template['prefix']))
+    template.update(selected)
+    if template['intent_info']:
+        template['intent_info'] = "\n" + template['intent_info']
 
     # Gabungkan semua termasuk RAG
     full_prompt = (
-        f"{template['system']}\n\n"
-        f"{template['instruction']}\n\n"
+        f"{template['prefix']}"
         f"{template['intent_info']}\n"
         f"{template['rag_knowledge']}\n"
         f"Percakapan sebelumnya:\n{template['history']}\n\n"
         f"User: {template['latest_message']}\nAssistant:"
     )
 
-    # Debug log
-    if debug:
-        print("\n---[ Prompt Debug Start ]---")
-        print(full_prompt)
-        token_estimate = len(full_prompt.split()) * 1.3
-        print(f"\n[Typing simulation...]\nToken Estimate: ~{int(token_estimate)} tokens")
-        print("---[ Prompt Debug End ]---\n")
-        time.sleep(1.2)
+    # Trace prompt tersampel, ditulis di latar belakang
+    get_prompt_tracer().trace(
+        account or getattr(persona, "username", None),
+        full_prompt,
+        template,
+        estimate_tokens(full_prompt),
+        force=debug
+    )
 
     return full_prompt
 
+async def generate_prompt_async(persona, conversation_history, latest_message, debug=False, account=None):
+    """
+    Versi async dari generate_prompt yang tidak memblokir event loop
+
+    Retrieval RAG bisa melakukan I/O jaringan (RAG_EMBEDDING_BACKEND=remote),
+    jadi penyusunan prompt dijalankan di thread executor.
+
+    Args:
+        persona (Persona | dict): Informasi persona
+        conversation_history (list): Riwayat percakapan
+        latest_message (str): Pesan terbaru dari pengguna
+        debug (bool): Jika True, prompt selalu dicatat ke trace (tanpa sampling)
+        account (str, optional): Username akun untuk sampling trace
+
+    Returns:
+        str: Prompt untuk dikirim ke OpenAI API
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(
+        generate_prompt, persona, conversation_history, latest_message, debug=debug, account=account
+    ))
+
+def estimate_tokens(text):
+    """
+    Hitung jumlah token sebuah teks dengan tokenizer BPE (di-cache per teks)
+
+    Args:
+        text (str): Teks yang akan dihitung
+
+    Returns:
+        int: Jumlah token
+    """
+    return count_tokens(text)
+
 # Fungsi helper untuk RAG
 def get_relevant_knowledge(persona, query, intent=None, max_tokens=300):
     """
@@ -139,5 +268,39 @@ def get_relevant_knowledge(persona, query, intent=None, max_tokens=300):
     Returns:
         str: Bagian prompt dengan informasi relevan
     """
-    # Placeholder - fungsi sebenarnya diimplementasikan di RAG Engine
-    return "Informasi relevan akan disediakan oleh RAG Engine"
+    started = time.perf_counter()
+    try:
+        context = get_rag_engine().augment_prompt(persona, query, intent or {}, max_tokens=max_tokens)
+    except Exception as e:
+        print(f"Error retrieving knowledge: {e}")
+        with _retrieval_stats_lock:
+            _retrieval_stats["errors"] += 1
+        context = ""
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    
+    # Catat latensi retrieval dan ukuran konteks yang disisipkan
+    with _retrieval_stats_lock:
+        _retrieval_stats["calls"] += 1
+        _retrieval_stats["total_ms"] += elapsed_ms
+        _retrieval_stats["max_ms"] = max(_retrieval_stats["max_ms"], elapsed_ms)
+        _retrieval_stats["total_chars"] += len(context)
+        _retrieval_stats["last_ms"] = elapsed_ms
+        _retrieval_stats["last_chars"] = len(context)
+    
+    return context
+
+def get_retrieval_stats():
+    """
+    Statistik retrieval RAG sejak proses berjalan
+
+    Returns:
+        dict: Jumlah panggilan, latensi (ms) dan ukuran konteks (karakter)
+    """
+    with _retrieval_stats_lock:
+        stats = dict(_retrieval_stats)
+    calls = stats["calls"]
+    return {
+        **stats,
+        "avg_ms": stats["total_ms"] / calls if calls else 0,
+        "avg_chars": stats["total_chars"] / calls if calls else 0
+    }
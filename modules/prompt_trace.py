@@ -0,0 +1,135 @@
+# modules/prompt_trace.py
+
+"""
+Tracing prompt terstruktur untuk debugging
+Prompt yang terpilih sampel dicatat beserta ukuran tiap bagian dan estimasi
+token ke data/logs/prompts/{tanggal}.jsonl. Penulisan dilakukan oleh buffer
+write-behind sehingga jalur pemrosesan pesan tidak pernah menunggu I/O.
+Rate sampel bisa diatur per akun saat runtime (perintah admin /trace).
+"""
+
+import os
+import json
+import random
+import datetime
+import threading
+from modules.write_behind import WriteBehindBuffer
+
+TRACE_DIR = "data/logs/prompts"
+
+if not os.path.exists(TRACE_DIR):
+    os.makedirs(TRACE_DIR)
+
+def _write_traces(filename, records):
+    """
+    Tambahkan satu batch trace ke file harian
+    """
+    lines = "".join(json.dumps(r, ensure_ascii=False, separators=(",", ":")) + "\n" for r in records)
+    with open(filename, 'a', encoding='utf-8') as f:
+        f.write(lines)
+
+class PromptTracer:
+    """
+    Pencatat prompt dengan sampling per akun
+    """
+
+    def __init__(self, default_rate=0.0, account_rates=None, trace_dir=TRACE_DIR):
+        """
+        Args:
+            default_rate (float): Porsi prompt yang dicatat untuk akun tanpa pengaturan khusus (0-1)
+            account_rates (dict, optional): Username -> rate sampel
+            trace_dir (str): Direktori file trace
+        """
+        self.default_rate = default_rate
+        self.account_rates = dict(account_rates or {})
+        self.trace_dir = trace_dir
+        self.stats = {"traced": 0, "skipped": 0}
+        self._lock = threading.Lock()
+        self._buffer = WriteBehindBuffer(_write_traces, name="prompt_tracer")
+
+    def get_rate(self, username):
+        """
+        Rate sampel yang berlaku untuk sebuah akun
+        """
+        return self.account_rates.get(username, self.default_rate)
+
+    def set_rate(self, username, rate):
+        """
+        Ubah rate sampel saat runtime
+
+        Args:
+            username (str): Username akun, atau None untuk rate default
+            rate (float): Porsi prompt yang dicatat (0 = mati, 1 = semua)
+        """
+        rate = min(max(float(rate), 0.0), 1.0)
+        with self._lock:
+            if username is None:
+                self.default_rate = rate
+            else:
+                self.account_rates[username] = rate
+
+    def trace(self, username, prompt, sections, token_estimate, force=False):
+        """
+        Catat prompt jika terpilih sampel (tidak memblokir)
+
+        Args:
+            username (str): Username akun JTRADE
+            prompt (str): Prompt lengkap
+            sections (dict): Nama bagian -> isi teks
+            token_estimate (int): Estimasi jumlah token prompt
+            force (bool): Catat tanpa sampling
+
+        Returns:
+            bool: True jika prompt dicatat
+        """
+        rate = self.get_rate(username)
+        if not force and (rate <= 0 or random.random() >= rate):
+            with self._lock:
+                self.stats["skipped"] += 1
+            return False
+
+        now = datetime.datetime.now()
+        record = {
+            "timestamp": now.isoformat(),
+            "account": username,
+            "token_estimate": token_estimate,
+            "chars": len(prompt),
+            "sections": {name: len(text or "") for name, text in sections.items()},
+            "prompt": prompt
+        }
+        self._buffer.add(os.path.join(self.trace_dir, f"{now.strftime('%Y-%m-%d')}.jsonl"), record)
+        with self._lock:
+            self.stats["traced"] += 1
+        return True
+
+    def get_stats(self):
+        """
+        Statistik tracing dan rate yang berlaku
+
+        Returns:
+            dict: Jumlah prompt dicatat/dilewati, rate default, rate per akun
+        """
+        with self._lock:
+            return dict(self.stats, default_rate=self.default_rate, account_rates=dict(self.account_rates))
+
+    def flush(self):
+        self._buffer.flush()
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+def get_prompt_tracer():
+    """
+    Tracer bersama; rate awal dibaca dari konfigurasi prompt_trace
+    (hanya dibaca, file konfigurasi tidak dibuat)
+    """
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            from modules.config_manager import load_config
+            config = load_config(create_default=False).get("prompt_trace") or {}
+            _tracer = PromptTracer(
+                default_rate=config.get("default_rate", 0.0),
+                account_rates=config.get("accounts", {})
+            )
+    return _tracer
@@ -7,91 +7,241 @@ Meningkatkan respons dengan mengambil informasi relevan dari knowledge base
 
 import os
 import json
+import hashlib
+import threading
 import numpy as np
-from pathlib import Path
+from modules.embedding_store import EmbeddingStore
+from modules.embedding_backends import get_embedding_backend
+from modules.ann_index import IVFIndex
+from modules.tokenizer import count_tokens
+from modules.knowledge_base import get_knowledge_snapshot, refresh_knowledge
+from modules.immutable import thaw
+from collections.abc import Mapping
 
 # Pastikan direktori diperlukan ada
 KB_DIR = "data/knowledge_base"
 EMBED_CACHE_DIR = "data/embeddings"
+EMBEDDING_DIM = 128  # Dimensi embedding hash (cache lama)
+EMBED_STORE_PATH = "data/embeddings/embeddings"
+LEGACY_CACHE_FILE = "data/embeddings/cache.json"
+
+# Indeks ANN (IVF) opsional untuk knowledge base besar
+ANN_ENABLED = os.getenv("RAG_ANN_INDEX", "").lower() == "ivf"
+ANN_NPROBE = int(os.getenv("RAG_ANN_NPROBE", "8"))
+
+# Jumlah batch embedding yang dijalankan bersamaan saat indexing
+EMBED_WORKERS = int(os.getenv("RAG_EMBED_WORKERS", "4"))
 
 for dir_path in [KB_DIR, EMBED_CACHE_DIR]:
     if not os.path.exists(dir_path):
         os.makedirs(dir_path, exist_ok=True)
 
+# Instance RAG Engine bersama untuk seluruh proses
+_shared_engine = None
+
+def get_rag_engine():
+    """
+    Dapatkan RAG Engine bersama (dibuat sekali per proses)
+    
+    Returns:
+        RAGEngine: Instance bersama
+    """
+    global _shared_engine
+    if _shared_engine is None:
+        _shared_engine = RAGEngine(embed_workers=EMBED_WORKERS)
+    return _shared_engine
+
 class RAGEngine:
-    def __init__(self, embedding_cache_file="data/embeddings/cache.json"):
+    def __init__(self, embedding_store_path=EMBED_STORE_PATH, embedding_backend=None, use_ann=ANN_ENABLED,
+                 embed_workers=None):
         """
         Inisialisasi RAG Engine
+        
+        Args:
+            embedding_store_path (str): Path dasar store embedding biner
+            embedding_backend (EmbeddingBackend, optional): Backend embedding,
+                default dipilih lewat RAG_EMBEDDING_BACKEND
+            use_ann (bool): Pakai indeks IVF (approximate) alih-alih exact search
+            embed_workers (int, optional): Jumlah batch embedding bersamaan untuk
+                backend default (lihat RAG_EMBED_WORKERS)
         """
-        self.embedding_cache_file = embedding_cache_file
-        self.embeddings = {}
-        self.knowledge_data = {}
+        self.ann = None
+        # Snapshot knowledge base yang sesuai dengan isi store embedding
+        self._snapshot = None
+        self._index_lock = threading.RLock()
+        self.ann_index_file = f"{embedding_store_path}.ivf.npz"
+        self.use_ann = use_ann
+        if embedding_backend is None:
+            embedding_backend = get_embedding_backend(**({"max_workers": embed_workers} if embed_workers else {}))
+        self.backend = embedding_backend
+        
+        # Embeddings disimpan sebagai matriks biner yang di-memory-map
+        self.store = EmbeddingStore(embedding_store_path, self.backend.dim)
+        self.embeddings = self.store
+        
+        if self.store.dim != self.backend.dim:
+            print(f"Embedding dimension changed ({self.store.dim} -> {self.backend.dim}), resetting store")
+            self.store.reset(self.backend.dim)
         
-        # Buat direktori untuk cache embeddings jika belum ada
-        os.makedirs(os.path.dirname(embedding_cache_file), exist_ok=True)
+        if not len(self.store):
+            self._migrate_legacy_cache()
+        else:
+            print(f"Loaded {len(self.store)} embeddings from store")
         
-        # Load embeddings dari cache jika ada
-        if os.path.exists(embedding_cache_file):
-            try:
-                with open(embedding_cache_file, 'r') as f:
-                    cache_data = json.load(f)
-                    # Konversi string JSON menjadi array numpy
-                    self.embeddings = {k: np.array(v) for k, v in cache_data.items()}
-                print(f"Loaded {len(self.embeddings)} embeddings from cache")
-            except Exception as e:
-                print(f"Error loading embeddings: {e}")
+        # Indeks pencarian: matriks float32 ter-normalisasi + array key paralel
+        self._build_matrix()
+        
+        if self.use_ann and len(self.store):
+            self._load_ann_index()
         
         # Load knowledge base
         self.load_knowledge_base()
     
-    def load_knowledge_base(self):
+    @property
+    def knowledge_data(self):
         """
-        Memuat semua file knowledge base
+        Isi knowledge base dari snapshot yang terakhir diindeks (read-only), agar
+        teks hasil retrieval selalu cocok dengan embedding-nya
         """
-        for file_path in Path(KB_DIR).glob("*.json"):
-            try:
-                with open(file_path, 'r') as f:
-                    data = json.load(f)
-                self.knowledge_data[file_path.stem] = data
-                print(f"Loaded knowledge base: {file_path.stem}")
-            except Exception as e:
-                print(f"Error loading {file_path}: {e}")
-    
-    def create_simple_embedding(self, text):
+        return self._snapshot.data if self._snapshot is not None else {}
+
+    def load_knowledge_base(self):
         """
-        Fungsi sederhana untuk membuat embedding dari teks
-        Dalam produksi, gunakan sentence-transformers atau OpenAI embeddings API
+        Memuat ulang semua file knowledge base ke snapshot bersama lalu mengindeks
+        ulang. Snapshot engine hanya diganti oleh _index_snapshot, setelah
+        embedding-nya tersimpan.
         """
-        import hashlib
-        text_hash = hashlib.md5(text.encode()).digest()
-        # Menghasilkan vector 128-dimensi
-        return np.array([float(b % 10) for b in text_hash] + [0] * (128 - len(text_hash)), dtype=np.float32)
+        snapshot = refresh_knowledge(force=True)
+        for kb_name in snapshot.data:
+            print(f"Loaded knowledge base: {kb_name}")
+        self.index_knowledge_base()
     
-    def cosine_similarity(self, v1, v2):
+    def index_knowledge_base(self):
         """
-        Menghitung cosine similarity antara dua vektor
+        Mengindeks knowledge base dengan embeddings secara inkremental:
+        hanya potongan baru/berubah (berdasarkan hash konten) yang di-embed ulang
+        dan potongan yang sudah tidak ada dihapus dari store
         """
-        dot_product = np.dot(v1, v2)
-        norm_v1 = np.linalg.norm(v1)
-        norm_v2 = np.linalg.norm(v2)
-        return dot_product / (norm_v1 * norm_v2)
-    
-    def index_knowledge_base(self):
+        snapshot = get_knowledge_snapshot()
+        chunks = self._collect_chunks(snapshot)
+        hashes = {key: self._content_hash(text) for key, text in chunks.items()}
+        
+        # Embedding (bisa berupa request jaringan) dihitung tanpa memegang lock
+        # agar retrieval tetap berjalan; lock hanya dipakai saat store ditukar
+        with self._index_lock:
+            changed = [key for key in chunks if self.store.hashes.get(key) != hashes[key]]
+        vectors = self._normalize(self.backend.embed([chunks[key] for key in changed]))
+        
+        with self._index_lock:
+            self._index_snapshot(snapshot, chunks, hashes, dict(zip(changed, vectors)))
+
+    def _collect_chunks(self, snapshot):
         """
-        Mengindeks knowledge base dengan embeddings
+        Potongan teks yang diindeks dari sebuah snapshot (key path -> teks)
         """
-        for kb_name, kb_data in self.knowledge_data.items():
+        chunks = {}
+        for kb_name, kb_data in snapshot.data.items():
             # Flatten knowledge base
             flat_content = self._flatten_dict(kb_data, prefix=kb_name)
             
-            # Generate embedding untuk setiap bagian konten
             for key, text in flat_content.items():
                 if isinstance(text, str) and len(text) > 10:
-                    self.embeddings[key] = self.create_simple_embedding(text)
+                    chunks[key] = text
+        return chunks
+
+    def _index_snapshot(self, snapshot, chunks, hashes, embedded):
+        """
+        Terapkan hasil embedding ke store dan indeks lalu pasang snapshot-nya
+        (dipanggil dengan _index_lock)
+        """
+        if self._snapshot is not None and self._snapshot.version > snapshot.version:
+            # Indexing lain yang berjalan bersamaan sudah memasang snapshot lebih baru
+            return
+        
+        # Store bisa berubah sejak embedding dihitung: bandingkan ulang
+        changed = [key for key in chunks if self.store.hashes.get(key) != hashes[key]]
+        removed = [key for key in self.store if key not in chunks]
+        
+        if not changed and not removed:
+            self._snapshot = snapshot
+            print(f"Knowledge base up to date ({len(self.store)} items)")
+            return
         
-        # Simpan embeddings ke cache
-        self._save_embeddings()
-        print(f"Indexed {len(self.embeddings)} items from knowledge base")
+        missing = [key for key in changed if key not in embedded]
+        if missing:
+            embedded.update(zip(missing, self._normalize(self.backend.embed([chunks[key] for key in missing]))))
+        vectors = np.array([embedded[key] for key in changed], dtype=np.float32).reshape(len(changed), self.store.dim)
+        upserts = {key: (hashes[key], vector) for key, vector in zip(changed, vectors)}
+        
+        self.store.update(upserts, removed)
+        
+        # Rapikan store jika baris kosong sudah terlalu banyak
+        compacted = False
+        if self.store.free_rows > len(self.store):
+            self.store.compact()
+            compacted = True
+        
+        self._build_matrix()
+        
+        if self.use_ann:
+            if (self.ann is None or compacted or self.ann.n_lists == 0
+                    or self.ann.centroids.shape[1] != self.store.dim):
+                self.build_ann_index()
+            else:
+                # Baris baru/berubah dimasukkan ke cluster terdekat tanpa melatih ulang
+                self.ann.update([self.store.offsets[key] for key in changed], vectors)
+                self.ann.save(self.ann_index_file)
+        
+        self._snapshot = snapshot
+        print(f"Indexed {len(changed)} new/changed items, removed {len(removed)} ({len(self.store)} items in knowledge base)")
+    
+    def build_ann_index(self, n_lists=None):
+        """
+        Bangun ulang indeks IVF dari store dan simpan ke disk
+        
+        Args:
+            n_lists (int, optional): Jumlah cluster, default ~sqrt(N)
+        """
+        self.ann = IVFIndex(nprobe=ANN_NPROBE).build(self._matrix, n_lists=n_lists)
+        self.ann.save(self.ann_index_file)
+        print(f"Built ANN index with {self.ann.n_lists} lists for {self.ann.n_rows} rows")
+    
+    def _load_ann_index(self):
+        """
+        Muat indeks IVF dari disk; bangun ulang jika tidak ada atau tidak cocok dengan store
+        """
+        ann = IVFIndex.load(self.ann_index_file) if os.path.exists(self.ann_index_file) else None
+        if ann is None or ann.n_rows != len(self.store.keys) or ann.centroids.shape[1] != self.store.dim:
+            self.build_ann_index()
+        else:
+            # nprobe adalah setelan query: pakai nilai RAG_ANN_NPROBE saat ini
+            ann.nprobe = ANN_NPROBE
+            self.ann = ann
+    
+    def _content_hash(self, text):
+        """
+        Fingerprint konten untuk mendeteksi perubahan potongan knowledge base
+        (termasuk identitas backend, sehingga ganti backend berarti embed ulang)
+        """
+        return hashlib.sha1(f"{self.backend.fingerprint}\0{text}".encode("utf-8")).hexdigest()
+    
+    def _build_matrix(self):
+        """
+        Pakai matriks dari store (sudah ter-normalisasi) sebagai indeks pencarian
+        """
+        self._matrix = self.store.matrix
+        self._keys = np.array(self.store.keys, dtype=object)
+        # Baris kosong (key dihapus) tidak boleh muncul di hasil
+        self._empty_rows = np.flatnonzero(np.equal(self._keys, None)) if self.store.free_rows else None
+    
+    @staticmethod
+    def _normalize(vectors):
+        """
+        Normalisasi L2 per baris (vektor nol dibiarkan nol)
+        """
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
     
     def _flatten_dict(self, d, prefix="", result=None):
         """
@@ -103,35 +253,53 @@ class RAGEngine:
         for k, v in d.items():
             key = f"{prefix}.{k}" if prefix else k
             
-            if isinstance(v, dict):
+            if isinstance(v, Mapping):
                 self._flatten_dict(v, key, result)
-            elif isinstance(v, list):
+            elif isinstance(v, (list, tuple)):
                 # Untuk list, tambahkan sebagai joined text jika elemen string
                 if all(isinstance(item, str) for item in v):
                     result[key] = " ".join(v)
                 # Untuk list yang berisi dict, proses tiap item
-                elif any(isinstance(item, dict) for item in v):
+                elif any(isinstance(item, Mapping) for item in v):
                     for i, item in enumerate(v):
-                        if isinstance(item, dict):
+                        if isinstance(item, Mapping):
                             self._flatten_dict(item, f"{key}[{i}]", result)
                         else:
                             result[f"{key}[{i}]"] = str(item)
                 else:
                     # Simple list of non-string items
-                    result[key] = str(v)
+                    result[key] = str(thaw(v))
             else:
                 result[key] = str(v)
         
         return result
     
-    def _save_embeddings(self):
+    def _save_embeddings(self, embeddings):
+        """
+        Menyimpan embeddings (ter-normalisasi) ke store biner
+        """
+        keys = list(embeddings.keys())
+        if keys:
+            matrix = self._normalize(np.stack([embeddings[k] for k in keys]).astype(np.float32))
+        else:
+            matrix = np.zeros((0, self.backend.dim), dtype=np.float32)
+        self.store.save(keys, matrix)
+    
+    def _migrate_legacy_cache(self):
         """
-        Menyimpan embeddings ke file cache
+        Konversi sekali cache JSON lama (cache.json) ke store biner
         """
-        cache_data = {k: v.tolist() for k, v in self.embeddings.items()}
+        # Cache lama hanya berisi embedding hash 128 dimensi
+        if not os.path.exists(LEGACY_CACHE_FILE) or self.backend.fingerprint != f"hash:{EMBEDDING_DIM}":
+            return
         
-        with open(self.embedding_cache_file, 'w') as f:
-            json.dump(cache_data, f)
+        try:
+            with open(LEGACY_CACHE_FILE, 'r') as f:
+                cache_data = json.load(f)
+            self._save_embeddings({k: np.array(v, dtype=np.float32) for k, v in cache_data.items()})
+            print(f"Migrated {len(self.store)} embeddings from {LEGACY_CACHE_FILE}")
+        except Exception as e:
+            print(f"Error migrating embeddings: {e}")
     
     def retrieve(self, query, top_k=3):
         """
@@ -144,27 +312,72 @@ class RAGEngine:
         Returns:
             list: Daftar item relevan dengan skor
         """
-        if not self.embeddings:
+        return self.retrieve_many([query], top_k=top_k)[0]
+    
+    def retrieve_many(self, queries, top_k=3):
+        """
+        Mengambil informasi relevan untuk banyak query sekaligus
+        (satu perkalian matriks untuk semua query)
+        
+        Args:
+            queries (list): Daftar query pengguna
+            top_k (int): Jumlah hasil teratas per query
+            
+        Returns:
+            list: Daftar hasil (list item relevan dengan skor) per query
+        """
+        if not len(self.store):
             print("No embeddings found. Indexing knowledge base...")
             self.index_knowledge_base()
+        elif self._snapshot is None or get_knowledge_snapshot().version != self._snapshot.version:
+            # File knowledge base berubah: embed ulang potongan yang berubah saja
+            self.index_knowledge_base()
+        
+        if not queries or len(self.store) == 0:
+            return [[] for _ in queries]
+        
+        query_matrix = self._normalize(self.backend.embed(list(queries)))
         
-        query_embedding = self.create_simple_embedding(query)
+        # Matriks, key, dan snapshot teks dibaca sebagai satu kesatuan
+        with self._index_lock:
+            return self._search(query_matrix, top_k)
+    
+    def _search(self, query_matrix, top_k):
+        k = min(top_k, len(self.store))
+        if k <= 0:
+            return [[] for _ in query_matrix]
         
-        # Hitung similarity untuk semua item
-        similarities = []
-        for key, embedding in self.embeddings.items():
-            score = self.cosine_similarity(query_embedding, embedding)
-            similarities.append((key, score))
+        if self.ann is not None:
+            # Approximate: hanya cluster terdekat yang diperiksa (lihat ann.nprobe)
+            top_idx, top_scores = self.ann.search(query_matrix, self._matrix, k, exclude_rows=self._empty_rows)
+            return [self._format_results(idx_row, score_row) for idx_row, score_row in zip(top_idx, top_scores)]
         
-        # Urutkan berdasarkan similarity score (descending)
-        similarities.sort(key=lambda x: x[1], reverse=True)
+        # Cosine similarity semua query terhadap semua item
+        scores = query_matrix @ self._matrix.T
+        if self._empty_rows is not None:
+            scores[:, self._empty_rows] = -np.inf
         
-        # Ambil top_k hasil
-        top_results = similarities[:top_k]
+        # Ambil top-k tanpa mengurutkan seluruh skor
+        if k < scores.shape[1]:
+            top_idx = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top_idx = np.tile(np.arange(k), (len(query_matrix), 1))
+        top_scores = np.take_along_axis(scores, top_idx, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top_idx = np.take_along_axis(top_idx, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
         
-        # Format hasil
+        return [self._format_results(idx_row, score_row) for idx_row, score_row in zip(top_idx, top_scores)]
+    
+    def _format_results(self, indices, scores):
+        """
+        Format hasil retrieval menjadi list dict dengan teks dari knowledge base
+        """
         results = []
-        for key, score in top_results:
+        for idx, score in zip(indices, scores):
+            if idx < 0:
+                continue
+            key = self._keys[idx]
             # Ekstrak teks dari knowledge base
             text = self._get_text_by_key(key)
             if text:
@@ -195,7 +408,7 @@ class RAGEngine:
                 part_name = idx_part[0]
                 idx = int(idx_part[1].split(']')[0])
                 
-                if part_name in current and isinstance(current[part_name], list):
+                if part_name in current and isinstance(current[part_name], (list, tuple)):
                     if idx < len(current[part_name]):
                         current = current[part_name][idx]
                     else:
@@ -208,7 +421,7 @@ class RAGEngine:
                 else:
                     return None
         
-        return str(current)
+        return str(thaw(current))
 
     def augment_prompt(self, persona, query, intent, max_tokens=500):
         """
@@ -218,7 +431,7 @@ class RAGEngine:
             persona (dict): Informasi persona
             query (str): Query dari pengguna
             intent (dict): Intent yang terdeteksi
-            max_tokens (int): Estimasi batas token
+            max_tokens (int): Batas token untuk konteks yang disisipkan
             
         Returns:
             str: Bagian prompt dengan augmentasi
@@ -239,16 +452,17 @@ class RAGEngine:
         # Format for prompt
         if retrieved_info:
             context_parts = ["Informasi relevan dari knowledge base:"]
-            char_count = 0
+            token_count = count_tokens(context_parts[0])
             
             for info in retrieved_info:
                 item_text = f"- {info['text']}"
-                # Estimate token count (~4 chars per token)
-                if (char_count + len(item_text)) / 4 > max_tokens:
+                # Hitung token dengan tokenizer BPE (di-cache per potongan)
+                item_tokens = count_tokens(item_text) + 1
+                if token_count + item_tokens > max_tokens:
                     break
                     
                 context_parts.append(item_text)
-                char_count += len(item_text)
+                token_count += item_tokens
             
             return "\n".join(context_parts)
         
@@ -0,0 +1,115 @@
+# modules/rate_limiter.py
+
+"""
+Rate limiter token bucket untuk OpenAI API
+Menahan request secukupnya agar tetap di bawah batas requests-per-minute (RPM)
+dan tokens-per-minute (TPM) per API key, sehingga tidak terkena error 429.
+"""
+
+import time
+import asyncio
+
+# Batas default per API key (sesuaikan dengan tier akun OpenAI)
+DEFAULT_RPM = 500
+DEFAULT_TPM = 30000
+
+class TokenBucket:
+    """
+    Token bucket sederhana yang terisi ulang secara kontinu
+    """
+    
+    def __init__(self, capacity, refill_per_second):
+        """
+        Inisialisasi bucket
+        
+        Args:
+            capacity (float): Kapasitas maksimum bucket
+            refill_per_second (float): Jumlah token yang terisi per detik
+        """
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+    
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_per_second)
+        self.updated_at = now
+    
+    def delay_for(self, amount):
+        """
+        Hitung berapa detik harus menunggu sampai `amount` token tersedia
+        """
+        self._refill()
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.refill_per_second
+    
+    def consume(self, amount):
+        """
+        Kurangi token (boleh negatif untuk koreksi pemakaian aktual)
+        """
+        self._refill()
+        self.tokens -= amount
+
+class RateLimiter:
+    """
+    Rate limiter RPM + TPM untuk satu API key
+    """
+    
+    def __init__(self, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM):
+        """
+        Inisialisasi rate limiter
+        
+        Args:
+            rpm (int): Batas request per menit
+            tpm (int): Batas token per menit
+        """
+        self.request_bucket = TokenBucket(rpm, rpm / 60.0)
+        self.token_bucket = TokenBucket(tpm, tpm / 60.0)
+        # Lock FIFO agar request dilayani sesuai urutan kedatangan
+        self._lock = asyncio.Lock()
+        self.total_wait_time = 0.0
+        self.throttled_requests = 0
+    
+    async def acquire(self, estimated_tokens):
+        """
+        Tunggu sampai ada kuota untuk satu request dengan estimasi token tertentu
+        
+        Args:
+            estimated_tokens (int): Estimasi token (prompt + max_tokens respons)
+            
+        Returns:
+            float: Token yang benar-benar dipotong dari bucket (estimasi dibatasi
+                kapasitas); teruskan ke record_usage
+        """
+        # Request yang lebih besar dari kapasitas tetap harus bisa lewat
+        cost = min(estimated_tokens, self.token_bucket.capacity)
+        
+        async with self._lock:
+            started = time.monotonic()
+            while True:
+                delay = max(self.request_bucket.delay_for(1), self.token_bucket.delay_for(cost))
+                if delay <= 0:
+                    break
+                await asyncio.sleep(delay)
+            
+            self.request_bucket.consume(1)
+            self.token_bucket.consume(cost)
+            
+            waited = time.monotonic() - started
+            if waited > 0.001:
+                self.total_wait_time += waited
+                self.throttled_requests += 1
+        
+        return cost
+    
+    def record_usage(self, charged_tokens, actual_tokens):
+        """
+        Koreksi bucket TPM dengan pemakaian token aktual dari respons API
+        
+        Args:
+            charged_tokens (float): Nilai kembalian acquire (token yang sudah dipotong)
+            actual_tokens (int): Token yang benar-benar terpakai
+        """
+        self.token_bucket.consume(actual_tokens - charged_tokens)
@@ -0,0 +1,145 @@
+# modules/scheduler.py
+
+"""
+Scheduler untuk pesan masuk JTRADE AUTORESPONDER.AI
+Membatasi jumlah generasi yang berjalan bersamaan (global dan per akun)
+dan menjaga urutan FIFO untuk setiap chat.
+"""
+
+import time
+import asyncio
+from collections import deque
+
+# Batas default generasi bersamaan
+DEFAULT_GLOBAL_LIMIT = 16
+DEFAULT_ACCOUNT_LIMIT = 4
+
+class MessageScheduler:
+    """
+    Scheduler pesan dengan semaphore global, semaphore per akun,
+    dan antrean FIFO per chat
+    """
+    
+    def __init__(self, global_limit=DEFAULT_GLOBAL_LIMIT, account_limit=DEFAULT_ACCOUNT_LIMIT):
+        """
+        Inisialisasi scheduler
+        
+        Args:
+            global_limit (int): Maksimum pesan diproses bersamaan untuk semua akun
+            account_limit (int): Maksimum pesan diproses bersamaan per akun
+        """
+        self.global_limit = global_limit
+        self.account_limit = account_limit
+        self._global_semaphore = asyncio.Semaphore(global_limit)
+        self._account_semaphores = {}
+        
+        # Antrean per (akun, chat) dan worker yang mengurasnya
+        self._chat_queues = {}
+        self._chat_workers = {}
+        
+        # Metrik
+        self._in_flight = {}
+        self._stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "max_queue_depth": 0,
+            "total_wait_time": 0.0
+        }
+    
+    def _get_account_semaphore(self, account):
+        """
+        Ambil semaphore untuk akun tertentu, dibuat saat pertama dipakai
+        """
+        semaphore = self._account_semaphores.get(account)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.account_limit)
+            self._account_semaphores[account] = semaphore
+        return semaphore
+    
+    def submit(self, account, chat_id, handler, *args):
+        """
+        Masukkan pesan ke antrean chat, diproses berurutan per chat
+        
+        Args:
+            account (str): Username akun JTRADE
+            chat_id (int): ID chat Telegram
+            handler (callable): Coroutine function yang memproses pesan
+            *args: Argumen untuk handler
+        """
+        key = (account, chat_id)
+        queue = self._chat_queues.get(key)
+        if queue is None:
+            queue = deque()
+            self._chat_queues[key] = queue
+        
+        queue.append((handler, args, time.monotonic()))
+        self._stats["submitted"] += 1
+        self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], len(queue))
+        
+        # Satu worker per chat menjamin urutan FIFO
+        if key not in self._chat_workers:
+            self._chat_workers[key] = asyncio.create_task(self._drain(key))
+    
+    async def _drain(self, key):
+        """
+        Proses antrean satu chat sampai kosong
+        """
+        account = key[0]
+        queue = self._chat_queues[key]
+        account_semaphore = self._get_account_semaphore(account)
+        
+        try:
+            while queue:
+                handler, args, queued_at = queue.popleft()
+                
+                # Ambil slot akun dulu agar antrean satu akun tidak memegang slot global
+                async with account_semaphore:
+                    async with self._global_semaphore:
+                        self._stats["total_wait_time"] += time.monotonic() - queued_at
+                        self._in_flight[account] = self._in_flight.get(account, 0) + 1
+                        try:
+                            await handler(*args)
+                            self._stats["completed"] += 1
+                        except Exception as e:
+                            self._stats["failed"] += 1
+                            print(f"Error processing message for {account} in chat {key[1]}: {e}")
+                        finally:
+                            self._in_flight[account] -= 1
+        finally:
+            del self._chat_workers[key]
+            del self._chat_queues[key]
+    
+    def get_metrics(self):
+        """
+        Dapatkan metrik antrean dan pemrosesan
+        
+        Returns:
+            dict: Metrik scheduler
+        """
+        queued_per_account = {}
+        deepest_chat = None
+        deepest_depth = 0
+        for (account, chat_id), queue in self._chat_queues.items():
+            queued_per_account[account] = queued_per_account.get(account, 0) + len(queue)
+            if len(queue) > deepest_depth:
+                deepest_chat = {"account": account, "chat_id": chat_id, "depth": len(queue)}
+                deepest_depth = len(queue)
+        
+        started = self._stats["completed"] + self._stats["failed"] + sum(self._in_flight.values())
+        
+        return {
+            "global_limit": self.global_limit,
+            "account_limit": self.account_limit,
+            "in_flight": sum(self._in_flight.values()),
+            "in_flight_per_account": {k: v for k, v in self._in_flight.items() if v},
+            "queued": sum(queued_per_account.values()),
+            "queued_per_account": queued_per_account,
+            "active_chats": len(self._chat_workers),
+            "deepest_chat": deepest_chat,
+            "submitted": self._stats["submitted"],
+            "completed": self._stats["completed"],
+            "failed": self._stats["failed"],
+            "max_queue_depth": self._stats["max_queue_depth"],
+            "avg_wait_time": self._stats["total_wait_time"] / started if started else 0
+        }
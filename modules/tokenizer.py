@@ -0,0 +1,351 @@
+# modules/tokenizer.py
+
+"""
+Tokenizer BPE byte-level dan token budgeter untuk prompt
+Vocab disimpan dalam format file .tiktoken (base64(token) rank per baris) dan
+dibaca dari disk tanpa akses jaringan. Jika paket `tiktoken` terpasang,
+encoding dijalankan lewat tiktoken; jika tidak, memakai implementasi BPE
+Python di modul ini dengan hasil yang sama.
+
+Vocab bawaan adalah o200k_base resmi OpenAI (encoding gpt-4o, sha256
+446a9538cb6c348e3516120d7c08b09f57c36495e2acfffe59a5bf8b0cfb1a2d). Untuk model
+lain arahkan TOKENIZER_VOCAB ke file vocab resminya (misalnya cl100k_base.tiktoken).
+"""
+
+import os
+import re
+import base64
+import argparse
+import unicodedata
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+VOCAB_PATH = os.getenv("TOKENIZER_VOCAB", "data/tokenizer/o200k_base.tiktoken")
+# Jumlah teks yang hasil hitung tokennya disimpan
+COUNT_CACHE_SIZE = 8192
+
+# Regex pre-tokenisasi resmi per encoding (sintaks tiktoken); untuk modul `re`
+# diterjemahkan oleh _to_python_regex
+ENCODING_PATTERNS = {
+    "o200k_base": "|".join([
+        r"""[^\r\n\p{L}\p{N}]?[\p{Lu}\p{Lt}\p{Lm}\p{Lo}\p{M}]*[\p{Ll}\p{Lm}\p{Lo}\p{M}]+(?i:'s|'t|'re|'ve|'m|'ll|'d)?""",
+        r"""[^\r\n\p{L}\p{N}]?[\p{Lu}\p{Lt}\p{Lm}\p{Lo}\p{M}]+[\p{Ll}\p{Lm}\p{Lo}\p{M}]*(?i:'s|'t|'re|'ve|'m|'ll|'d)?""",
+        r"""\p{N}{1,3}""",
+        r""" ?[^\s\p{L}\p{N}]+[\r\n/]*""",
+        r"""\s*[\r\n]+""",
+        r"""\s+(?!\S)""",
+        r"""\s+""",
+    ]),
+    "cl100k_base": r"""'(?i:[sdmt]|ll|ve|re)|[^\r\n\p{L}\p{N}]?+\p{L}++|\p{N}{1,3}+| ?[^\s\p{L}\p{N}]++[\r\n]*+|\s++$|\s*[\r\n]|\s+(?!\S)|\s""",
+}
+PRETOKEN_PATTERN = ENCODING_PATTERNS["o200k_base"]
+
+# Karakter White_Space Unicode (arti \s di regex tiktoken)
+_WHITESPACE = r"\t\n\x0b\x0c\r \x85\xa0\u1680\u2000-\u200a\u2028\u2029\u202f\u205f\u3000"
+
+@lru_cache(maxsize=None)
+def _unicode_ranges():
+    """
+    Rentang code point per kategori Unicode dua huruf (Lu, Ll, Nd, Mn, ...)
+    """
+    ranges = {}
+    previous = None
+    for code_point in range(0x110000):
+        category = unicodedata.category(chr(code_point))
+        if category == previous:
+            ranges[category][-1][1] = code_point
+        else:
+            ranges.setdefault(category, []).append([code_point, code_point])
+            previous = category
+    return ranges
+
+def _class_body(name):
+    """
+    Isi kelas karakter regex untuk \\p{name} (name satu huruf = semua subkategori)
+    """
+    parts = []
+    for category, spans in _unicode_ranges().items():
+        if category == name or (len(name) == 1 and category[0] == name):
+            parts.extend(f"\\U{start:08x}-\\U{end:08x}" for start, end in spans)
+    return "".join(parts)
+
+def _to_python_regex(pattern):
+    """
+    Terjemahkan regex tiktoken ke sintaks modul `re`: \\p{..} menjadi rentang
+    code point, \\s menjadi White_Space Unicode, dan $ menjadi akhir teks
+    """
+    output = []
+    in_class = False
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\":
+            escape = pattern[i:i + 2]
+            if escape == r"\p":
+                end = pattern.index("}", i)
+                body = _class_body(pattern[i + 3:end])
+                output.append(body if in_class else f"[{body}]")
+                i = end + 1
+                continue
+            if escape == r"\s":
+                output.append(_WHITESPACE if in_class else f"[{_WHITESPACE}]")
+            elif escape == r"\S" and not in_class:
+                output.append(f"[^{_WHITESPACE}]")
+            else:
+                output.append(escape)
+            i += 2
+            continue
+        if char == "[" and not in_class:
+            in_class = True
+        elif char == "]" and in_class:
+            in_class = False
+        elif char == "$" and not in_class:
+            char = r"\Z"
+        output.append(char)
+        i += 1
+    return "".join(output)
+
+class BPETokenizer:
+    """
+    Tokenizer BPE byte-level berbasis tabel rank (kompatibel format tiktoken)
+    """
+
+    def __init__(self, ranks, pattern=PRETOKEN_PATTERN, name="o200k_base"):
+        """
+        Args:
+            ranks (dict): bytes token -> rank (rank kecil = merge lebih dulu)
+            pattern (str): Regex pre-tokenisasi (sintaks tiktoken)
+            name (str): Nama encoding
+        """
+        self.ranks = ranks
+        self.name = name
+        self.pattern = pattern
+        self._regex = None
+        self._decoder = {rank: token for token, rank in ranks.items()}
+        self._encoding = None
+        if tiktoken is not None:
+            try:
+                self._encoding = tiktoken.Encoding(name, pat_str=pattern, mergeable_ranks=ranks, special_tokens={})
+            except Exception as e:
+                print(f"tiktoken unavailable for {name}, using Python BPE: {e}")
+        if self._encoding is None:
+            self._regex = re.compile(_to_python_regex(pattern))
+        self._encode_piece = lru_cache(maxsize=65536)(self._bpe)
+
+    @property
+    def vocab_size(self):
+        return len(self.ranks)
+
+    def _bpe(self, piece):
+        """
+        Gabungkan byte sebuah potongan teks sesuai rank (algoritma tiktoken)
+        """
+        if piece in self.ranks:
+            return (self.ranks[piece],)
+
+        parts = [piece[i:i + 1] for i in range(len(piece))]
+        while len(parts) > 1:
+            best_rank = None
+            best_index = -1
+            for i in range(len(parts) - 1):
+                rank = self.ranks.get(parts[i] + parts[i + 1])
+                if rank is not None and (best_rank is None or rank < best_rank):
+                    best_rank = rank
+                    best_index = i
+            if best_rank is None:
+                break
+            parts[best_index:best_index + 2] = [parts[best_index] + parts[best_index + 1]]
+        return tuple(self.ranks[part] for part in parts)
+
+    def encode(self, text):
+        """
+        Ubah teks menjadi daftar token id
+
+        Args:
+            text (str): Teks
+
+        Returns:
+            list: Token id
+        """
+        if self._encoding is not None:
+            return self._encoding.encode_ordinary(text)
+        tokens = []
+        for piece in self._regex.findall(text):
+            tokens.extend(self._encode_piece(piece.encode("utf-8")))
+        return tokens
+
+    def decode(self, tokens):
+        """
+        Ubah token id kembali menjadi teks (byte terpotong di ujung diabaikan)
+        """
+        return b"".join(self._decoder[token] for token in tokens).decode("utf-8", errors="ignore")
+
+    def save(self, path):
+        """
+        Simpan vocab dalam format .tiktoken
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            for token, rank in sorted(self.ranks.items(), key=lambda item: item[1]):
+                f.write(f"{base64.b64encode(token).decode('ascii')} {rank}\n")
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, pattern=None):
+        """
+        Muat vocab dari file .tiktoken
+
+        Args:
+            path (str): Path file vocab; nama file menentukan encoding
+            pattern (str, optional): Regex pre-tokenisasi, default sesuai ENCODING_PATTERNS
+
+        Returns:
+            BPETokenizer: Tokenizer
+        """
+        name = os.path.splitext(os.path.basename(path))[0]
+        if pattern is None:
+            if name not in ENCODING_PATTERNS:
+                raise ValueError(f"Unknown encoding {name}, pass its pre-tokenization pattern explicitly")
+            pattern = ENCODING_PATTERNS[name]
+        ranks = {}
+        with open(path, 'r') as f:
+            for line in f:
+                if line.strip():
+                    token, rank = line.split()
+                    ranks[base64.b64decode(token)] = int(rank)
+        return cls(ranks, pattern, name)
+
+_tokenizer = None
+
+def get_tokenizer():
+    """
+    Tokenizer bersama (vocab dari VOCAB_PATH)
+
+    Returns:
+        BPETokenizer: Tokenizer, atau None jika file vocab tidak ada
+    """
+    global _tokenizer
+    if _tokenizer is None and os.path.exists(VOCAB_PATH):
+        _tokenizer = BPETokenizer.load(VOCAB_PATH)
+    return _tokenizer
+
+@lru_cache(maxsize=COUNT_CACHE_SIZE)
+def count_tokens(text):
+    """
+    Hitung jumlah token sebuah teks (hasil di-cache per teks)
+
+    Args:
+        text (str): Teks
+
+    Returns:
+        int: Jumlah token
+    """
+    if not text:
+        return 0
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        # Tanpa vocab: perkiraan kasar ~4 karakter per token
+        return len(text) // 4 + 1
+    return len(tokenizer.encode(text))
+
+def truncate_tokens(text, max_tokens, keep="head"):
+    """
+    Potong teks agar tidak melebihi max_tokens
+
+    Args:
+        text (str): Teks
+        max_tokens (int): Batas token
+        keep (str): 'head' simpan awal teks, 'tail' simpan akhir teks
+
+    Returns:
+        str: Teks yang sudah dipotong
+    """
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        limit = max_tokens * 4
+        return text[:limit] if keep == "head" else text[-limit:]
+    tokens = tokenizer.encode(text)
+    return tokenizer.decode(tokens[:max_tokens] if keep == "head" else tokens[-max_tokens:])
+
+class TokenBudgeter:
+    """
+    Membagi anggaran token prompt ke beberapa bagian berdasarkan prioritas
+    """
+
+    def __init__(self, total_tokens):
+        """
+        Args:
+            total_tokens (int): Anggaran token untuk seluruh bagian
+        """
+        self.total_tokens = total_tokens
+
+    def allocate(self, sections, reserved_tokens=0):
+        """
+        Pilih isi setiap bagian agar total token tidak melebihi anggaran
+
+        Bagian dengan prioritas lebih kecil dipenuhi lebih dulu. Bagian yang
+        berupa daftar item (misalnya baris RAG atau pesan riwayat) dipotong per
+        item utuh; bagian berupa teks dipotong per token.
+
+        Args:
+            sections (list): Daftar dict dengan kunci:
+                name (str), priority (int), text (str) atau items (list),
+                keep ('head'/'tail', default 'head'), separator (default "\\n")
+            reserved_tokens (int): Token yang sudah terpakai oleh teks tetap
+
+        Returns:
+            tuple: (dict nama -> teks terpilih, dict nama -> jumlah token)
+        """
+        remaining = self.total_tokens - reserved_tokens
+        selected = {}
+        used = {}
+
+        for section in sorted(sections, key=lambda s: s["priority"]):
+            name = section["name"]
+            keep = section.get("keep", "head")
+
+            if "items" in section:
+                separator = section.get("separator", "\n")
+                items = section["items"] if keep == "head" else list(reversed(section["items"]))
+                chosen = []
+                tokens = 0
+                for item in items:
+                    cost = count_tokens(item) + (count_tokens(separator) if chosen else 0)
+                    if tokens + cost > remaining:
+                        break
+                    chosen.append(item)
+                    tokens += cost
+                if keep != "head":
+                    chosen.reverse()
+                text = separator.join(chosen)
+            else:
+                text = truncate_tokens(section.get("text", ""), remaining, keep)
+                tokens = count_tokens(text)
+
+            selected[name] = text
+            used[name] = tokens
+            remaining -= tokens
+
+        return selected, used
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Uji tokenizer BPE")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    count_parser = subparsers.add_parser("count", help="Hitung token sebuah teks")
+    count_parser.add_argument("text")
+
+    args = parser.parse_args()
+
+    tokenizer = get_tokenizer()
+    tokens = tokenizer.encode(args.text) if tokenizer else []
+    print(f"{count_tokens(args.text)} token: {[tokenizer.decode([t]) for t in tokens] if tokenizer else ''}")
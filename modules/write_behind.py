@@ -0,0 +1,209 @@
+# modules/write_behind.py
+
+"""
+Buffer write-behind untuk penulisan data ke disk
+Record dikumpulkan di memori per key (misalnya path file) lalu ditulis oleh
+thread latar belakang saat jumlahnya mencapai batas atau interval waktu lewat.
+Jalur pemrosesan pesan tidak melakukan I/O disk yang memblokir; jika proses
+crash, paling banyak FLUSH_INTERVAL detik / MAX_PENDING record yang hilang.
+"""
+
+import atexit
+import threading
+from collections import OrderedDict
+
+# Batas default sebelum buffer di-flush
+FLUSH_INTERVAL = 1.0  # detik
+MAX_PENDING = 500     # record
+# Percobaan baca optimistis sebelum menunggu flush yang sedang berjalan
+READ_RETRIES = 3
+
+# Semua buffer yang aktif, untuk flush/close saat shutdown
+_buffers = []
+
+class WriteBehindBuffer:
+    """
+    Buffer yang menggabungkan record per key dan menulisnya di latar belakang
+    """
+    
+    def __init__(self, flush_fn, name="write_behind", flush_interval=FLUSH_INTERVAL, max_pending=MAX_PENDING,
+                 batch=False):
+        """
+        Args:
+            flush_fn (callable): Fungsi flush_fn(key, records) yang menulis satu batch,
+                atau flush_fn(batch) berisi dict key -> records jika batch=True
+            name (str): Nama buffer (untuk log dan nama thread)
+            flush_interval (float): Jeda maksimum sebelum record ditulis (detik)
+            max_pending (int): Jumlah record yang memicu flush lebih awal
+            batch (bool): Kirim semua key sekaligus ke flush_fn dalam satu panggilan
+        """
+        self.flush_fn = flush_fn
+        self.batch = batch
+        self.name = name
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        
+        self._pending = OrderedDict()
+        self._in_flight = {}
+        self._count = 0
+        self._lock = threading.Lock()
+        # Dipegang selama batch ditulis (satu flush pada satu waktu)
+        self._flush_lock = threading.RLock()
+        # Nomor urut flush: ganjil selama batch sedang ditulis ke disk
+        self._flush_seq = 0
+        self._wakeup = threading.Event()
+        self._closed = False
+        self.stats = {"records": 0, "flushes": 0, "errors": 0, "dropped": 0}
+        
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+        _buffers.append(self)
+    
+    def add(self, key, record):
+        """
+        Tambahkan record tanpa menulis ke disk (O(1), tidak memblokir)
+        
+        Setelah close() (misalnya saat shutdown) record langsung ditulis secara
+        sinkron karena thread latar belakang sudah berhenti.
+        
+        Args:
+            key: Kunci pengelompokan, misalnya path file tujuan
+            record: Data yang akan diteruskan ke flush_fn
+        """
+        with self._lock:
+            closed = self._closed
+            if not closed:
+                records = self._pending.get(key)
+                if records is None:
+                    records = []
+                    self._pending[key] = records
+                records.append(record)
+                self._count += 1
+            self.stats["records"] += 1
+            full = self._count >= self.max_pending
+        
+        if closed:
+            # Tunggu flush terakhir dari close() agar urutan record tetap terjaga
+            with self._flush_lock:
+                self._write(OrderedDict([(key, [record])]))
+        elif full:
+            self._wakeup.set()
+    
+    def pending(self, key):
+        """
+        Record untuk key tertentu yang belum tertulis ke disk
+        
+        Returns:
+            list: Record yang sedang ditulis dan yang masih menunggu, urut
+        """
+        with self._lock:
+            return list(self._in_flight.get(key, ())) + list(self._pending.get(key, ()))
+    
+    def read_consistent(self, key, read_fn, retries=READ_RETRIES):
+        """
+        Baca data dari disk dan gabungkan dengan record yang belum tertulis,
+        tanpa celah atau duplikasi terhadap flush yang sedang berjalan
+        
+        Record pending disalin di bawah lock singkat lalu disk dibaca tanpa
+        lock; jika ada flush di antaranya, pembacaan diulang. Flush yang
+        sedang menulis hanya ditunggu jika semua percobaan bertabrakan.
+        
+        Args:
+            key: Kunci pengelompokan
+            read_fn (callable): Fungsi tanpa argumen yang membaca data dari disk
+            retries (int): Jumlah percobaan baca tanpa menunggu flush
+            
+        Returns:
+            tuple: (hasil read_fn, list record yang belum tertulis)
+        """
+        for _ in range(retries):
+            with self._lock:
+                seq = self._flush_seq
+                pending = list(self._in_flight.get(key, ())) + list(self._pending.get(key, ()))
+            if seq % 2:
+                break
+            stored = read_fn()
+            with self._lock:
+                if self._flush_seq == seq:
+                    return stored, pending
+        
+        with self._flush_lock:
+            return read_fn(), self.pending(key)
+    
+    def flush(self):
+        """
+        Tulis semua record yang menunggu (memblokir sampai selesai)
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch = self._pending
+                self._pending = OrderedDict()
+                self._count = 0
+                self._in_flight = batch
+                if batch:
+                    self._flush_seq += 1
+            
+            self._write(batch)
+            
+            with self._lock:
+                self._in_flight = {}
+                if batch:
+                    self._flush_seq += 1
+            if batch:
+                self.stats["flushes"] += 1
+    
+    def _write(self, batch):
+        """
+        Teruskan batch ke flush_fn (dipanggil dengan _flush_lock)
+        """
+        if self.batch:
+            if batch:
+                try:
+                    self.flush_fn(batch)
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    self.stats["dropped"] += sum(len(records) for records in batch.values())
+                    print(f"Error flushing {self.name}: {e}")
+        else:
+            for key, records in batch.items():
+                try:
+                    self.flush_fn(key, records)
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    self.stats["dropped"] += len(records)
+                    print(f"Error flushing {self.name} for {key}: {e}")
+    
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+    
+    def close(self):
+        """
+        Hentikan thread latar belakang dan tulis sisa record
+        """
+        with self._lock:
+            if self._closed:
+                return
+            # Setelah ini add() menulis langsung; record sebelumnya ikut flush terakhir
+            self._closed = True
+        self._wakeup.set()
+        self._thread.join(timeout=self.flush_interval * 5)
+        self.flush()
+
+def flush_all():
+    """
+    Flush semua buffer write-behind
+    """
+    for buffer in list(_buffers):
+        buffer.flush()
+
+def close_all():
+    """
+    Tutup semua buffer write-behind (dipanggil saat shutdown)
+    """
+    for buffer in list(_buffers):
+        buffer.close()
+
+atexit.register(close_all)